@@ -473,12 +473,23 @@ elif page == "🤖 Step 3: Auto Fill":
                             log_message(message)
                             status_text.text(message)
                         
-                        automation = OriginAutomation(config.get("origin_url"))
-                        
-                        success = automation.run_automation(
-                            username, password, mrn, data,
-                            callback=progress_callback
-                        )
+                        # 桌面程序(或 python -m modules.origin_session serve)开着常驻会话的话，
+                        # 直接交给它填，不用再开一个浏览器重新登录
+                        from modules.origin_session import SessionServiceClient
+                        session_client = SessionServiceClient()
+                        if session_client.is_available():
+                            progress_callback("🔌 使用常驻Origin会话 Using shift session...")
+                            result = session_client.fill(mrn, data)
+                            success = result.get("success", False)
+                            if not success:
+                                progress_callback(f"✗ {result.get('reason', '')}")
+                        else:
+                            automation = OriginAutomation(config.get("origin_url"))
+
+                            success = automation.run_automation(
+                                username, password, mrn, data,
+                                callback=progress_callback
+                            )
                         
                         progress_bar.progress(100)
                         
@@ -7,12 +7,16 @@ Author: Healthcare IT Team
 Date: 2025-01-08
 """
 
+import time
+_PROCESS_STARTED = time.perf_counter()  # 启动计时的起点(startup_profile)，要放在其他import之前
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 from PIL import Image, ImageTk, ImageOps
 import json
 import os
 import threading
+from collections import OrderedDict
 from datetime import datetime
 import logging
 
@@ -24,8 +28,10 @@ logging.basicConfig(
 )
 
 class DialysisAutomationSystem:
-    def __init__(self, root, use_gpu=False):  # ✅ 添加 root 参数
+    def __init__(self, root, use_gpu=False, startup_profile=None):  # ✅ 添加 root 参数
         self.root = root
+        from modules.startup_profile import StartupProfile
+        self.startup_profile = startup_profile or StartupProfile()
         self.root.title("Dialysis Data Automation System 透析数据自动化系统")
         self.root.geometry("1400x900")
         
@@ -43,31 +49,231 @@ class DialysisAutomationSystem:
         self.batch_queue = []
 
         # 病人名录(姓名<->RN对照表)，本地JSON存的，避免每次要死记RN号码
-        from modules.patient_directory import load_patients
+        from modules.patient_directory import load_patients, configure_backend
+        configure_backend(self.config.get("patient_directory", {}).get("backend", "json"))
         self.patients = load_patients()
+        self.startup_profile.mark("patients")
+
+        # OCR/AI识别的后台任务(job_manager): 识别时界面不卡，护理记录和透析机可以同时识别
+        from modules.job_manager import JobManager, DEFAULT_MAX_WORKERS
+        self.job_manager = JobManager(
+            self.root,
+            max_workers=self.config.get("ocr_jobs", {}).get("max_workers", DEFAULT_MAX_WORKERS),
+            on_change=self._on_job_changed,
+        )
         
         # 创建界面
         self.create_ui()
+        self.startup_profile.mark("ui")
         self.log("System initialized successfully 系统初始化成功")
 
-        # 启动局域网照片上传服务，方便同事用手机直接上传照片(不用Phone Link这类配对软件)
+        # 局域网照片上传服务，方便同事用手机直接上传照片(不用Phone Link这类配对软件)
+        # 要import flask，挪到窗口显示出来之后再启动(on_window_shown)，不拖慢窗口出现
+        self._phone_upload_started = False  # 启动成功后关窗口时要把后台转换池一起关掉
+        self._closing = False               # 主窗口正在关(后台线程看到就不再往界面上送东西)
+        self._phone_events_unsubscribe = None
+        self._prewarm_phone_photos = False
+        self._preview_cache = OrderedDict()  # 手机照片文件名 -> 后台提前缩好的预览图(phone_upload.prewarm)
+
+        # 上次批量填入如果中途崩溃/断电，落盘日志里会留着没跑完的病人，问一下要不要续上
+        self.root.after(500, self.check_unfinished_batch)
+
+        # "保温浏览器": 单个病人的自动填入跑完后不关Chrome，下一位病人直接复用已登录的session
+        # (config.json 里 selenium_settings.keep_browser_warm 打开才启用)
+        self._warm_origin = None
+        self._warm_thread = None
+        # 本班次常驻会话(origin_session): 登录一次，单个填入/批量填入/Streamlit都交给它
+        self._session_service = None
+        # "边识别边填入"流水线(batch_pipeline): 运行中时，加入批量队列的病人直接交给正在填表的浏览器
+        self._batch_pipeline = None
+        self._pipeline_backlog = []       # 已核对、还没交给流水线的病人(流水线满了时在这里等)
+        self._pipeline_finishing = False  # 点了"结束": 不再收新病人，等着的交完才关流水线
+        self._pipeline_handed_mrns = set()  # 已经交出去的(可能正在填，不能再改)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        if self._keep_browser_warm():
+            self.root.after(1500, self.prewarm_browser)
+
+    def on_window_shown(self):
+        """窗口第一次画完、可以操作了(main() 里用 after_idle 调): 记下启动耗时，再做不急的初始化"""
+        self.startup_profile.mark("window_shown")
         self.start_phone_upload_service()
 
+        self.log(f"⏱️  启动耗时 Startup: 窗口可操作 {self.startup_profile.elapsed('window_shown') * 1000:.0f} ms")
+        for line in self.startup_profile.report():
+            logging.info(line)
+
+        from modules.startup_profile import load_settings
+        startup_settings = load_settings(self.config)
+        if startup_settings.get("prewarm", True):
+            self.root.after(int(startup_settings.get("prewarm_delay_ms", 2000)), self._prewarm_ocr_modules)
+
+    def _prewarm_ocr_modules(self):
+        """后台预热cv2/numpy/pytesseract/Gemini等模块，第一次点OCR时不用再等import"""
+        from modules.startup_profile import prewarm_in_background
+
+        def done(elapsed, loaded):
+            self.root.after(0, self.log, f"🔥 OCR模块已在后台预热好 Prewarmed ({elapsed:.1f}s): {', '.join(loaded) or '-'}")
+
+        prewarm_in_background(on_done=done)
+
+    def _keep_browser_warm(self):
+        return bool(self.config.get("selenium_settings", {}).get("keep_browser_warm", False))
+
+    def prewarm_browser(self):
+        """后台线程里提前启动Chrome并打开Origin登录页，第一次点"自动填入"时不用再等冷启动"""
+        from modules.origin_automation import OriginAutomation
+        if self._warm_origin is None:
+            self._warm_origin = OriginAutomation(self.config.get("origin_url"))
+        origin = self._warm_origin
+
+        def worker():
+            if origin.prewarm():
+                self.root.after(0, lambda: self.log("🔥 浏览器已在后台预热 Browser pre-warmed in background"))
+
+        self._warm_thread = threading.Thread(target=worker, daemon=True)
+        self._warm_thread.start()
+
+    def _session_running(self):
+        return self._session_service is not None and self._session_service.running
+
+    def toggle_shift_session(self):
+        """启动/停止本班次的常驻Origin会话(只登录一次，之后每位病人直接从队列页开始)"""
+        if self._session_running():
+            self._session_service.stop()
+            self.shift_session_button.config(text="🔌 启动本班次常驻会话 Start Shift Session")
+            self.log("🛑 正在关闭常驻Origin会话 Stopping shift session...")
+            return
+
+        username = self.username_entry.get()
+        password = self.password_entry.get()
+        if not username or not password:
+            messagebox.showwarning("Warning 警告", "请先填写Origin用户名/密码\nPlease enter Origin username/password first")
+            return
+
+        from modules.origin_session import OriginSessionService
+
+        def progress_callback(msg):
+            self.root.after(0, lambda m=msg: self.log(m))
+
+        self._session_service = OriginSessionService(self.config.get("origin_url"), callback=progress_callback)
+        login_future = self._session_service.start(username, password)
+        self.shift_session_button.config(text="⏳ 常驻会话登录中 Logging in...")
+
+        def on_login(future):
+            def update():
+                if future.result():
+                    self.shift_session_button.config(text="🛑 停止常驻会话 Stop Shift Session")
+                else:
+                    self.shift_session_button.config(text="🔌 启动本班次常驻会话 Start Shift Session")
+            self.root.after(0, update)
+
+        login_future.add_done_callback(on_login)
+
+    def on_close(self):
+        """关闭主窗口时，把保温中的浏览器/常驻会话一起关掉，不留下孤儿Chrome进程"""
+        if self._batch_pipeline is not None:
+            self._batch_pipeline.close()
+        if self._session_service is not None:
+            self._session_service.stop()
+        if self._warm_origin is not None:
+            try:
+                self._warm_origin.close()
+            except Exception:
+                pass
+        if self._phone_events_unsubscribe is not None:
+            self._phone_events_unsubscribe()
+        self.patient_dropdown.close()
+        self.job_manager.shutdown()
+        self._closing = True  # 上传服务还在后台启动的话，起来以后它自己关掉
+        if self._phone_upload_started:
+            from modules.upload_server import stop_server
+            stop_server()
+        self.root.destroy()
+
     def start_phone_upload_service(self):
-        """启动局域网内的照片上传服务(后台线程运行，不阻塞界面)"""
-        try:
-            from modules.upload_server import start_server_in_background
-            port = self.config.get("phone_upload_port", 5001) if hasattr(self, "config") else 5001
-            local_ip, used_port, success = start_server_in_background(port=port)
-            if success:
-                self.log(f"📱 手机上传服务已启动: http://{local_ip}:{used_port}")
-                self.log(f"   同事只要连着同一个WiFi/内网，手机浏览器打开这个网址就能上传照片")
-            else:
-                self.log("ℹ️  手机上传服务未启动(缺少flask，运行 pip install flask 后重启程序即可启用)")
-        except Exception as e:
-            self.log(f"ℹ️  手机上传服务启动失败: {e}")
-        
-    
+        """
+        启动局域网内的照片上传服务。import flask、打开目录数据库(第一次要给已有照片算哈希)、
+        起服务这些都在后台线程里做，窗口出来以后不会再卡一下；结果经 root.after 回到界面线程
+        """
+        def work():
+            try:
+                from modules.upload_server import start_server_in_background, load_settings, pending_count
+                settings = load_settings(self.config)
+                local_ip, used_port, success = start_server_in_background(settings=settings)
+                self._phone_upload_started = success
+                result = (settings, local_ip, used_port, success, pending_count() if success else 0, None)
+            except Exception as e:
+                result = (None, None, None, False, 0, e)
+            try:
+                if self._closing:
+                    raise RuntimeError("window closed")
+                self.root.after(0, self._on_phone_upload_started, *result)
+            except Exception:
+                # 服务还没起来窗口就关了: 不留下没人管的服务/子进程
+                if self._phone_upload_started:
+                    from modules.upload_server import stop_server
+                    stop_server()
+
+        threading.Thread(target=work, name="phone-upload-start", daemon=True).start()
+
+    def _on_phone_upload_started(self, settings, local_ip, used_port, success, pending, error):
+        if error is not None:
+            self.log(f"ℹ️  手机上传服务启动失败: {error}")
+        elif success:
+            self._prewarm_phone_photos = bool(settings.get("prewarm", False))
+            self.log(f"📱 手机上传服务已启动: http://{local_ip}:{used_port}")
+            self.log(f"   同事只要连着同一个WiFi/内网，手机浏览器打开这个网址就能上传照片")
+            self._subscribe_phone_events(pending)
+        else:
+            self.log("ℹ️  手机上传服务未启动(缺少flask，运行 pip install flask 后重启程序即可启用)")
+
+    def _subscribe_phone_events(self, pending):
+        """订阅上传服务的照片事件: 有新照片/被导入时，"从手机导入"旁边的待导入数量马上更新"""
+        from modules.upload_server import subscribe_events
+
+        self._set_phone_pending_badge(pending)
+        # 回调在上传服务的线程里，Tk只能在界面线程里动，转回去
+        self._phone_events_unsubscribe = subscribe_events(
+            lambda event: self.root.after(0, self._on_phone_event, event)
+        )
+
+    def _on_phone_event(self, event):
+        self._set_phone_pending_badge(event.get("pending", 0))
+        if event.get("type") == "photo_ready":
+            self.log(f"📲 手机照片已到，可以导入: {event.get('file')} (待导入 {event.get('pending', 0)} 张)")
+            if self._prewarm_phone_photos and event.get("file"):
+                self._prewarm_phone_photo(event["file"])
+
+    def _set_phone_pending_badge(self, count):
+        self.phone_pending_var.set(f"📥 {count} 张待导入" if count else "")
+
+    def _prewarm_phone_photo(self, filename):
+        """新照片一到就在后台线程里解码、缩成预览大小，导入时直接显示，不用在界面线程里打开原图"""
+        from modules.upload_server import INCOMING_DIR
+
+        path = os.path.join(INCOMING_DIR, filename)
+        width = self.image_canvas.winfo_width() if self.image_canvas.winfo_width() > 1 else 500
+        height = self.image_canvas.winfo_height() if self.image_canvas.winfo_height() > 1 else 600
+
+        def work():
+            try:
+                with Image.open(path) as img:
+                    img = ImageOps.exif_transpose(img)
+                    img.thumbnail((width, height), Image.Resampling.LANCZOS)
+                    img.load()
+            except Exception as e:
+                logging.debug(f"预先处理手机照片失败({filename}): {e}")
+                return
+
+            def store():
+                self._preview_cache[filename] = img
+                while len(self._preview_cache) > 8:
+                    self._preview_cache.popitem(last=False)
+
+            self.root.after(0, store)
+
+        threading.Thread(target=work, daemon=True).start()
+
     def load_config(self):
         """加载配置文件"""
         try:
@@ -229,6 +435,10 @@ class DialysisAutomationSystem:
             command=lambda: self.show_phone_import_dialog("nursing"),
             width=30
         ).grid(row=1, column=0, pady=5, sticky=(tk.W, tk.E))
+        # 手机上传的待导入数量(上传服务推过来的事件实时更新)
+        self.phone_pending_var = tk.StringVar(value="")
+        ttk.Label(step1_frame, textvariable=self.phone_pending_var, foreground="#b35c00"
+                  ).grid(row=1, column=1, padx=(6, 0))
         
         ttk.Button(
             step1_frame, 
@@ -264,6 +474,8 @@ class DialysisAutomationSystem:
             command=lambda: self.show_phone_import_dialog("machine"),
             width=30
         ).grid(row=1, column=0, pady=5, sticky=(tk.W, tk.E))
+        ttk.Label(step2_frame, textvariable=self.phone_pending_var, foreground="#b35c00"
+                  ).grid(row=1, column=1, padx=(6, 0))
         
         ttk.Button(
             step2_frame, 
@@ -309,9 +521,14 @@ class DialysisAutomationSystem:
         ttk.Label(step3_frame, text="搜索病人 Search Patient:").grid(row=2, column=0, sticky=tk.W, pady=2)
         self.patient_search_entry = ttk.Entry(step3_frame, width=25)
         self.patient_search_entry.grid(row=2, column=1, pady=2, padx=5)
-        self.patient_search_entry.bind("<KeyRelease>", self.on_patient_search_keyrelease)
-        self.patient_search_entry.bind("<FocusOut>", lambda e: self.root.after(150, self.hide_patient_dropdown))
-        self._patient_dropdown = None
+        # 下拉框只建一次；防抖后在后台线程里搜，结果回到界面线程时只更新列表内容
+        from modules.patient_dropdown import PatientDropdown
+        self.patient_dropdown = PatientDropdown(
+            self.root,
+            self.patient_search_entry,
+            search=self._search_patients_for_dropdown,
+            on_pick=self.on_patient_picked,
+        )
         
         ttk.Label(step3_frame, text="Patient MRN 病历号:").grid(row=3, column=0, sticky=tk.W, pady=2)
         self.mrn_entry = ttk.Entry(step3_frame, width=25)
@@ -349,6 +566,24 @@ class DialysisAutomationSystem:
             command=self.show_batch_fill_dialog,
             width=30
         ).grid(row=8, column=0, columnspan=2, pady=(0, 10), sticky=(tk.W, tk.E))
+
+        # 常驻会话: 整个班次只登录一次，之后的单个/批量填入(还有Streamlit网页版)都交给它
+        self.shift_session_button = ttk.Button(
+            step3_frame,
+            text="🔌 启动本班次常驻会话 Start Shift Session",
+            command=self.toggle_shift_session,
+            width=30
+        )
+        self.shift_session_button.grid(row=9, column=0, columnspan=2, pady=(0, 10), sticky=(tk.W, tk.E))
+
+        # 边识别边填入: 先登录开始填，后面的病人OCR核对完一位、加入队列一位，浏览器那边接着填
+        self.live_batch_button = ttk.Button(
+            step3_frame,
+            text="🔀 边识别边填入 Start Live Batch",
+            command=self.toggle_live_batch,
+            width=30
+        )
+        self.live_batch_button.grid(row=10, column=0, columnspan=2, pady=(0, 10), sticky=(tk.W, tk.E))
         
         # 其他操作
         action_frame = ttk.LabelFrame(left_frame, text="Actions 操作", padding="10")
@@ -421,6 +656,11 @@ class DialysisAutomationSystem:
         self.log_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.log_tab, text="Logs 日志")
         self.create_log_area()
+
+        # Tab 4: 后台任务(OCR/AI识别)
+        self.jobs_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.jobs_tab, text="Jobs 任务")
+        self.create_jobs_tab()
         
     def create_basic_data_fields(self):
         """创建基本数据输入字段"""
@@ -555,6 +795,56 @@ class DialysisAutomationSystem:
         self.log_text = scrolledtext.ScrolledText(self.log_tab, width=60, height=35, wrap=tk.WORD, font=("Consolas", 9))
         self.log_text.pack(fill="both", expand=True, padx=5, pady=5)
         
+    def create_jobs_tab(self):
+        """创建后台任务列表(排队/进行中/已完成的OCR和AI识别)"""
+        columns = ("title", "status", "message", "elapsed")
+        self.jobs_tree = ttk.Treeview(self.jobs_tab, columns=columns, show="headings", height=20)
+        for col, text, width in (("title", "任务 Job", 220), ("status", "状态 Status", 110),
+                                 ("message", "进度 Progress", 220), ("elapsed", "用时 Time", 70)):
+            self.jobs_tree.heading(col, text=text)
+            self.jobs_tree.column(col, width=width, anchor=tk.W)
+        self.jobs_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        buttons = ttk.Frame(self.jobs_tab)
+        buttons.pack(fill="x", padx=5, pady=(0, 5))
+        ttk.Button(buttons, text="⏹ 取消选中 Cancel", command=self.cancel_selected_jobs).pack(side="left")
+        ttk.Button(buttons, text="🧹 清除已结束 Clear finished", command=self.clear_finished_jobs).pack(side="left", padx=5)
+
+    def _on_job_changed(self, job):
+        """JobManager 的回调(界面线程): 刷新任务列表里这一行"""
+        from modules.job_manager import STATUS_LABELS, CANCELLED
+        if not hasattr(self, "jobs_tree"):
+            return
+        values = (job.title, STATUS_LABELS.get(job.status, job.status), job.message,
+                  f"{job.elapsed:.1f}s" if job.started else "")
+        iid = str(job.id)
+        cancelled_label = STATUS_LABELS[CANCELLED]
+        newly_cancelled = job.status == CANCELLED and not (
+            self.jobs_tree.exists(iid) and self.jobs_tree.set(iid, "status") == cancelled_label
+        )
+        if self.jobs_tree.exists(iid):
+            self.jobs_tree.item(iid, values=values)
+        else:
+            self.jobs_tree.insert("", 0, iid=iid, values=values)
+        if newly_cancelled:
+            self.log(f"⏹ 已取消任务 Cancelled: {job.title}")
+            # 同类还有别的任务在跑(比如被新任务取代了)，状态栏显示的是那个任务的进度，不要改回"已取消"
+            others = any(j.group == job.group and j.active for j in self.job_manager.jobs())
+            status_label = {"nursing": self.nursing_status, "machine": self.machine_status}.get(job.group)
+            if status_label is not None and not others:
+                status_label.config(text="Status: Cancelled 已取消", foreground="blue")
+
+    def cancel_selected_jobs(self):
+        for iid in self.jobs_tree.selection():
+            self.job_manager.cancel(int(iid))
+
+    def clear_finished_jobs(self):
+        self.job_manager.clear_finished()
+        active = {str(job.id) for job in self.job_manager.jobs()}
+        for iid in self.jobs_tree.get_children():
+            if iid not in active:
+                self.jobs_tree.delete(iid)
+
     def log(self, message):
         """添加日志"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -577,7 +867,9 @@ class DialysisAutomationSystem:
         target: "nursing" 或 "machine"
         """
         try:
-            from modules.upload_server import list_incoming_photos, archive_incoming_photo
+            from modules.upload_server import (
+                list_incoming_photos, archive_incoming_photo, conversion_state, thumbnail_for
+            )
         except ImportError:
             messagebox.showerror(
                 "Missing dependency 缺少依赖",
@@ -586,6 +878,13 @@ class DialysisAutomationSystem:
             return
 
         photos = list_incoming_photos()
+        converting = conversion_state()
+        if not photos and converting:
+            messagebox.showinfo(
+                "Converting 处理中",
+                f"有 {len(converting)} 张手机照片刚传到，还在后台转换，过几秒再点一次。"
+            )
+            return
         if not photos:
             messagebox.showinfo(
                 "No photos 暂无照片",
@@ -638,7 +937,7 @@ class DialysisAutomationSystem:
                     self.machine_image = archived_path
                     self.machine_status.config(text="Status: Image loaded 图片已加载", foreground="green")
                 self.current_image = archived_path
-                self.display_image(archived_path)
+                self.display_image(archived_path, prepared=self._preview_cache.pop(os.path.basename(photo_path), None))
                 self.log(f"📲 从手机导入照片: {os.path.basename(archived_path)}")
                 dialog.destroy()
             except Exception as e:
@@ -658,7 +957,8 @@ class DialysisAutomationSystem:
             frame.grid(row=idx // cols, column=idx % cols, padx=8, pady=8)
 
             try:
-                img = Image.open(photo_path)
+                # 用上传时已经生成好的缩略图(几KB)，不再在界面线程里逐张打开原图缩小
+                img = Image.open(thumbnail_for(photo_path) or photo_path)
                 img.thumbnail((130, 130))
                 thumb = ImageTk.PhotoImage(img)
                 dialog.thumb_refs.append(thumb)
@@ -681,57 +981,22 @@ class DialysisAutomationSystem:
         canvas.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         scrollbar.pack(side="right", fill="y")
 
-    def on_patient_search_keyrelease(self, event):
-        """搜索框输入时，弹出匹配的病人列表(姓名+RN)供选择"""
-        if event.keysym in ("Up", "Down", "Return", "Escape"):
-            return
+    def _search_patients_for_dropdown(self, query):
+        """PatientDropdown 的搜索回调(在后台线程里调用)"""
         from modules.patient_directory import search_patients
+        return search_patients(self.patients, query, limit=15, fuzzy=True)  # 最多显示15条，避免下拉太长
 
-        query = self.patient_search_entry.get()
-        matches = search_patients(self.patients, query)[:15]  # 最多显示15条，避免下拉太长
-
-        self.hide_patient_dropdown()
-        if not matches or not query.strip():
-            return
-
-        x = self.patient_search_entry.winfo_rootx()
-        y = self.patient_search_entry.winfo_rooty() + self.patient_search_entry.winfo_height()
-
-        dropdown = tk.Toplevel(self.root)
-        dropdown.wm_overrideredirect(True)
-        dropdown.wm_geometry(f"+{x}+{y}")
-        self._patient_dropdown = dropdown
-
-        listbox = tk.Listbox(dropdown, width=35, height=min(len(matches), 8))
-        for p in matches:
-            listbox.insert(tk.END, f"{p.get('name','')}  ({p.get('mrn','')})")
-        listbox.pack()
-
-        def on_select(evt):
-            sel = listbox.curselection()
-            if sel:
-                chosen = matches[sel[0]]
-                self.patient_search_entry.delete(0, tk.END)
-                self.patient_search_entry.insert(0, chosen.get("name", ""))
-                self.mrn_entry.delete(0, tk.END)
-                self.mrn_entry.insert(0, chosen.get("mrn", ""))
-            self.hide_patient_dropdown()
-
-        listbox.bind("<<ListboxSelect>>", on_select)
-        listbox.bind("<Button-1>", lambda e: self.root.after(50, lambda: on_select(None)))
-
-    def hide_patient_dropdown(self):
-        if self._patient_dropdown is not None:
-            try:
-                self._patient_dropdown.destroy()
-            except Exception:
-                pass
-            self._patient_dropdown = None
+    def on_patient_picked(self, patient):
+        """在搜索下拉框里选中一个病人: 填入姓名和RN"""
+        self.patient_search_entry.delete(0, tk.END)
+        self.patient_search_entry.insert(0, patient.get("name", ""))
+        self.mrn_entry.delete(0, tk.END)
+        self.mrn_entry.insert(0, patient.get("mrn", ""))
 
     def show_patient_manager(self):
         """病人名单管理弹窗: 增/删/改单个病人，也支持批量粘贴导入"""
         from modules.patient_directory import (
-            save_patients, add_or_update_patient, remove_patient, parse_bulk_text
+            save_patients, add_or_update_patient, add_or_update_patients, remove_patient, parse_bulk_text
         )
 
         dialog = tk.Toplevel(self.root)
@@ -822,8 +1087,7 @@ class DialysisAutomationSystem:
             if not parsed:
                 messagebox.showwarning("提示", "没有解析出任何有效的 姓名+RN 记录，请检查格式")
                 return
-            for p in parsed:
-                self.patients = add_or_update_patient(self.patients, p["name"], p["mrn"])
+            self.patients = add_or_update_patients(self.patients, parsed)
             save_patients(self.patients)
             refresh_listbox()
             bulk_text.delete("1.0", tk.END)
@@ -898,21 +1162,26 @@ class DialysisAutomationSystem:
             logging.warning(f"保存转正后的图片失败，改用原图: {path} ({e})")
             return path
 
-    def display_image(self, filename):
-        """显示图片预览"""
+    def display_image(self, filename, prepared=None):
+        """显示图片预览(prepared: 后台已经缩好的预览图，放得下就直接用，不再打开原图缩小)"""
         try:
-            image = Image.open(filename)
             # 调整大小以适应显示
             canvas_width = self.image_canvas.winfo_width() if self.image_canvas.winfo_width() > 1 else 500
             canvas_height = self.image_canvas.winfo_height() if self.image_canvas.winfo_height() > 1 else 600
-            
-            # 计算缩放比例
-            img_width, img_height = image.size
-            scale = min(canvas_width / img_width, canvas_height / img_height, 1)
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+            if prepared is not None and prepared.width <= canvas_width and prepared.height <= canvas_height:
+                image = prepared
+                new_width, new_height = image.size
+            else:
+                image = Image.open(filename)
+
+                # 计算缩放比例
+                img_width, img_height = image.size
+                scale = min(canvas_width / img_width, canvas_height / img_height, 1)
+                new_width = int(img_width * scale)
+                new_height = int(img_height * scale)
+
+                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
             
             photo = ImageTk.PhotoImage(image)
             
@@ -930,58 +1199,68 @@ class DialysisAutomationSystem:
             logging.error(f"Display image error: {e}")
             
     def ocr_nursing_record(self):
-        """OCR识别护理记录纸"""
+        """OCR识别护理记录纸(Tesseract在后台任务里跑，界面不卡)"""
         if not self.nursing_image:
             messagebox.showwarning("Warning 警告", "Please upload nursing record image first\n请先上传护理记录照片")
             return
         
         self.nursing_status.config(text="Status: Processing OCR... 识别中...", foreground="orange")
         self.log("⏳ Starting OCR for nursing record 开始识别护理记录...")
-    
-        try:
+        image_path = self.nursing_image
+
+        def work(job):
+            job.report("Tesseract识别中 Running OCR...")
             from modules.ocr_module import DialysisOCR
-            ocr = DialysisOCR()
-            sample_data = ocr.extract_nursing_record(self.nursing_image)
-        
-            # ✅ 添加这些调试行
-            self.log(f"🔍 DEBUG: OCR returned {len(sample_data)} fields")
-            self.log(f"🔍 DEBUG: Data = {sample_data}")
-        
-            filled_count = 0  # ✅ 添加计数器
-        
-        # 填入数据
-            for key, value in sample_data.items():
-                if key in self.basic_fields and value:
-                    self.log(f"🔍 DEBUG: Trying to fill {key} = {value}")  # ✅ 添加
-                    widget = self.basic_fields[key]
-                    if isinstance(widget, tk.Text):
-                        widget.delete("1.0", tk.END)
-                        widget.insert("1.0", value)
-                    else:
-                        widget.delete(0, tk.END)
-                        widget.insert(0, value)
-                    filled_count += 1  # ✅ 添加
-                    self.log(f"✓ Filled {key}")  # ✅ 添加
-        
-            self.log(f"✅ Total fields filled: {filled_count}")  # ✅ 添加
-        
-            self.nursing_status.config(text="Status: OCR completed ✓ 识别完成", foreground="green")
-            self.log("✓ OCR completed. Please verify data. 识别完成，请验证数据")
-        
-            # 切换到基本数据标签页
-            self.notebook.select(self.basic_data_tab)
-        
-            messagebox.showinfo(
-                "OCR Complete OCR完成",
-                "Data extracted successfully!\nPlease verify and correct if needed.\n\n"
-                "数据提取成功！\n请验证并修正（如需要）。"
-            )
-        
-        except Exception as e:
-            self.nursing_status.config(text="Status: OCR failed ✗ 识别失败", foreground="red")
-            self.log(f"✗ OCR Error OCR错误: {str(e)}")
-            logging.error(f"OCR nursing record error: {e}")
-            messagebox.showerror("Error 错误", f"OCR failed OCR失败:\n{str(e)}")
+            return DialysisOCR().extract_nursing_record(image_path)
+
+        self.job_manager.submit(
+            "OCR 护理记录 Nursing record", work,
+            on_done=self._on_nursing_ocr_done, on_error=self._on_nursing_ocr_failed, key="nursing",
+        )
+
+    def _on_nursing_ocr_done(self, sample_data):
+        # ✅ 添加这些调试行
+        self.log(f"🔍 DEBUG: OCR returned {len(sample_data)} fields")
+        self.log(f"🔍 DEBUG: Data = {sample_data}")
+    
+        filled_count = 0  # ✅ 添加计数器
+    
+    # 填入数据
+        for key, value in sample_data.items():
+            if key in self.basic_fields and value:
+                self.log(f"🔍 DEBUG: Trying to fill {key} = {value}")  # ✅ 添加
+                widget = self.basic_fields[key]
+                if isinstance(widget, tk.Text):
+                    widget.delete("1.0", tk.END)
+                    widget.insert("1.0", value)
+                else:
+                    widget.delete(0, tk.END)
+                    widget.insert(0, value)
+                filled_count += 1  # ✅ 添加
+                self.log(f"✓ Filled {key}")  # ✅ 添加
+    
+        self.log(f"✅ Total fields filled: {filled_count}")  # ✅ 添加
+    
+        self.nursing_status.config(text="Status: OCR completed ✓ 识别完成", foreground="green")
+        self.log("✓ OCR completed. Please verify data. 识别完成，请验证数据")
+    
+        # 切换到基本数据标签页
+        self.notebook.select(self.basic_data_tab)
+    
+        messagebox.showinfo(
+            "OCR Complete OCR完成",
+            "Data extracted successfully!\nPlease verify and correct if needed.\n\n"
+            "数据提取成功！\n请验证并修正（如需要）。"
+        )
+
+    def _on_nursing_ocr_failed(self, e):
+        self.nursing_status.config(text="Status: OCR failed ✗ 识别失败", foreground="red")
+        if isinstance(e, ImportError):
+            self._show_missing_dependency(e)
+            return
+        self.log(f"✗ OCR Error OCR错误: {str(e)}")
+        logging.error(f"OCR nursing record error: {e}")
+        messagebox.showerror("Error 错误", f"OCR failed OCR失败:\n{str(e)}")
 
     def _get_gemini_api_key(self):
         """获取Gemini API Key: 先看config.json里有没有存过，没有就弹窗问一次并询问是否保存"""
@@ -1060,7 +1339,7 @@ class DialysisAutomationSystem:
         return result["chosen"]
 
     def ocr_nursing_record_ai(self):
-        """用AI视觉模型(Gemini)识别护理记录纸——尤其擅长手写数据"""
+        """用AI视觉模型(Gemini)识别护理记录纸——尤其擅长手写数据(打码+请求在后台任务里跑)"""
         if not self.nursing_image:
             messagebox.showwarning("Warning 警告", "Please upload nursing record image first\n请先上传护理记录照片")
             return
@@ -1072,18 +1351,20 @@ class DialysisAutomationSystem:
 
         self.nursing_status.config(text="Status: AI Processing... AI识别中...", foreground="orange")
         self.log("⏳ Starting AI OCR (Gemini) for nursing record 开始AI识别护理记录...")
+        image_path = self.nursing_image
 
-        try:
+        def work(job):
             from modules.privacy_redact import redact_sensitive_fields
-            from modules.ai_ocr_module import GeminiNursingOCR, pick_target_column
+            from modules.ai_ocr_module import GeminiNursingOCR
 
             # 先在本地打码盖住 NAME/IC/RN，只把打码后的图发给Gemini，
             # 病人姓名/身份证号全程不会真正离开这台电脑
-            self.log("🔒 正在本地打码敏感信息(NAME/IC/RN)...")
-            redacted_path, redacted_count = redact_sensitive_fields(self.nursing_image)
+            job.report("🔒 正在本地打码敏感信息(NAME/IC/RN)...")
+            redacted_path, redacted_count = redact_sensitive_fields(image_path)
 
             if redacted_count == 0:
-                proceed = messagebox.askyesno(
+                proceed = job.ask(
+                    messagebox.askyesno,
                     "⚠️ 没有找到可打码的敏感信息",
                     "本地打码没有找到 NAME/IC/RN 这几个标签，"
                     "可能是这张照片的版式和预期不一样，或者角度/清晰度导致没识别到。\n\n"
@@ -1094,134 +1375,161 @@ class DialysisAutomationSystem:
                     "Continue anyway?"
                 )
                 if not proceed:
-                    self.log("ℹ️  用户取消了AI识别(未找到可打码内容)")
-                    self.nursing_status.config(text="Status: Cancelled 已取消", foreground="blue")
-                    return
-                image_to_send = self.nursing_image
+                    return None
+                image_to_send = image_path
             else:
-                self.log(f"✓ 已打码 {redacted_count} 处敏感信息，发送打码后的图片")
                 image_to_send = redacted_path
 
+            job.report("Gemini识别中 Waiting for Gemini...")
             ocr = GeminiNursingOCR(api_key=api_key)
-            result = ocr.extract_nursing_record(image_to_send)
-            self.update_gemini_usage_display()
+            return {"result": ocr.extract_nursing_record(image_to_send), "redacted_count": redacted_count}
 
-            header = result.get("header", {})
-            daily_columns = result.get("daily_columns", [])
+        self.job_manager.submit(
+            "AI识别 护理记录 Nursing record (Gemini)", work,
+            on_done=self._on_nursing_ai_done, on_error=self._on_nursing_ai_failed, key="nursing",
+        )
 
-            self.log(f"🔍 识别到表头字段 {sum(1 for v in header.values() if v)} 个，"
-                      f"有数据的日期列 {len(daily_columns)} 个")
+    def _on_nursing_ai_done(self, outcome):
+        if outcome is None:
+            self.log("ℹ️  用户取消了AI识别(未找到可打码内容)")
+            self.nursing_status.config(text="Status: Cancelled 已取消", foreground="blue")
+            return
+        if outcome["redacted_count"]:
+            self.log(f"✓ 已打码 {outcome['redacted_count']} 处敏感信息，发送打码后的图片")
+        result = outcome["result"]
+        self.update_gemini_usage_display()
 
-            if not daily_columns:
-                messagebox.showwarning(
-                    "No dated data 没有识别到日期数据",
-                    "表头信息识别到了，但周表格里没找到任何有数据的日期列。\n"
-                    "可能这张照片的周表格本身是空的，或者角度/清晰度不够。"
-                )
-                chosen_column = {}
-            else:
-                chosen_column = self._pick_daily_column_dialog(daily_columns) or {}
+        header = result.get("header", {})
+        daily_columns = result.get("daily_columns", [])
 
-            # 合并表头 + 选中的日期列，一起填入UI
-            combined_data = {**header, **chosen_column}
+        self.log(f"🔍 识别到表头字段 {sum(1 for v in header.values() if v)} 个，"
+                  f"有数据的日期列 {len(daily_columns)} 个")
 
-            filled_count = 0
-            for key, value in combined_data.items():
-                if key in self.basic_fields and value:
-                    widget = self.basic_fields[key]
-                    if isinstance(widget, tk.Text):
-                        widget.delete("1.0", tk.END)
-                        widget.insert("1.0", value)
-                    else:
-                        widget.delete(0, tk.END)
-                        widget.insert(0, value)
-                    filled_count += 1
-                    self.log(f"✓ [AI] Filled {key} = {value}")
+        if not daily_columns:
+            messagebox.showwarning(
+                "No dated data 没有识别到日期数据",
+                "表头信息识别到了，但周表格里没找到任何有数据的日期列。\n"
+                "可能这张照片的周表格本身是空的，或者角度/清晰度不够。"
+            )
+            chosen_column = {}
+        else:
+            chosen_column = self._pick_daily_column_dialog(daily_columns) or {}
 
-            self.log(f"✅ [AI] Total fields filled: {filled_count}")
-            self.nursing_status.config(text="Status: AI OCR completed ✓ AI识别完成", foreground="green")
+        # 合并表头 + 选中的日期列，一起填入UI
+        combined_data = {**header, **chosen_column}
 
-            self.notebook.select(self.basic_data_tab)
+        filled_count = 0
+        for key, value in combined_data.items():
+            if key in self.basic_fields and value:
+                widget = self.basic_fields[key]
+                if isinstance(widget, tk.Text):
+                    widget.delete("1.0", tk.END)
+                    widget.insert("1.0", value)
+                else:
+                    widget.delete(0, tk.END)
+                    widget.insert(0, value)
+                filled_count += 1
+                self.log(f"✓ [AI] Filled {key} = {value}")
 
-            messagebox.showinfo(
-                "AI OCR Complete AI识别完成",
-                f"AI识别完成，填入了 {filled_count} 个字段！\n"
-                "手写字可能有认不清的地方，字段值末尾带 '?' 的表示AI自己也不确定，\n"
-                "请务必人工核对一遍再继续。\n\n"
-                f"AI extraction completed with {filled_count} field(s) filled.\n"
-                "Please verify carefully, especially any value ending with '?'."
-            )
+        self.log(f"✅ [AI] Total fields filled: {filled_count}")
+        self.nursing_status.config(text="Status: AI OCR completed ✓ AI识别完成", foreground="green")
 
-        except ImportError as e:
-            self.nursing_status.config(text="Status: AI OCR failed ✗ AI识别失败", foreground="red")
-            self.log(f"✗ AI OCR缺少依赖: {e}")
-
-            missing_module = getattr(e, "name", None) or ""
-            pip_hints = {
-                "google": "pip install google-genai",
-                "google.genai": "pip install google-genai",
-                "pytesseract": "pip install pytesseract\n"
-                                "  (还需要另外安装Tesseract引擎本体: "
-                                "https://github.com/UB-Mannheim/tesseract/wiki)",
-                "cv2": "pip install opencv-python",
-                "PIL": "pip install Pillow",
-            }
-            hint = pip_hints.get(missing_module, f"pip install {missing_module}" if missing_module else "")
+        self.notebook.select(self.basic_data_tab)
 
-            messagebox.showerror(
-                "Missing dependency 缺少依赖",
-                f"{e}\n\n请先运行:\n{hint}" if hint else str(e)
-            )
-        except Exception as e:
-            self.nursing_status.config(text="Status: AI OCR failed ✗ AI识别失败", foreground="red")
-            self.log(f"✗ AI OCR Error AI识别错误: {str(e)}")
-            logging.error(f"AI OCR nursing record error: {e}")
-            self.update_gemini_usage_display()
-            messagebox.showerror("Error 错误", f"AI OCR failed AI识别失败:\n{str(e)}")
+        messagebox.showinfo(
+            "AI OCR Complete AI识别完成",
+            f"AI识别完成，填入了 {filled_count} 个字段！\n"
+            "手写字可能有认不清的地方，字段值末尾带 '?' 的表示AI自己也不确定，\n"
+            "请务必人工核对一遍再继续。\n\n"
+            f"AI extraction completed with {filled_count} field(s) filled.\n"
+            "Please verify carefully, especially any value ending with '?'."
+        )
+
+    def _on_nursing_ai_failed(self, e):
+        self.nursing_status.config(text="Status: AI OCR failed ✗ AI识别失败", foreground="red")
+        if isinstance(e, ImportError):
+            self._show_missing_dependency(e)
+            return
+        self.log(f"✗ AI OCR Error AI识别错误: {str(e)}")
+        logging.error(f"AI OCR nursing record error: {e}")
+        self.update_gemini_usage_display()
+        messagebox.showerror("Error 错误", f"AI OCR failed AI识别失败:\n{str(e)}")
+
+    def _show_missing_dependency(self, e):
+        """OCR/AI识别缺少依赖时，提示要装哪个包"""
+        self.log(f"✗ OCR缺少依赖 Missing dependency: {e}")
+
+        missing_module = getattr(e, "name", None) or ""
+        pip_hints = {
+            "google": "pip install google-genai",
+            "google.genai": "pip install google-genai",
+            "pytesseract": "pip install pytesseract\n"
+                            "  (还需要另外安装Tesseract引擎本体: "
+                            "https://github.com/UB-Mannheim/tesseract/wiki)",
+            "cv2": "pip install opencv-python",
+            "PIL": "pip install Pillow",
+        }
+        hint = pip_hints.get(missing_module, f"pip install {missing_module}" if missing_module else "")
+
+        messagebox.showerror(
+            "Missing dependency 缺少依赖",
+            f"{e}\n\n请先运行:\n{hint}" if hint else str(e)
+        )
 
     def ocr_machine_screen(self):
-        """OCR识别透析机屏幕"""
+        """OCR识别透析机屏幕(后台任务)"""
         if not self.machine_image:
             messagebox.showwarning("Warning 警告", "Please upload machine screen image first\n请先上传透析机照片")
             return
             
         self.machine_status.config(text="Status: Processing OCR... 识别中...", foreground="orange")
         self.log("⏳ Starting OCR for dialysis machine 开始识别透析机...")
-        
-        try:
+        image_path = self.machine_image
+
+        def work(job):
+            job.report("Tesseract识别中 Running OCR...")
             from modules.ocr_module import DialysisOCR
-            ocr = DialysisOCR()
-            sample_data = ocr.extract_machine_screen(self.machine_image)
+            return DialysisOCR().extract_machine_screen(image_path)
 
-            if not sample_data or not any(sample_data.values()):
-                messagebox.showwarning(
-                    "Warning 警告",
-                    "No data extracted. Please try another photo or add manually.\n未识别到数据。请尝试其他照片或手动添加。"
-                )
-                return
-            
-            self.add_hourly_observation(sample_data)
-            
-            self.machine_status.config(text="Status: OCR completed ✓ 识别完成", foreground="green")
-            self.log("✓ Machine screen OCR completed 透析机识别完成")
-            
-            # 切换到每小时观察标签页
-            self.notebook.select(self.hourly_obs_tab)
-            
-            messagebox.showinfo(
-                "Success 成功",
-                "Hourly observation added!\nPlease verify the data.\n\n"
-                "每小时记录已添加！\n请验证数据。"
+        self.job_manager.submit(
+            "OCR 透析机屏幕 Machine screen", work,
+            on_done=self._on_machine_ocr_done, on_error=self._on_machine_ocr_failed, group="machine",
+        )
+
+    def _on_machine_ocr_done(self, sample_data):
+        if not sample_data or not any(sample_data.values()):
+            self.machine_status.config(text="Status: No data found 未识别到数据", foreground="orange")
+            messagebox.showwarning(
+                "Warning 警告",
+                "No data extracted. Please try another photo or add manually.\n未识别到数据。请尝试其他照片或手动添加。"
             )
-            
-        except Exception as e:
-            self.machine_status.config(text="Status: OCR failed ✗ 识别失败", foreground="red")
-            self.log(f"✗ OCR Error OCR错误: {str(e)}")
-            logging.error(f"OCR machine screen error: {e}")
-            messagebox.showerror("Error 错误", f"OCR failed OCR失败:\n{str(e)}")
+            return
+        
+        self.add_hourly_observation(sample_data)
+        
+        self.machine_status.config(text="Status: OCR completed ✓ 识别完成", foreground="green")
+        self.log("✓ Machine screen OCR completed 透析机识别完成")
+        
+        # 切换到每小时观察标签页
+        self.notebook.select(self.hourly_obs_tab)
+        
+        messagebox.showinfo(
+            "Success 成功",
+            "Hourly observation added!\nPlease verify the data.\n\n"
+            "每小时记录已添加！\n请验证数据。"
+        )
+
+    def _on_machine_ocr_failed(self, e):
+        self.machine_status.config(text="Status: OCR failed ✗ 识别失败", foreground="red")
+        if isinstance(e, ImportError):
+            self._show_missing_dependency(e)
+            return
+        self.log(f"✗ OCR Error OCR错误: {str(e)}")
+        logging.error(f"OCR machine screen error: {e}")
+        messagebox.showerror("Error 错误", f"OCR failed OCR失败:\n{str(e)}")
 
     def ocr_machine_screen_ai(self):
-        """用AI视觉模型(Gemini)识别透析机屏幕"""
+        """用AI视觉模型(Gemini)识别透析机屏幕(后台任务)"""
         if not self.machine_image:
             messagebox.showwarning("Warning 警告", "Please upload machine screen image first\n请先上传透析机照片")
             return
@@ -1233,90 +1541,88 @@ class DialysisAutomationSystem:
 
         self.machine_status.config(text="Status: AI Processing... AI识别中...", foreground="orange")
         self.log("⏳ Starting AI OCR (Gemini) for dialysis machine 开始AI识别透析机...")
+        image_path = self.machine_image
 
-        try:
+        def work(job):
             from modules.ai_ocr_module import GeminiMachineOCR
 
             # 透析机屏幕上不会有病人姓名/IC这类隐私信息，不需要打码这一步，直接发图
-            ocr = GeminiMachineOCR(api_key=api_key)
-            readings = ocr.extract_machine_screen(self.machine_image)
-            self.update_gemini_usage_display()
+            job.report("Gemini识别中 Waiting for Gemini...")
+            return GeminiMachineOCR(api_key=api_key).extract_machine_screen(image_path)
 
-            if not readings:
-                messagebox.showwarning(
-                    "Warning 警告",
-                    "AI没有识别到任何数据。请尝试其他照片或手动添加。\n"
-                    "No data extracted by AI. Please try another photo or add manually."
-                )
-                self.machine_status.config(text="Status: No data found 未识别到数据", foreground="orange")
-                return
+        self.job_manager.submit(
+            "AI识别 透析机屏幕 Machine screen (Gemini)", work,
+            on_done=self._on_machine_ai_done, on_error=self._on_machine_ai_failed, group="machine",
+        )
 
-            # 按TIME跟已有的hourly_observations去重，重复的时间点不重复添加
-            # 注意: 这里直接读表格(self.hourly_tree)里现在实际显示的内容，
-            # 而不是另外维护一份list——之前维护的那份list(self.hourly_observations)
-            # 只会一直往里加、从来不会因为你删除某一行或者点"清空病人资料/Next Patient"
-            # 而跟着清掉，导致换了新病人之后，AI识别到的新数据会被"上一位病人"的
-            # 旧时间点误判成重复而跳过。改成直接读表格，表格显示什么，去重就按什么算，
-            # 不会再有两边数据对不上的问题。
-            existing_times = set()
-            for item in self.hourly_tree.get_children():
-                row_values = self.hourly_tree.item(item)["values"]
-                if row_values:
-                    t = str(row_values[0]).strip()
-                    if t:
-                        existing_times.add(t)
-
-            added_count = 0
-            skipped_count = 0
-            for reading in readings:
-                t = str(reading.get("TIME", "")).strip()
-                if t and t in existing_times:
-                    skipped_count += 1
-                    self.log(f"  ⏭️  跳过重复时间点 {t}(已存在)")
-                    continue
-                self.add_hourly_observation(reading)
+    def _on_machine_ai_done(self, readings):
+        self.update_gemini_usage_display()
+
+        if not readings:
+            messagebox.showwarning(
+                "Warning 警告",
+                "AI没有识别到任何数据。请尝试其他照片或手动添加。\n"
+                "No data extracted by AI. Please try another photo or add manually."
+            )
+            self.machine_status.config(text="Status: No data found 未识别到数据", foreground="orange")
+            return
+
+        # 按TIME跟已有的hourly_observations去重，重复的时间点不重复添加
+        # 注意: 这里直接读表格(self.hourly_tree)里现在实际显示的内容，
+        # 而不是另外维护一份list——之前维护的那份list(self.hourly_observations)
+        # 只会一直往里加、从来不会因为你删除某一行或者点"清空病人资料/Next Patient"
+        # 而跟着清掉，导致换了新病人之后，AI识别到的新数据会被"上一位病人"的
+        # 旧时间点误判成重复而跳过。改成直接读表格，表格显示什么，去重就按什么算，
+        # 不会再有两边数据对不上的问题。
+        existing_times = set()
+        for item in self.hourly_tree.get_children():
+            row_values = self.hourly_tree.item(item)["values"]
+            if row_values:
+                t = str(row_values[0]).strip()
                 if t:
                     existing_times.add(t)
-                added_count += 1
 
-            self.machine_status.config(text="Status: AI OCR completed ✓ AI识别完成", foreground="green")
-            self.log(
-                f"✅ [AI] Machine screen extraction completed: "
-                f"识别到 {len(readings)} 条记录，新增 {added_count} 条，跳过重复 {skipped_count} 条"
-            )
-            for reading in readings:
-                t = str(reading.get("TIME", "")).strip()
-                self.log(f"  ✓ [AI] TIME={t} BP={reading.get('BP','')} PULSE={reading.get('PULSE','')}")
+        added_count = 0
+        skipped_count = 0
+        for reading in readings:
+            t = str(reading.get("TIME", "")).strip()
+            if t and t in existing_times:
+                skipped_count += 1
+                self.log(f"  ⏭️  跳过重复时间点 {t}(已存在)")
+                continue
+            self.add_hourly_observation(reading)
+            if t:
+                existing_times.add(t)
+            added_count += 1
 
-            self.notebook.select(self.hourly_obs_tab)
+        self.machine_status.config(text="Status: AI OCR completed ✓ AI识别完成", foreground="green")
+        self.log(
+            f"✅ [AI] Machine screen extraction completed: "
+            f"识别到 {len(readings)} 条记录，新增 {added_count} 条，跳过重复 {skipped_count} 条"
+        )
+        for reading in readings:
+            t = str(reading.get("TIME", "")).strip()
+            self.log(f"  ✓ [AI] TIME={t} BP={reading.get('BP','')} PULSE={reading.get('PULSE','')}")
 
-            messagebox.showinfo(
-                "Success 成功",
-                f"AI识别完成！共识别到 {len(readings)} 条记录，"
-                f"新增 {added_count} 条，跳过重复 {skipped_count} 条。\n请验证数据。\n\n"
-                f"AI extraction completed: {len(readings)} reading(s) found, "
-                f"{added_count} added, {skipped_count} duplicate(s) skipped.\nPlease verify."
-            )
+        self.notebook.select(self.hourly_obs_tab)
 
-        except ImportError as e:
-            self.machine_status.config(text="Status: AI OCR failed ✗ AI识别失败", foreground="red")
-            self.log(f"✗ AI OCR缺少依赖: {e}")
-            missing_module = getattr(e, "name", None) or ""
-            pip_hints = {
-                "google": "pip install google-genai",
-                "google.genai": "pip install google-genai",
-            }
-            hint = pip_hints.get(missing_module, f"pip install {missing_module}" if missing_module else "")
-            messagebox.showerror(
-                "Missing dependency 缺少依赖",
-                f"{e}\n\n请先运行:\n{hint}" if hint else str(e)
-            )
-        except Exception as e:
-            self.machine_status.config(text="Status: AI OCR failed ✗ AI识别失败", foreground="red")
-            self.log(f"✗ AI OCR Error AI识别错误: {str(e)}")
-            logging.error(f"AI OCR machine screen error: {e}")
-            self.update_gemini_usage_display()
-            messagebox.showerror("Error 错误", f"AI OCR failed AI识别失败:\n{str(e)}")
+        messagebox.showinfo(
+            "Success 成功",
+            f"AI识别完成！共识别到 {len(readings)} 条记录，"
+            f"新增 {added_count} 条，跳过重复 {skipped_count} 条。\n请验证数据。\n\n"
+            f"AI extraction completed: {len(readings)} reading(s) found, "
+            f"{added_count} added, {skipped_count} duplicate(s) skipped.\nPlease verify."
+        )
+
+    def _on_machine_ai_failed(self, e):
+        self.machine_status.config(text="Status: AI OCR failed ✗ AI识别失败", foreground="red")
+        if isinstance(e, ImportError):
+            self._show_missing_dependency(e)
+            return
+        self.log(f"✗ AI OCR Error AI识别错误: {str(e)}")
+        logging.error(f"AI OCR machine screen error: {e}")
+        self.update_gemini_usage_display()
+        messagebox.showerror("Error 错误", f"AI OCR failed AI识别失败:\n{str(e)}")
 
     def add_hourly_observation(self, data):
         """添加每小时观察记录"""
@@ -1625,7 +1931,25 @@ class DialysisAutomationSystem:
             return
         
         self.log("⏳ Starting Origin automation Origin自动化开始...")
-    
+
+        if self._session_running():
+            # 常驻会话已经登录好了，直接提交，不用再等登录；结果回来后在主线程提示
+            future = self._session_service.submit(mrn, self.collect_all_data())
+
+            def on_done(f):
+                result = f.result()
+                if result.get("success"):
+                    self.root.after(0, self.complete_origin_automation)
+                else:
+                    reason = result.get("reason", "")
+                    self.root.after(0, lambda: (
+                        self.log(f"✗ Automation error 自动化错误: {reason}"),
+                        messagebox.showerror("Error 错误", f"Automation failed 自动化失败:\n{reason}")
+                    ))
+
+            future.add_done_callback(on_done)
+            return
+
         try:
             from modules.origin_automation import OriginAutomation
         
@@ -1633,12 +1957,24 @@ class DialysisAutomationSystem:
                 self.log(message)
                 self.root.update()
         
-            origin = OriginAutomation(self.config.get("origin_url"))
+            keep_warm = self._keep_browser_warm()
+            if keep_warm:
+                # 预热线程可能还没跑完，等它结束再用同一个浏览器，避免两边同时操作driver
+                if self._warm_thread is not None and self._warm_thread.is_alive():
+                    self._warm_thread.join()
+                if self._warm_origin is None:
+                    self._warm_origin = OriginAutomation(self.config.get("origin_url"))
+                origin = self._warm_origin
+            else:
+                origin = OriginAutomation(self.config.get("origin_url"))
+            # Origin表单里已经有不同的值时，先问护理师要不要覆盖
+            origin.confirm_conflicts = self._confirm_fill_conflicts
             data = self.collect_all_data()
         
             success = origin.run_automation(
                 username, password, mrn, data,
-                callback=progress_callback
+                callback=progress_callback,
+                keep_browser_open=keep_warm
             )
         
             if success:
@@ -1651,6 +1987,21 @@ class DialysisAutomationSystem:
             logging.error(f"Automation error: {e}")
             messagebox.showerror("Error 错误", f"Automation failed 自动化失败:\n{str(e)}")
             
+    def _confirm_fill_conflicts(self, conflicts):
+        """填表时发现Origin里已经有不同的值: 列出来问要不要覆盖(默认不覆盖)"""
+        lines = "\n".join(
+            f"• {c['field']}: Origin '{c['current']}' → '{c['intended']}'" for c in conflicts[:15]
+        )
+        if len(conflicts) > 15:
+            lines += f"\n… 还有 {len(conflicts) - 15} 个 more"
+        return messagebox.askyesno(
+            "Origin里已有不同的值 Existing values differ",
+            f"以下 {len(conflicts)} 个字段在Origin里已经有值，而且跟这次要填的不一样：\n\n{lines}\n\n"
+            "要用这次的数据覆盖吗？选\"否\"会保留Origin里原来的值，其余字段照常填入。\n\n"
+            "Overwrite these with the new data? \"No\" keeps the existing Origin values.",
+            default="no"
+        )
+
     def complete_origin_automation(self):
         """完成Origin自动化"""
         self.log("💾 Saving data 保存数据...")
@@ -1693,6 +2044,14 @@ class DialysisAutomationSystem:
         batch_pass_entry = ttk.Entry(login_frame, width=28, show="*", textvariable=self.origin_password_var)
         batch_pass_entry.grid(row=1, column=1, padx=5, pady=3)
 
+        # 批量专用的省资源浏览器(无头、不加载图片等)，默认值来自 config.json 的 selenium_settings.batch_profile
+        fast_mode_var = tk.BooleanVar(value=self._batch_browser_profile() == "batch_fast")
+        ttk.Checkbutton(
+            login_frame,
+            text="后台无头模式(不显示浏览器窗口、不加载图片) Headless lean mode",
+            variable=fast_mode_var
+        ).grid(row=2, column=0, columnspan=2, sticky=tk.W, padx=5, pady=(3, 0))
+
         # ===== 底部固定操作区(操作按钮 + 提示 + 开始按钮) =====
         # 关键: 这里必须先打包(pack)、且用 side="bottom"，再打包下面会撑开的
         # 病人队列列表。这样无论队列里有多少病人、提示文字多长，这个区域
@@ -1747,7 +2106,8 @@ class DialysisAutomationSystem:
             """队列里每一行显示的'来源': 表单直接加入的没有json_path，
             从JSON文件加入的显示文件名。"""
             jp = j.get("json_path")
-            return os.path.basename(jp) if jp else "📝 表单直接加入 In-app form"
+            label = os.path.basename(jp) if jp else "📝 表单直接加入 In-app form"
+            return f"⚠️ 需确认 Review · {label}" if j.get("needs_review") else label
 
         # 直接复用 self.batch_queue 这个列表对象(不是拷贝)，
         # 这样在这个弹窗里增删的结果会同步回主界面的队列，
@@ -1776,7 +2136,7 @@ class DialysisAutomationSystem:
 
             def on_search(event=None):
                 q = search_entry.get()
-                matches = search_patients(self.patients, q)[:12]
+                matches = search_patients(self.patients, q, limit=12, fuzzy=True)
                 matches_holder["matches"] = matches
                 result_listbox.delete(0, tk.END)
                 for p in matches:
@@ -1899,6 +2259,13 @@ class DialysisAutomationSystem:
                 tree.insert("", "end", values=(j["name"], j["mrn"], _job_source_label(j)))
 
         def start_batch():
+            if self._batch_pipeline is not None:
+                messagebox.showwarning(
+                    "提示 Notice",
+                    "边识别边填入正在进行中，新加入的病人会自动填入，不用再开始批量填入\n"
+                    "A live batch is running; queued patients are filled automatically"
+                )
+                return
             if not jobs:
                 messagebox.showwarning("提示 Notice", "还没有添加任何病人\nNo patients added yet")
                 return
@@ -1917,44 +2284,156 @@ class DialysisAutomationSystem:
             ):
                 return
 
+            # 上次有字段没覆盖的病人: 开始前问一次，这一批里要不要直接覆盖Origin里原有的值
+            review_jobs = [j for j in jobs if j.get("needs_review")]
+            if review_jobs:
+                overwrite = messagebox.askyesno(
+                    "覆盖Origin里的值？ Overwrite values in Origin?",
+                    f"以下 {len(review_jobs)} 位病人上次有字段跟Origin里原有的值不同，没有覆盖：\n\n"
+                    + "\n".join(f"  • {j['name']} ({j['mrn']})" for j in review_jobs)
+                    + "\n\n这一次要用队列里的数据覆盖这些字段吗？选\"否\"的话照旧保留Origin里的值。\n\n"
+                    "Last time these patients had fields that differ from Origin and were not overwritten. "
+                    "Overwrite them with the queued values this time?"
+                )
+                for j in review_jobs:
+                    j["overwrite_conflicts"] = overwrite
+
+            profile = "batch_fast" if fast_mode_var.get() else "default"
             dialog.destroy()
-            self._run_batch_in_background(username, password, jobs)
+            self._run_batch_in_background(username, password, jobs, profile=profile)
 
-    def _run_batch_in_background(self, username, password, jobs):
+    def check_unfinished_batch(self):
+        """
+        启动时检查落盘日志(data/batch_journal/)里有没有上次没跑完的批次
+        (程序崩溃、Chrome挂掉、电脑重启等)。有的话问护理师要不要恢复:
+        恢复后，没确认保存成功的病人会重新放回批量队列，已经保存成功的不会再放回来，
+        避免同一位病人被重复写入。
+        """
+        try:
+            from modules.batch_journal import BatchJournal, KEEP_FINISHED_DAYS
+            keep_days = self.config.get("batch_journal", {}).get("keep_days", KEEP_FINISHED_DAYS)
+            BatchJournal.prune_finished(keep_days=keep_days)
+            journal = BatchJournal.find_unfinished()
+        except Exception as e:
+            logging.warning(f"检查未完成的批量日志失败: {e}")
+            return
+        if journal is None:
+            return
+
+        remaining = journal.remaining_jobs()
+        names_preview = "\n".join(f"  {i+1}. {j.get('name')} ({j.get('mrn')})" for i, j in enumerate(remaining))
+        if messagebox.askyesno(
+            "恢复上次未完成的批量填入 Resume unfinished batch",
+            f"上次的批量填入没有正常结束，还有 {len(remaining)} 位病人没有确认保存成功：\n\n"
+            f"{names_preview}\n\n"
+            "要把他们放回批量队列吗？(已经保存成功的病人不会再放回来)\n\n"
+            f"The last batch did not finish; {len(remaining)} patient(s) were not confirmed as saved. "
+            "Put them back into the batch queue?"
+        ):
+            queued_mrns = {j["mrn"] for j in self.batch_queue}
+            for job in remaining:
+                if job["mrn"] not in queued_mrns:
+                    self.batch_queue.append(job)
+            self.update_batch_queue_label()
+            # 旧批次先不标记结束: 恢复的病人现在只在内存里的队列中，万一又崩溃，下次启动还能再提示；
+            # 它们在新批次里保存成功以后，find_unfinished 会认出来，不会重复提示
+            self.log(f"♻️ 已从落盘日志恢复 {len(remaining)} 位未完成的病人到批量队列 ({journal.batch_id})")
+        else:
+            self.log(f"ℹ️  已放弃恢复上次未完成的批量填入 ({journal.batch_id})")
+            # 护理师明确放弃了，这个旧批次下次启动不再询问
+            journal.mark_finished()
+
+    def _batch_browser_profile(self):
+        return self.config.get("selenium_settings", {}).get("batch_profile", "default")
+
+    def _run_batch_in_background(self, username, password, jobs, profile=None, journal=None, on_finished=None):
         """
         在后台线程运行批量自动化，避免Selenium的等待时间把tkinter主界面卡死。
         日志通过 self.root.after(0, ...) 转发回主线程更新，
         因为tkinter的控件不是线程安全的，不能从子线程里直接操作。
+        每位病人的状态变化同时写进落盘日志(batch_journal)，中途崩溃也能续跑。
+
+        jobs 可以是list，也可以是 BatchPipeline(边识别边填入，病人陆续交进来)；
+        后者由调用方自己建好journal传进来。on_finished 在主线程里、结果弹窗之前调用。
         """
         self.notebook.select(self.log_tab)
-        self.log(f"📦 开始批量填入，共 {len(jobs)} 位病人 Starting batch for {len(jobs)} patient(s)...")
+        if isinstance(jobs, list):
+            self.log(f"📦 开始批量填入，共 {len(jobs)} 位病人 Starting batch for {len(jobs)} patient(s)...")
+        else:
+            self.log("📦 开始边识别边填入 Starting live batch...")
 
         def progress_callback(msg):
             self.root.after(0, lambda m=msg: self.log(m))
 
         def worker():
+            nonlocal journal
+            results = []
             try:
                 from modules.origin_automation import OriginAutomation
-                origin = OriginAutomation(self.config.get("origin_url"))
-                results = origin.run_batch_automation(
-                    username, password, jobs, callback=progress_callback
-                )
+                from modules.batch_journal import BatchJournal
+                if journal is None:
+                    journal = BatchJournal.create(jobs)
+                progress_callback(f"📝 批量进度落盘日志 Batch journal: {journal.path}")
+                if self._session_running():
+                    progress_callback("🔌 使用常驻Origin会话，不用重新登录 Using shift session")
+                    results = self._session_service.run_batch(jobs, journal=journal)
+                else:
+                    origin = OriginAutomation(
+                        self.config.get("origin_url"), profile=profile or self._batch_browser_profile()
+                    )
+                    results = origin.run_batch_automation(
+                        username, password, jobs, callback=progress_callback, journal=journal
+                    )
+                # 登录失败/中途出错时，有的病人还没有结论；这时不能标记结束，下次启动才会提示恢复
+                if journal.all_terminal():
+                    journal.mark_finished()
+                else:
+                    progress_callback(
+                        "⚠️ 还有病人没有处理完，落盘日志保留，下次启动可以恢复 "
+                        "Some patients were not processed; the journal is kept for resume"
+                    )
 
                 def show_summary():
-                    total = len(jobs)
+                    if on_finished is not None:
+                        on_finished()
+                    total = len(results)
                     success_mrns = {r.get("mrn") for r in results if r.get("success")}
                     success = len(success_mrns)
+                    from modules.form_diff import summarize_verification
                     lines = []
+                    unverified = 0
+                    review = 0
                     for r in results:
-                        mark = "✅" if r.get("success") else "❌"
+                        review += bool(r.get("needs_review"))
+                        mark = "✅" if r.get("success") else ("⚠️" if r.get("needs_review") else "❌")
                         extra = f" — {r['reason']}" if r.get("reason") else ""
+                        held = (r.get("fill_report") or {}).get("held")
+                        if held:
+                            extra += f"\n      ⚠️ 未覆盖 held: {', '.join(held[:6])}" + (" …" if len(held) > 6 else "")
+                        overflow = (r.get("fill_report") or {}).get("overflow")
+                        if overflow:
+                            extra += f"\n      ⚠️ 每小时记录没有空位 no slot: {', '.join(overflow)}"
+                        verification = r.get("verification")
+                        if verification:
+                            unverified += verification.get("status") != "verified"
+                            extra += f"\n      🔎 {summarize_verification(verification)}"
+                            bad = verification.get("mismatches", []) + verification.get("missing", [])
+                            if bad:
+                                extra += f": {', '.join(bad[:6])}" + (" …" if len(bad) > 6 else "")
+                        else:
+                            unverified += 1
                         lines.append(f"{mark} {r.get('name')} (MRN {r.get('mrn')}){extra}")
                     summary_text = "\n".join(lines) if lines else "(没有处理结果 No results)"
 
                     # 成功的病人从队列移除；失败的留在队列里，方便直接重试而不用重新做一次OCR
                     # Remove succeeded patients from the queue; keep failures queued so they can
                     # be retried directly without redoing OCR.
+                    # 需要确认的(有字段没覆盖/核对不一致)也留在队列里，做个记号，下次开始前会问要不要覆盖
                     self.batch_queue[:] = [j for j in self.batch_queue if j["mrn"] not in success_mrns]
+                    review_mrns = {r.get("mrn") for r in results if r.get("needs_review")}
+                    for j in self.batch_queue:
+                        if j["mrn"] in review_mrns:
+                            j["needs_review"] = True
                     self.update_batch_queue_label()
 
                     retry_note = (
@@ -1962,12 +2441,23 @@ class DialysisAutomationSystem:
                         "Failed patients remain in the queue and can be retried directly."
                         if success < total else ""
                     )
+                    if review:
+                        retry_note += (
+                            f"\n\n⚠️ {review} 位病人有字段跟Origin里原有的值不同没有覆盖(或保存后核对不一致)，"
+                            "已留在队列里。请在Origin里核对；需要覆盖的话，再开始一次批量填入时选择覆盖。\n"
+                            f"{review} patient(s) need review and remain queued; "
+                            "start the batch again and choose to overwrite if Origin should take the new values."
+                        )
                     messagebox.showinfo(
                         "批量填入完成 Batch Auto-Fill Complete",
                         f"共 {total} 位病人，成功 {success} 位。\n"
                         f"Total {total}, succeeded {success}.\n\n{summary_text}{retry_note}\n\n"
-                        "请务必在Origin系统里逐一核对数据。\n"
-                        "Please verify the data in Origin for each patient."
+                        + (
+                            f"有 {unverified} 位病人没有通过保存后核对(或没有核对)，请在Origin里检查这几位。\n"
+                            f"{unverified} patient(s) were not verified after saving; please check them in Origin."
+                            if unverified else
+                            "所有病人保存后都已读回核对一致。\nAll patients were verified by reading back after saving."
+                        )
                     )
 
                 self.root.after(0, show_summary)
@@ -1975,20 +2465,105 @@ class DialysisAutomationSystem:
             except Exception as e:
                 logging.error(f"Batch automation error: {e}")
                 err_msg = str(e)
-                self.root.after(
-                    0,
-                    lambda: messagebox.showerror(
-                        "错误 Error", f"批量填入过程中出错 Batch automation failed:\n{err_msg}"
-                    )
-                )
+
+                def show_error():
+                    if on_finished is not None:
+                        on_finished()
+                    messagebox.showerror("错误 Error", f"批量填入过程中出错 Batch automation failed:\n{err_msg}")
+
+                self.root.after(0, show_error)
 
         threading.Thread(target=worker, daemon=True).start()
 
+    def toggle_live_batch(self):
+        """
+        开始/结束"边识别边填入": 开始后浏览器登录一次，队列里已有的病人先填；
+        之后每点一次"加入批量队列"，那位病人就直接交给浏览器接着填，不用等全部OCR完。
+        点"结束"表示没有新病人了，浏览器把剩下的填完就关闭。
+        """
+        if self._batch_pipeline is not None:
+            # 不能直接 close(): 关了以后 offer() 一律返回False，还在 _pipeline_backlog 里等的病人
+            # 就再也交不出去了。先记下"要结束"，等着的全部交出去以后由 _feed_pipeline 关
+            self._pipeline_finishing = True
+            self.live_batch_button.config(text="⏳ 填完剩下的病人后结束 Finishing...", state="disabled")
+            waiting = len(self._pipeline_backlog)
+            self.log(
+                "🏁 不再接收新病人，处理完剩下的就结束 No more patients; finishing the live batch"
+                + (f" (还有 {waiting} 位在等 waiting)" if waiting else "")
+            )
+            self._feed_pipeline()
+            return
+
+        username = self.username_entry.get()
+        password = self.password_entry.get()
+        if not username or not password:
+            messagebox.showwarning("Warning 警告", "请先填写Origin用户名/密码\nPlease enter Origin username/password first")
+            return
+        if not messagebox.askyesno(
+            "边识别边填入 Live Batch",
+            "浏览器会先登录并填入队列里已有的病人；\n"
+            "之后每\"加入批量队列\"一位病人，就会接着自动填入。\n"
+            "全部做完后再点一次这个按钮结束。\n\n"
+            "过程中请不要手动点击或关闭浏览器窗口。确定开始吗？\n\n"
+            "The browser logs in and fills the queued patients, then keeps filling each patient "
+            "you add to the queue. Click this button again when there are no more patients."
+        ):
+            return
+
+        from modules.batch_journal import BatchJournal
+        from modules.batch_pipeline import BatchPipeline, DEFAULT_MAX_PENDING
+
+        def progress_callback(msg):
+            self.root.after(0, lambda m=msg: self.log(m))
+
+        max_pending = self.config.get("batch_pipeline", {}).get("max_pending", DEFAULT_MAX_PENDING)
+        journal = BatchJournal.create([])
+        self._batch_pipeline = BatchPipeline(
+            max_pending=max_pending,
+            journal=journal,
+            # 浏览器取走一位，就回主线程把等着的下一位补进去
+            on_taken=lambda job: self.root.after(0, self._feed_pipeline),
+            callback=progress_callback,
+        )
+        self._pipeline_backlog = list(self.batch_queue)
+        self._pipeline_handed_mrns = set()
+        self._pipeline_finishing = False
+        self._feed_pipeline()
+        self.live_batch_button.config(text="🏁 结束边识别边填入 Finish Live Batch")
+
+        def on_finished():
+            self._batch_pipeline = None
+            self._pipeline_backlog = []
+            self._pipeline_handed_mrns = set()
+            self._pipeline_finishing = False
+            self.live_batch_button.config(text="🔀 边识别边填入 Start Live Batch", state="normal")
+
+        self._run_batch_in_background(
+            username, password, self._batch_pipeline, journal=journal, on_finished=on_finished
+        )
+
+    def _feed_pipeline(self):
+        """主线程里调用: 流水线有空位就把等着的病人按顺序交进去；正在结束的话，等着的交完就关流水线"""
+        pipeline = self._batch_pipeline
+        if pipeline is None:
+            return
+        while self._pipeline_backlog and pipeline.offer(self._pipeline_backlog[0]):
+            job = self._pipeline_backlog.pop(0)
+            self._pipeline_handed_mrns.add(job["mrn"])
+            self.log(f"🔀 已交给浏览器 Handed to browser: {job['name']} ({job['mrn']})")
+        if self._pipeline_finishing and not self._pipeline_backlog and not pipeline.closed:
+            pipeline.close()
+            self.log("🏁 等着的病人都已交给浏览器，填完就结束 All waiting patients handed over")
+
     def _clear_form_fields(self, clear_patient=False):
         """清空表单/图片(共用逻辑)，不动批量队列。
         Shared logic to clear the form/images. Never touches the batch queue.
         clear_patient=True 时连搜索到的病人姓名/MRN也一起清掉(准备处理下一位病人时用)。
         """
+        if clear_patient:
+            # 上一位病人还没识别完的照片，结果不能再填进下一位病人的表单
+            self.job_manager.cancel_group("nursing")
+            self.job_manager.cancel_group("machine")
         # 清除基本数据
         for widget in self.basic_fields.values():
             try:
@@ -2080,12 +2655,24 @@ class DialysisAutomationSystem:
         # 队列里已经有同一个MRN时，询问是否用当前数据覆盖(避免重复处理同一人两次)
         for i, job in enumerate(self.batch_queue):
             if job["mrn"] == mrn:
+                if mrn in self._pipeline_handed_mrns:
+                    messagebox.showwarning(
+                        "已交给浏览器 Already handed over",
+                        f"{display_name} 已经交给正在运行的边识别边填入，可能正在填表，不能再覆盖。\n"
+                        "等这一批结束后，再单独用\"自动填入\"更正。\n\n"
+                        f"{display_name} was already handed to the live batch and may be filling now; "
+                        "correct it with a single Auto Fill after the batch."
+                    )
+                    return
                 if messagebox.askyesno(
                     "已在队列中 Already in queue",
                     f"{display_name} 已经在队列里了，是否用目前表单的数据覆盖？\n\n"
                     f"{display_name} is already in the queue. Replace it with the current form data?"
                 ):
                     self.batch_queue[i] = {"mrn": mrn, "name": display_name, "data": data}
+                    self._pipeline_backlog[:] = [
+                        self.batch_queue[i] if j["mrn"] == mrn else j for j in self._pipeline_backlog
+                    ]
                     self.update_batch_queue_label()
                     self.log(f"🔁 已更新队列中的病人 Updated in queue: {display_name} ({mrn})")
                 return
@@ -2096,6 +2683,9 @@ class DialysisAutomationSystem:
             f"➕ 已加入批量队列 Added to batch queue: {display_name} ({mrn}) "
             f"— 队列共 {len(self.batch_queue)} 位 total"
         )
+        if self._batch_pipeline is not None and not self._pipeline_finishing:
+            self._pipeline_backlog.append(self.batch_queue[-1])
+            self._feed_pipeline()
 
         if messagebox.askyesno(
             "已加入队列 Added to Queue",
@@ -2147,6 +2737,10 @@ def main():
     os.makedirs('logs', exist_ok=True)
     os.makedirs('data/exports', exist_ok=True)
     
+    from modules.startup_profile import StartupProfile
+    startup_profile = StartupProfile(_PROCESS_STARTED)
+    startup_profile.mark("imports")
+
     root = tk.Tk()
     
     # 设置窗口图标（如果有）
@@ -2155,7 +2749,7 @@ def main():
     except:
         pass
     
-    app = DialysisAutomationSystem(root)  # ✅ 修复：传入 root 参数
+    app = DialysisAutomationSystem(root, startup_profile=startup_profile)  # ✅ 修复：传入 root 参数
     
     # 窗口居中
     root.update_idletasks()
@@ -2164,7 +2758,9 @@ def main():
     x = (root.winfo_screenwidth() // 2) - (width // 2)
     y = (root.winfo_screenheight() // 2) - (height // 2)
     root.geometry(f'{width}x{height}+{x}+{y}')
-    
+
+    # 排在窗口第一次重绘之后: 真正"可以操作"的时间点
+    root.after_idle(app.on_window_shown)
     root.mainloop()
 
 
@@ -0,0 +1,250 @@
+"""
+batch_journal.py
+批量填入的"落盘日志"(journal)——每个病人在批量处理过程中的每一次状态变化
+(queued -> found -> editing -> filled -> saved / needs_review / failed)都立刻追加写进一个JSONL文件，
+并且写完就 fsync，保证哪怕程序崩溃、Chrome挂掉、电脑直接重启，
+磁盘上也留有"到底哪几位病人已经真正保存成功"的记录。
+
+重新打开程序时，main.py会检查有没有"没跑完"的批次，
+可以直接从第一个没完成的病人继续，已经确认保存成功(saved)的病人会被跳过，
+不会重复写入同一位病人。
+
+跟 patients.json 一样，这里面存着病人的数据，属于敏感文件，只留在本机。
+正常结束的批次保留 keep_days 天(config.json 的 batch_journal.keep_days)就删掉，
+不然这些文件和每次启动检查它们的时间都会一直涨；比还没结束的批次新的那些不删，
+恢复时要靠它们认出"已经在新批次里保存过了"。
+
+用法:
+    journal = BatchJournal.create(jobs)          # 开始一个新批次，所有病人记为queued
+    journal.record(job_key(job), "found")        # 状态变化时追加一行
+    journal.mark_finished()                      # 整批跑完
+
+    BatchJournal.prune_finished(keep_days=14)    # 程序启动时先清掉过期的旧批次
+    unfinished = BatchJournal.find_unfinished()  # 再检查有没有没跑完的
+    if unfinished:
+        jobs = unfinished.remaining_jobs()       # 只剩没保存成功的病人
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.path.join("data", "batch_journal")
+KEEP_FINISHED_DAYS = 14  # 正常结束的批次保留几天
+
+# 一位病人在批量处理中的状态，按流程先后排列
+# needs_review: 保存了，但有字段跟Origin里原有的值不同没有覆盖，或者保存后核对不一致，
+# 要护理师确认——不算saved，恢复时会跟失败的病人一样重新放回队列
+JOB_STATES = ["queued", "found", "editing", "filled", "saved", "needs_review", "failed"]
+
+# 这几个状态代表"这位病人这一轮已经有结论了"
+TERMINAL_STATES = ("saved", "needs_review", "failed")
+
+
+def job_key(job):
+    """
+    给队列里的一个job算一个稳定的key: MRN + 数据内容的哈希。
+    同一位病人、同一份数据，不管程序重启多少次key都一样，这样才能认出
+    "这一份已经保存过了"；护士改过数据再重新加入队列的话，key会变，
+    会被当成新的一次填入，不会被误跳过。
+    """
+    mrn = str(job.get("mrn", "")).strip()
+    data = dict(job.get("data") or {})
+    data.pop("timestamp", None)  # collect_all_data()每次调用都会变的字段，不参与哈希
+    digest = hashlib.sha1(
+        json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()[:12]
+    return f"{mrn}:{digest}"
+
+
+class BatchJournal:
+    """一个批次对应一个追加写入的JSONL文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.batch_id = os.path.splitext(os.path.basename(path))[0]
+        # 在更新的批次里已经保存成功的key(恢复到队列后在新批次里填好了)，不再算"没完成"
+        self.saved_elsewhere = set()
+
+    @classmethod
+    def create(cls, jobs, journal_dir=JOURNAL_DIR):
+        """开始一个新批次: 建文件，把每个病人(连同要填的数据)记为queued"""
+        os.makedirs(journal_dir, exist_ok=True)
+        batch_id = datetime.now().strftime("batch_%Y%m%d_%H%M%S_%f")
+        journal = cls(os.path.join(journal_dir, f"{batch_id}.jsonl"))
+        journal._append({"event": "batch_started", "total": len(jobs)})
+        for job in jobs:
+            journal.add_job(job)
+        return journal
+
+    @staticmethod
+    def _journal_names(journal_dir):
+        """所有批次的文件名，新的在前(文件名里是开始时间)"""
+        if not os.path.isdir(journal_dir):
+            return []
+        return sorted((f for f in os.listdir(journal_dir) if f.endswith(".jsonl")), reverse=True)
+
+    @classmethod
+    def find_unfinished(cls, journal_dir=JOURNAL_DIR):
+        """
+        找最近一个"没有正常结束、而且还有病人没保存成功"的批次，没有就返回None。
+        正常跑完的批次会写一行 batch_finished，不会再被当成需要恢复的批次。
+        从新到旧看，找到第一个就停；没结束但病人都已经保存过的批次顺手标记结束，下次不用再读。
+        """
+        saved_later = set()
+        for name in cls._journal_names(journal_dir):
+            journal = cls(os.path.join(journal_dir, name))
+            journal.saved_elsewhere = set(saved_later)
+            saved_later |= journal.saved_keys()
+            if journal.is_finished():
+                continue
+            if journal.remaining_jobs():
+                return journal
+            journal.mark_finished()
+        return None
+
+    @classmethod
+    def prune_finished(cls, journal_dir=JOURNAL_DIR, keep_days=KEEP_FINISHED_DAYS):
+        """
+        删掉结束超过 keep_days 天的批次，返回删了几个。
+        比最旧的没结束批次还新的不删(它们记着哪些病人已经在后来的批次里保存了)。
+        """
+        names = cls._journal_names(journal_dir)
+        unfinished = [n for n in names if not cls(os.path.join(journal_dir, n)).is_finished()]
+        oldest_unfinished = min(unfinished) if unfinished else None
+        cutoff = (datetime.now() - timedelta(days=keep_days)).timestamp()
+        removed = 0
+        for name in names:
+            if name in unfinished or (oldest_unfinished is not None and name > oldest_unfinished):
+                continue
+            path = os.path.join(journal_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"⚠️  删除过期的批量日志失败 {path}: {e}")
+        if removed:
+            logger.info(f"🧹 删除了 {removed} 个超过 {keep_days} 天的批量日志")
+        return removed
+
+    def _append(self, entry):
+        entry = {"ts": datetime.now().isoformat(timespec="seconds"), **entry}
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        try:
+            # 上次崩溃时最后一行可能只写了一半(没有换行符)，先补一个换行，
+            # 不然这一行会接在残行后面，两行一起变成无法解析的垃圾
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())  # 写完立刻落盘，断电/崩溃也不会丢这一行
+        except Exception as e:
+            logger.warning(f"⚠️  写入批量日志失败 {self.path}: {e}")
+
+    def add_job(self, job):
+        """把一个病人加进这个批次(记为queued)，流水线模式下病人是陆续加进来的"""
+        self._append({
+            "event": "state",
+            "key": job_key(job),
+            "state": "queued",
+            "job": {
+                "mrn": str(job.get("mrn", "")).strip(),
+                "name": job.get("name"),
+                "data": job.get("data", {}),
+                "json_path": job.get("json_path"),
+            },
+        })
+
+    def record(self, key, state, reason=""):
+        """追加一次状态变化"""
+        if state not in JOB_STATES:
+            raise ValueError(f"未知的状态: {state}")
+        entry = {"event": "state", "key": key, "state": state}
+        if reason:
+            entry["reason"] = reason
+        self._append(entry)
+
+    def mark_finished(self):
+        self._append({"event": "batch_finished"})
+
+    def _read_entries(self):
+        """逐行读取；最后一行如果是崩溃时写了一半的残行，直接忽略"""
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"⚠️  批量日志里有一行无法解析(可能是崩溃时写了一半)，已跳过: {self.path}")
+        return entries
+
+    def is_finished(self):
+        """batch_finished 总是最后一行，只看文件末尾，不用把整个文件读一遍"""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 512))
+                tail = f.read().decode("utf-8", errors="ignore")
+        except OSError:
+            return False
+        lines = [line for line in tail.splitlines() if line.strip()]
+        if not lines:
+            return False
+        try:
+            return json.loads(lines[-1]).get("event") == "batch_finished"
+        except ValueError:
+            return False
+
+    def job_states(self):
+        """返回 {key: 最后一次记录的状态}"""
+        states = {}
+        for e in self._read_entries():
+            if e.get("event") == "state":
+                states[e["key"]] = e.get("state")
+        return states
+
+    def last_state(self, key):
+        return self.job_states().get(key)
+
+    def is_saved(self, key):
+        return self.last_state(key) == "saved"
+
+    def saved_keys(self):
+        return {key for key, state in self.job_states().items() if state == "saved"}
+
+    def all_terminal(self):
+        """每位病人都有结论了(saved/needs_review/failed)；登录失败、中途出错时会有病人停在queued/editing"""
+        return all(state in TERMINAL_STATES for state in self.job_states().values())
+
+    def remaining_jobs(self):
+        """
+        按原来的顺序返回所有还没确认保存成功的job(失败的、做到一半的都算)。
+        同一个key只返回一次。
+        """
+        jobs, seen = [], set()
+        states = {}
+        for e in self._read_entries():
+            if e.get("event") != "state":
+                continue
+            states[e["key"]] = e.get("state")
+            if e.get("state") == "queued" and e.get("job") and e["key"] not in seen:
+                seen.add(e["key"])
+                jobs.append((e["key"], e["job"]))
+        return [
+            dict(job) for key, job in jobs
+            if states.get(key) != "saved" and key not in self.saved_elsewhere
+        ]
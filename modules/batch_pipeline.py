@@ -0,0 +1,115 @@
+"""
+batch_pipeline.py
+"边识别边填入"的批量流水线: OCR(生产者) 和 Origin填表(消费者) 同时进行。
+
+原来的流程是: 所有病人的照片都OCR完、核对完、逐个"加入批量队列"，最后才点
+"批量填入"，整班的时间 = OCR总时间 + 填表总时间，两段完全不重叠。
+
+现在:
+    pipeline = BatchPipeline(max_pending=2)
+    后台线程: origin.run_batch_automation(..., jobs=pipeline)   # 消费者，登录一次后逐个取
+    主界面:   pipeline.offer(job)                               # 护理师核对完一位就交一位
+    最后:     pipeline.close()                                  # 没有新病人了，处理完剩下的就结束
+run_batch_automation / OriginSessionService.run_batch 本来就是 "for job in jobs"，
+BatchPipeline 可以直接当 jobs 传进去，取不到新病人时就在那里等着。
+整班时间接近 max(OCR, 填表)，而不是两者之和。
+
+队列是有上限的(max_pending): 还没交给浏览器的病人留在主界面这边，
+护理师发现数据有错重新"加入批量队列"时还能直接覆盖；
+已经交出去的病人就不能再改了(可能正在填)。
+"""
+
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 2
+
+# 消费者每隔多久检查一次"是否已经结束"
+_POLL_SECONDS = 0.5
+
+
+class BatchPipeline:
+    """有上限的生产者/消费者队列；迭代它就是消费者那一端"""
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING, journal=None, on_taken=None, callback=None):
+        """
+        journal:  可选 BatchJournal，病人交进来的那一刻记为queued(崩溃后也能恢复)
+        on_taken: 消费者取走一位病人时回调 on_taken(job)(在消费者线程里调用)，
+                  主界面用它把等着的下一位病人补进来
+        callback: 日志回调
+        """
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._closed = threading.Event()
+        self.journal = journal
+        self.on_taken = on_taken
+        self.callback = callback
+        self.submitted = 0
+        self.taken = 0
+
+    def _log(self, msg):
+        if self.callback:
+            self.callback(msg)
+        logger.info(msg)
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def pending(self):
+        """已经交进来、还没被浏览器取走的病人数"""
+        return self._queue.qsize()
+
+    def _accept(self, job):
+        if self.journal is not None:
+            self.journal.add_job(job)
+        self.submitted += 1
+
+    def offer(self, job):
+        """不阻塞: 队列满了(或已经结束)返回False，病人留在调用方那边"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            return False
+        self._accept(job)
+        return True
+
+    def put(self, job, timeout=None):
+        """阻塞直到有空位(给命令行/非界面的生产者用)；超时或已经结束返回False"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            return False
+        self._accept(job)
+        return True
+
+    def close(self):
+        """没有新病人了: 消费者把队列里剩下的处理完就结束"""
+        self._closed.set()
+
+    def __iter__(self):
+        waiting_logged = False
+        while True:
+            try:
+                job = self._queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if self.closed:
+                    return
+                if not waiting_logged:
+                    self._log("⏳ 等待下一位核对完的病人... Waiting for the next patient")
+                    waiting_logged = True
+                continue
+            waiting_logged = False
+            self.taken += 1
+            if self.on_taken is not None:
+                try:
+                    self.on_taken(job)
+                except Exception as e:
+                    logger.warning(f"⚠️  流水线 on_taken 回调出错: {e}")
+            yield job
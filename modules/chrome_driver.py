@@ -0,0 +1,150 @@
+"""
+chrome_driver.py
+ChromeDriver的"解析一次、缓存起来"层。
+
+原来每次 initialize_driver() 都调一次 ChromeDriverManager().install()，
+它每次都要去查Chrome版本、还可能联网去问最新的驱动版本，
+医院内网连不上外网的时候，这一步要么很慢，要么直接失败。
+
+现在改成:
+1. 先在本机查出已安装的Chrome版本(不联网，Windows读注册表，其他系统跑 --version)
+2. data/chromedriver_cache.json 里如果已经有"给这个Chrome大版本用的驱动路径"
+   而且文件还在，直接用，完全不联网
+3. 缓存不存在/Chrome升级了大版本，才调一次 ChromeDriverManager().install()，
+   拿到路径后写回缓存
+4. 联网失败(比如在内网)的话，退回用缓存里旧的驱动路径(哪怕版本号对不上，
+   大多数时候还是能用)；连缓存都没有，就返回None，交给Selenium自带的
+   Selenium Manager去处理(selenium>=4.6)
+
+同一个程序进程里只解析一次，后面再调直接返回内存里的结果。
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import subprocess
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DRIVER_CACHE_FILE = os.path.join("data", "chromedriver_cache.json")
+
+# Windows上Chrome把版本号写在注册表这几个位置(用户级/系统级安装都覆盖到)
+_WINDOWS_REG_QUERIES = [
+    r'reg query "HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon" /v version',
+    r'reg query "HKEY_LOCAL_MACHINE\Software\Google\Chrome\BLBeacon" /v version',
+    r'reg query "HKEY_LOCAL_MACHINE\Software\Wow6432Node\Google\Chrome\BLBeacon" /v version',
+]
+
+_UNIX_CHROME_BINARIES = [
+    "google-chrome", "google-chrome-stable", "chromium", "chromium-browser",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+]
+
+_VERSION_RE = re.compile(r"(\d+\.\d+\.\d+\.\d+)")
+
+_resolved_path = None  # 本进程内已经解析过的结果，只解析一次
+
+
+def _run_quiet(cmd, shell=False):
+    try:
+        out = subprocess.run(
+            cmd, shell=shell, capture_output=True, text=True, timeout=5
+        )
+        return out.stdout or ""
+    except Exception:
+        return ""
+
+
+def detect_chrome_version():
+    """返回本机Chrome的完整版本号(比如 "126.0.6478.127")，查不到返回None。全程不联网。"""
+    if os.name == "nt":
+        for query in _WINDOWS_REG_QUERIES:
+            match = _VERSION_RE.search(_run_quiet(query, shell=True))
+            if match:
+                return match.group(1)
+        return None
+
+    for binary in _UNIX_CHROME_BINARIES:
+        path = binary if os.path.isabs(binary) else shutil.which(binary)
+        if path and os.path.exists(path):
+            match = _VERSION_RE.search(_run_quiet([path, "--version"]))
+            if match:
+                return match.group(1)
+    return None
+
+
+def _major(version):
+    return version.split(".")[0] if version else None
+
+
+def _load_cache():
+    try:
+        if os.path.exists(DRIVER_CACHE_FILE):
+            with open(DRIVER_CACHE_FILE, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if isinstance(cache, dict):
+                return cache
+    except Exception as e:
+        logger.warning(f"读取{DRIVER_CACHE_FILE}失败: {e}")
+    return {}
+
+
+def _save_cache(driver_path, chrome_version):
+    try:
+        os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+        with open(DRIVER_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "driver_path": driver_path,
+                "chrome_version": chrome_version,
+                "chrome_major": _major(chrome_version),
+                "resolved_at": datetime.now().isoformat(timespec="seconds"),
+            }, f, indent=2)
+    except Exception as e:
+        logger.warning(f"保存{DRIVER_CACHE_FILE}失败: {e}")
+
+
+def resolve_chromedriver_path(force_refresh=False):
+    """
+    返回可用的chromedriver路径；返回None代表"让Selenium Manager自己找"。
+    force_refresh=True 会忽略缓存，重新调一次 ChromeDriverManager().install()。
+    """
+    global _resolved_path
+    if _resolved_path and not force_refresh and os.path.exists(_resolved_path):
+        return _resolved_path
+
+    chrome_version = detect_chrome_version()
+    cache = _load_cache()
+    cached_path = cache.get("driver_path")
+    cached_ok = bool(cached_path and os.path.exists(cached_path))
+
+    if cached_ok and not force_refresh:
+        if chrome_version is None or cache.get("chrome_major") == _major(chrome_version):
+            logger.info(f"✓ 使用缓存的ChromeDriver(Chrome {cache.get('chrome_version')}): {cached_path}")
+            _resolved_path = cached_path
+            return cached_path
+        logger.info(
+            f"ℹ️  Chrome已从 {cache.get('chrome_version')} 升级到 {chrome_version}，重新解析ChromeDriver..."
+        )
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        driver_path = ChromeDriverManager().install()
+        _save_cache(driver_path, chrome_version)
+        logger.info(f"✓ ChromeDriver已解析并缓存: {driver_path}")
+        _resolved_path = driver_path
+        return driver_path
+    except Exception as e:
+        if cached_ok:
+            logger.warning(
+                f"⚠️  ChromeDriverManager解析失败({e})，可能是没有外网——"
+                f"先用缓存里的旧驱动: {cached_path}"
+            )
+            _resolved_path = cached_path
+            return cached_path
+        logger.warning(
+            f"⚠️  ChromeDriverManager解析失败({e})，也没有缓存，交给Selenium Manager自动处理"
+        )
+        return None
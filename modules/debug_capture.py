@@ -0,0 +1,212 @@
+"""
+debug_capture.py
+调试截图/页面HTML的"按需、后台"保存。
+
+原来 fill_data_in_form 一开始就无条件 take_screenshot("step7_start.png") +
+dump_page_source("step7_start.html")，后者要逐个切换进每一层iframe
+(最深3层)读page_source，每切一次都是一次WebDriver来回，全部写完盘才开始填表；
+出错路径也是这样。而且文件名是固定的，批量跑的时候后一位病人会覆盖前一位的。
+
+现在:
+- 级别由 config.json 的 "debug_capture" 决定:
+    "off"       完全不保存
+    "on_error"  只在出错/找不到元素时保存(默认)
+    "always"    连 step7_start、success 这种正常流程的快照也保存
+- 页面HTML用【一次】execute_script 在浏览器里递归读出主页面+所有同源iframe，
+  不切换frame(不会打乱调用方当前所在的frame)，截图也只是一条命令拿到内存里的PNG
+- 压缩(gzip)和写盘都丢给后台线程做，不占用自动化本身的时间
+- 文件名带运行批次和病人MRN: logs/debug/<run>_<mrn>_<label>.html.gz / .png，
+  批量时各病人互不覆盖
+- 目录总大小超过 max_mb 时，从最旧的文件开始删
+
+config.json:
+    "debug_capture": {"level": "on_error", "max_mb": 200}
+"""
+
+import os
+import re
+import gzip
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_LEVELS = ("off", "on_error", "always")
+DEFAULT_LEVEL = "on_error"
+DEFAULT_MAX_MB = 200
+DEBUG_DIR = os.path.join("logs", "debug")
+
+# 从当前frame直接拿 window.top，递归读出所有同源frame的HTML，全程只有一次WebDriver来回。
+# 跨域的frame读不到，留一行注释占位。
+_DUMP_FRAMES_JS = """
+var maxDepth = arguments[0];
+var out = [];
+function dump(win, path, depth) {
+    var doc;
+    try { doc = win.document; doc.documentElement; }
+    catch (e) { out.push('\\n<!-- ===== ' + path + ' (cross-origin, not readable) ===== -->\\n'); return; }
+    out.push('\\n\\n<!-- ===== ' + path + ' ===== -->\\n');
+    out.push(doc.documentElement ? doc.documentElement.outerHTML : '');
+    if (depth <= 0) return;
+    for (var i = 0; i < win.frames.length; i++) {
+        dump(win.frames[i], path + '/frame[' + i + ']', depth - 1);
+    }
+}
+var root;
+try { root = window.top; root.document.documentElement; } catch (e) { root = window; }
+dump(root, 'root', maxDepth);
+return out.join('');
+"""
+
+_writer_queue = queue.Queue()
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+
+def _safe_name(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(text)).strip("_") or "x"
+
+
+def _ensure_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, daemon=True)
+            _writer_thread.start()
+
+
+def _writer_loop():
+    while True:
+        task = _writer_queue.get()
+        try:
+            kind, path, payload, directory, max_mb = task
+            if kind == "html":
+                with gzip.open(path, "wt", encoding="utf-8") as f:
+                    f.write(payload)
+            else:
+                with open(path, "wb") as f:
+                    f.write(payload)
+            _rotate(directory, max_mb)
+        except Exception as e:
+            logger.warning(f"⚠️  保存调试文件失败: {e}")
+        finally:
+            _writer_queue.task_done()
+
+
+def _rotate(directory, max_mb):
+    """目录总大小超过上限，就从最旧的文件开始删"""
+    if not max_mb or max_mb <= 0:
+        return
+    limit = max_mb * 1024 * 1024
+    try:
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def flush_pending(timeout=10):
+    """等后台线程把排队中的文件写完(程序退出/关浏览器前调用)"""
+    done = threading.Event()
+
+    def waiter():
+        _writer_queue.join()
+        done.set()
+
+    threading.Thread(target=waiter, daemon=True).start()
+    return done.wait(timeout)
+
+
+atexit.register(flush_pending, 5)
+
+
+def load_capture_settings(config_path="config.json"):
+    settings = {"level": DEFAULT_LEVEL, "max_mb": DEFAULT_MAX_MB}
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        value = cfg.get("debug_capture")
+        if isinstance(value, str):
+            settings["level"] = value
+        elif isinstance(value, dict):
+            settings.update(value)
+    except Exception:
+        pass
+    if settings["level"] not in CAPTURE_LEVELS:
+        logger.warning(f"⚠️  未知的debug_capture级别 {settings['level']!r}，改用 {DEFAULT_LEVEL}")
+        settings["level"] = DEFAULT_LEVEL
+    return settings
+
+
+class DebugCapture:
+    """一个 OriginAutomation 实例对应一个，run_id 区分不同的运行批次"""
+
+    def __init__(self, level=DEFAULT_LEVEL, max_mb=DEFAULT_MAX_MB, directory=DEBUG_DIR):
+        self.level = level
+        self.max_mb = max_mb
+        self.directory = directory
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.mrn = None  # 当前正在处理的病人，文件名里用
+
+    @classmethod
+    def from_config(cls, config_path="config.json"):
+        settings = load_capture_settings(config_path)
+        return cls(level=settings["level"], max_mb=settings["max_mb"])
+
+    def should_capture(self, is_error):
+        if self.level == "off":
+            return False
+        return is_error or self.level == "always"
+
+    def _base_path(self, label):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%H%M%S_%f")[:-3]
+        mrn = _safe_name(self.mrn) if self.mrn else "session"
+        return os.path.join(self.directory, f"{self.run_id}_{mrn}_{_safe_name(label)}_{stamp}")
+
+    def capture(self, driver, label, is_error=True, screenshot=True, page_source=True, max_depth=3):
+        """
+        抓一份快照。在调用线程里只做两次WebDriver命令(截图 + 一次JS读HTML)，
+        写盘在后台线程。返回HTML文件将要保存的路径(没抓HTML就返回截图路径)，不抓返回None。
+        """
+        if driver is None or not self.should_capture(is_error):
+            return None
+        label = os.path.splitext(label)[0]
+        base = self._base_path(label)
+        saved = None
+        if screenshot:
+            try:
+                png = driver.get_screenshot_as_png()
+                saved = base + ".png"
+                _writer_queue.put(("png", saved, png, self.directory, self.max_mb))
+            except Exception as e:
+                logger.warning(f"⚠️  截图失败 Screenshot failed: {e}")
+        if page_source:
+            try:
+                html = driver.execute_script(_DUMP_FRAMES_JS, max_depth)
+                if not html:
+                    html = driver.page_source
+                saved = base + ".html.gz"
+                _writer_queue.put(("html", saved, html, self.directory, self.max_mb))
+            except Exception as e:
+                logger.warning(f"⚠️  读取页面HTML失败 Could not read page source: {e}")
+        if saved:
+            _ensure_writer()
+        return saved
@@ -0,0 +1,116 @@
+"""
+event_bus.py
+进程内的小型事件通道: 上传服务收到/转换好/导入一张照片时 publish 一个事件，
+桌面端(main.py)订阅它，不用等护理师打开"从手机导入"弹窗才知道有新照片。
+
+两种订阅方式:
+    token = bus.subscribe(callback)   # callback(event) 在发布事件的那个线程里直接调用，要尽快返回
+                                      # (main.py 里只是 root.after 转回界面线程)
+    listener = bus.listen()           # 每个订阅者一个有上限的队列，给 SSE(/events) 这种
+    event = listener.get(timeout=15)  # 一个连接一个循环的用法；跟不上的订阅者丢最旧的事件，不会卡住发布方
+    bus.close_listeners()             # 服务要停了: 叫醒所有在 get() 里等着的，listener.closed 变成True
+
+事件就是 dict: {"id": 自增序号, "type": "photo_ready", ...其他字段}。
+最近的几十个事件留在内存里，SSE重连时带上 Last-Event-ID 可以补发断线期间的事件。
+"""
+
+import queue
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RECENT_EVENTS = 50
+
+
+class Listener:
+    """bus.listen() 返回的队列式订阅"""
+
+    def __init__(self, bus, max_queue):
+        self._bus = bus
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def _deliver(self, event):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()  # 丢掉最旧的，保留最新的状态
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """等下一个事件；超时返回None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.closed = True
+        self._bus._remove_listener(self)
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._listeners = set()
+        self._recent = deque(maxlen=RECENT_EVENTS)
+        self._next_id = 1
+        self._next_token = 1
+
+    def publish(self, event_type, **data):
+        with self._lock:
+            event = {"id": self._next_id, "type": event_type, **data}
+            self._next_id += 1
+            self._recent.append(event)
+            callbacks = list(self._callbacks.values())
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener._deliver(event)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning(f"⚠️  事件订阅回调出错({event_type}): {e}")
+        return event
+
+    def subscribe(self, callback):
+        """返回一个token，unsubscribe(token) 取消订阅"""
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._callbacks[token] = callback
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._callbacks.pop(token, None)
+
+    def listen(self, last_event_id=None, max_queue=100):
+        """队列式订阅；给了 last_event_id 就先补上之后错过的事件"""
+        listener = Listener(self, max_queue)
+        with self._lock:
+            self._listeners.add(listener)
+            missed = [e for e in self._recent if last_event_id is not None and e["id"] > last_event_id]
+        for event in missed:
+            listener._deliver(event)
+        return listener
+
+    def close_listeners(self):
+        """关掉所有队列式订阅，正在 get() 里等的马上返回None"""
+        with self._lock:
+            listeners = list(self._listeners)
+            self._listeners.clear()
+        for listener in listeners:
+            listener.closed = True
+            listener._deliver(None)
+
+    def _remove_listener(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
@@ -0,0 +1,302 @@
+"""
+form_diff.py
+填表前"先读再写": 把要填的字段现在的值一次性读出来，跟要填的值比较，只写有变化的。
+
+原来 fill_data_in_form 对每个非空字段都 clear() + send_keys()，
+批量重跑(上次保存成功了一半、或者日志没确认保存)的时候，表单里其实已经是
+同样的数据，却还要把所有按键重新敲一遍。
+
+现在每个字段分成三类:
+    unchanged  表单里已经是要填的值 -> 不碰
+    updated    表单里是空的(或者确认可以覆盖) -> 写入
+    conflict   表单里已经有【不同的】非空值(或者读不到现在的值) -> 默认不覆盖，先保留原值，
+               记在报告里等护理师确认(单个填入时会直接弹窗问；批量时列在结果里)
+
+保存之后(save_form 成功)再用 READ_BACK_JS 把记录重新加载、一次读回目标日期那一列的
+tbl1/recordTbl/HOURLY OBSERVATION，跟填进去的值逐个比较(build_verification)，
+每个字段标记 verified/mismatch/missing，省掉护理师逐个病人回Origin核对的那一轮。
+"""
+
+import re
+
+# 参数: 元素列表。一次返回每个元素的 {tag, cls, value}；读不到的(stale等)返回null
+READ_FIELDS_JS = """
+var out = [];
+for (var i = 0; i < arguments[0].length; i++) {
+    var el = arguments[0][i];
+    try {
+        var tag = el.tagName.toLowerCase(), value;
+        if (tag === 'select') {
+            var opt = el.options[el.selectedIndex];
+            value = opt ? (opt.text || '') : '';
+        } else {
+            value = el.value;
+        }
+        out.push({tag: tag, cls: String(el.className || ''), value: value == null ? '' : String(value)});
+    } catch (e) {
+        out.push(null);
+    }
+}
+return out;
+"""
+
+
+# 读不到现有值的字段，在冲突报告里"表单里现在的值"显示成这个
+UNREADABLE_VALUE = "(读不到 unreadable)"
+
+
+def _norm(value):
+    return re.sub(r"\s+", " ", str(value if value is not None else "")).strip().casefold()
+
+
+def same_value(current, intended):
+    """宽松比较: 忽略大小写/多余空格；都是数字的话按数值比(60 == 60.0)"""
+    a, b = _norm(current), _norm(intended)
+    if a == b:
+        return True
+    try:
+        return float(a) == float(b)
+    except ValueError:
+        return False
+
+
+def classify(current, intended):
+    """返回 "unchanged" / "update" / "conflict" """
+    if same_value(current, intended):
+        return "unchanged"
+    if not _norm(current):
+        return "update"
+    return "conflict"
+
+
+def new_fill_report():
+    return {
+        "unchanged": [],   # 已经是目标值，没有写
+        "updated": [],     # 写入了
+        "conflicts": [],   # [{"field", "current", "intended"}]，表单里原来就有不同的值
+        "held": [],        # 冲突里最后没有覆盖的字段
+        "not_found": [],   # 页面上找不到对应的输入框
+        "failed": [],      # 找到了但写入出错
+        "overflow": [],    # 每小时记录比表格里HOURLY OBSERVATION的空位多，放不下的时间点
+    }
+
+
+def summarize_report(report):
+    """一行摘要，给日志/批量结果用"""
+    if not report:
+        return ""
+    parts = [
+        f"相同 unchanged {len(report.get('unchanged', []))}",
+        f"更新 updated {len(report.get('updated', []))}",
+    ]
+    if report.get("held"):
+        parts.append(f"冲突未覆盖 held {len(report['held'])}")
+    elif report.get("conflicts"):
+        parts.append(f"冲突已覆盖 overwritten {len(report['conflicts'])}")
+    if report.get("not_found"):
+        parts.append(f"找不到 not found {len(report['not_found'])}")
+    if report.get("failed"):
+        parts.append(f"写入失败 failed {len(report['failed'])}")
+    if report.get("overflow"):
+        parts.append(f"每小时记录没有空位 no slot {len(report['overflow'])}")
+    return ", ".join(parts)
+
+
+# ------------------------------------------------------------
+# 保存后核对: 重新加载记录，一次读回目标日期那一列，跟填进去的值逐个比较
+# ------------------------------------------------------------
+
+# 参数: 目标日期 DD-MM-YYYY。返回
+#   {column_found, tbl1: {标签: 值}, record: {标签: 值}, hourly: [[每个时间点的input值...]]}
+# 标签统一转小写、"/"和"_"换成空格，跟 fill_data_in_form 定位字段时的规则一样
+READ_BACK_JS = """
+var target = arguments[0];
+function norm(t) { return String(t || '').toLowerCase().replace(/[\\/_]/g, ' ').replace(/\\s+/g, ' ').trim(); }
+function val(el) {
+    if (!el) return '';
+    if (el.tagName === 'SELECT') { var o = el.options[el.selectedIndex]; return o ? (o.text || '') : ''; }
+    return el.value == null ? '' : String(el.value);
+}
+function normDate(t) {
+    var m = String(t || '').match(/(\\d{1,2})\\D+(\\d{1,2})\\D+(\\d{4})/);
+    if (!m) return String(t || '').trim();
+    return ('0' + m[1]).slice(-2) + '-' + ('0' + m[2]).slice(-2) + '-' + m[3];
+}
+function visibleCells(row) {
+    var out = [];
+    for (var i = 0; i < row.children.length; i++) {
+        var c = row.children[i];
+        if (c.tagName === 'TD' && !/(^|\\s)copy(\\s|$)/.test(c.className)) out.push(c);
+    }
+    return out;
+}
+var out = {column_found: false, tbl1: {}, record: {}, hourly: []};
+
+var rows1 = document.querySelectorAll('table.tbl1 tr');
+for (var i = 0; i < rows1.length; i++) {
+    var tds = rows1[i].querySelectorAll('td');
+    for (var k = 0; k + 1 < tds.length; k++) {
+        if (tds[k].querySelector('input, select, textarea')) continue;
+        var field = tds[k + 1].querySelector('input, select, textarea');
+        if (field) out.tbl1[norm(tds[k].textContent)] = val(field);
+    }
+}
+
+var tables = document.querySelectorAll('table.recordTbl');
+for (var t = 0; t < tables.length && !out.column_found; t++) {
+    var rows = tables[t].querySelectorAll('tr');
+    var col = -1;
+    for (var r = 0; r < rows.length && col < 0; r++) {
+        var th = rows[r].querySelector('th');
+        if (!th || norm(th.textContent) !== 'date') continue;
+        var cells = visibleCells(rows[r]);
+        for (var c = 0; c < cells.length; c++) {
+            if (normDate(val(cells[c].querySelector('input'))) === target) { col = c; break; }
+        }
+    }
+    if (col < 0) continue;
+    out.column_found = true;
+    var inHourly = false;
+    for (var r2 = 0; r2 < rows.length; r2++) {
+        var th2 = rows[r2].querySelector('th');
+        if (!th2) continue;
+        var label = norm(th2.textContent);
+        if (label.indexOf('hourly observation') >= 0) inHourly = true;
+        else if (label !== '') inHourly = false;
+        var cells2 = visibleCells(rows[r2]);
+        if (col >= cells2.length) continue;
+        if (inHourly) {
+            var inputs = cells2[col].querySelectorAll('input');
+            var values = [];
+            for (var q = 0; q < inputs.length; q++) values.push(val(inputs[q]));
+            out.hourly.push(values);
+        } else {
+            var v = val(cells2[col].querySelector('input, select, textarea'));
+            out.record[label] = label === 'date' ? normDate(v) : v;
+        }
+    }
+}
+return out;
+"""
+
+HOURLY_FIELD_ORDER = ["TIME", "BP", "VP", "QB", "QD", "PULSE", "UFR"]
+
+_HOURLY_KEY = re.compile(r"^HOURLY\[(\d+)\]\.(\w+)$")
+
+
+def _lookup_read_back(field, snapshot):
+    """按 fill_data_in_form 定位字段的同样规则，在读回来的数据里找这个字段的值；找不到返回None"""
+    m = _HOURLY_KEY.match(field)
+    if m:
+        slot, key = int(m.group(1)) - 1, m.group(2)
+        hourly = snapshot.get("hourly") or []
+        if key not in HOURLY_FIELD_ORDER or slot >= len(hourly):
+            return None
+        values = hourly[slot]
+        idx = HOURLY_FIELD_ORDER.index(key)
+        return values[idx] if idx < len(values) else None
+
+    name = re.sub(r"\s+", " ", field.replace("_", " ").replace("/", " ")).strip().lower()
+    tbl1, record = snapshot.get("tbl1") or {}, snapshot.get("record") or {}
+    for table in (tbl1, record):
+        if name in table:
+            return table[name]
+    for table in (tbl1, record):
+        for label, value in table.items():
+            if name in label:
+                return value
+    return None
+
+
+def build_verification(expected, held, snapshot):
+    """
+    expected: {字段: 填进去的值}；held: 冲突没覆盖的字段(Origin里保留原值，不算不一致)
+    返回 {"status": "verified"/"mismatch"/"not_found", "fields": {字段: {status, expected, actual}},
+          "verified": n, "mismatches": [字段...], "missing": [字段...]}
+    """
+    report = {"status": "verified", "fields": {}, "verified": 0, "mismatches": [], "missing": []}
+    if not snapshot or not snapshot.get("column_found"):
+        report["status"] = "not_found"
+        return report
+    held = set(held or [])
+    for field, value in expected.items():
+        actual = _lookup_read_back(field, snapshot)
+        if field in held:
+            status = "held"
+        elif actual is None:
+            status = "missing"
+            report["missing"].append(field)
+        elif same_value(actual, value):
+            status = "verified"
+            report["verified"] += 1
+        else:
+            status = "mismatch"
+            report["mismatches"].append(field)
+        report["fields"][field] = {"status": status, "expected": value, "actual": actual}
+    if report["mismatches"] or report["missing"]:
+        report["status"] = "mismatch"
+    return report
+
+
+def summarize_verification(report):
+    if not report:
+        return ""
+    if report.get("status") == "not_found":
+        return "保存后没读到目标日期那一列 Target column not found after reload"
+    text = f"核对一致 verified {report.get('verified', 0)}"
+    if report.get("mismatches"):
+        text += f", 不一致 mismatch {len(report['mismatches'])}"
+    if report.get("missing"):
+        text += f", 读不到 missing {len(report['missing'])}"
+    return text
+
+
+# ------------------------------------------------------------
+# HOURLY OBSERVATION 网格
+# ------------------------------------------------------------
+
+# 参数: recordTbl表格元素, 目标列下标(0-based, 不算class=copy的隐藏列)。
+# 一次返回 [[该时间点的7个input元素...], ...]，按表格里从上到下的顺序。
+# 区块从<th>HOURLY OBSERVATION</th>那一行开始，后面紧跟着的空<th>行都属于同一区块，
+# 遇到下一个有文字的<th>(比如REMARKS)为止——跟原来逐行用WebDriver读<th>的规则一样。
+HOURLY_GRID_JS = """
+var table = arguments[0], col = arguments[1];
+var rows = table.querySelectorAll('tr');
+var grid = [], collecting = false;
+for (var r = 0; r < rows.length; r++) {
+    var th = null;
+    for (var i = 0; i < rows[r].children.length; i++) {
+        if (rows[r].children[i].tagName === 'TH') { th = rows[r].children[i]; break; }
+    }
+    if (!th) continue;
+    var text = (th.textContent || '').replace(/\\s+/g, ' ').trim().toUpperCase();
+    if (text.indexOf('HOURLY OBSERVATION') >= 0) collecting = true;
+    else if (!collecting) continue;
+    else if (text !== '') break;
+    var cells = [];
+    for (var j = 0; j < rows[r].children.length; j++) {
+        var c = rows[r].children[j];
+        if (c.tagName === 'TD' && !/(^|\\s)copy(\\s|$)/.test(c.className)) cells.push(c);
+    }
+    if (col < cells.length) grid.push(Array.prototype.slice.call(cells[col].querySelectorAll('input')));
+}
+return grid;
+"""
+
+# 参数: 元素列表, 对应的值列表。一次把值全部写进去，并派发 input/change 事件
+# (页面上绑定的onchange之类的处理函数照样会触发)。返回每个元素是否写成功。
+WRITE_VALUES_JS = """
+var els = arguments[0], values = arguments[1], ok = [];
+for (var i = 0; i < els.length; i++) {
+    try {
+        var el = els[i];
+        el.value = values[i];
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        ok.push(el.value === values[i]);
+    } catch (e) {
+        ok.push(false);
+    }
+}
+return ok;
+"""
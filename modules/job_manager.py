@@ -0,0 +1,239 @@
+"""
+job_manager.py
+桌面端的后台任务(OCR/AI识别)管理: 一个小线程池 + 界面上的任务列表。
+
+原来 OCR/AI识别 直接在按钮回调里跑: Tesseract、本地打码、Gemini请求都在界面线程上，
+一次识别少则几秒多则一两分钟，整个窗口卡死，护理师不能同时改别的字段，
+也不能护理记录和透析机屏幕一起识别。
+
+现在:
+    jobs = JobManager(root, max_workers=2, on_change=刷新任务列表)
+    job = jobs.submit("AI识别护理记录", work, on_done=填入结果, on_error=报错, key="nursing")
+
+    - work(job) 在后台线程里跑，只做耗时的事(识别、打码、发请求)，不碰界面
+    - on_done(result) / on_error(exc) / on_change(job) 都经 root.after 回到界面线程调用
+    - job.report("打码中...") 报进度，任务列表里能看到
+    - job.ask(fn, *args) 需要中途问护理师(比如"没找到可打码的内容，要继续吗")时，
+      在界面线程里调用 fn，后台线程等它的返回值
+    - 取消: 排队中的任务直接不跑了；已经在跑的任务没法打断 Tesseract/Gemini 本身，
+      但 work 里在各步之间调 job.check_cancelled()，结果也不会再填进界面
+    - key: 同一个key(比如"nursing")再提交一次，之前还没结束的那个自动取消，
+      免得旧照片的结果晚到、盖掉新照片的结果。结果是"追加"而不是"覆盖"的任务
+      (透析机照片: 每张加一行每小时记录)不要给key，不然第二张照片会把第一张的读数丢掉
+    - group: 任务的类别(比如"nursing"/"machine")，换下一位病人时 cancel_group() 一起取消
+"""
+
+import time
+import logging
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 2
+MAX_FINISHED = 30  # 任务列表里最多保留多少个已结束的任务
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+STATUS_LABELS = {
+    QUEUED: "排队中 Queued",
+    RUNNING: "进行中 Running",
+    DONE: "完成 Done",
+    FAILED: "失败 Failed",
+    CANCELLED: "已取消 Cancelled",
+}
+
+
+class JobCancelled(Exception):
+    """任务被取消了(work 里 check_cancelled()/ask() 抛出，不算失败)"""
+
+
+class Job:
+    def __init__(self, manager, job_id, title, key=None, group=None):
+        self._manager = manager
+        self.id = job_id
+        self.title = title
+        self.key = key
+        self.group = group if group is not None else key
+        self.status = QUEUED
+        self.message = ""
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.title)
+
+    def report(self, message):
+        """报进度(后台线程里调用)"""
+        self.check_cancelled()
+        self.message = message
+        self._manager._changed(self)
+
+    def ask(self, fn, *args, **kwargs):
+        """在界面线程里调用 fn(*args, **kwargs) 并等它的返回值(后台线程里调用)，比如弹确认框"""
+        self.check_cancelled()
+        done = threading.Event()
+        box = {}
+
+        def call():
+            try:
+                box["value"] = fn(*args, **kwargs)
+            except Exception as e:
+                box["error"] = e
+            finally:
+                done.set()
+
+        self._manager._in_ui(call)
+        while not done.wait(0.2):
+            self.check_cancelled()
+        if "error" in box:
+            raise box["error"]
+        return box.get("value")
+
+    def cancel(self):
+        self._manager.cancel(self.id)
+
+
+class JobManager:
+    def __init__(self, root, max_workers=DEFAULT_MAX_WORKERS, on_change=None):
+        """on_change(job): 任何任务状态/进度变了都会调用(界面线程)，用来刷新任务列表"""
+        self.root = root
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="job")
+        self._closed = False
+
+    def _in_ui(self, fn, *args):
+        if self._closed:
+            return
+        try:
+            self.root.after(0, fn, *args)
+        except Exception as e:  # 主窗口已经关了
+            logger.debug(f"任务回调没送到界面线程: {e}")
+
+    def _changed(self, job):
+        if self.on_change is not None:
+            self._in_ui(self.on_change, job)
+
+    def jobs(self):
+        """所有任务(新的在前)"""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.id, reverse=True)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.active)
+
+    def submit(self, title, work, on_done=None, on_error=None, key=None, group=None):
+        """
+        提交一个后台任务，返回Job。work(job) 的返回值交给 on_done，抛的异常交给 on_error。
+        key: 取代同key还没结束的任务；group: 类别(不给就跟key一样)
+        """
+        if key is not None and self.cancel_key(key):
+            logger.info(f"ℹ️  新的「{title}」取代了还没结束的同类任务({key})")
+        with self._lock:
+            job = Job(self, next(self._ids), title, key, group)
+            self._jobs[job.id] = job
+            self._prune()
+        self._changed(job)
+        self._pool.submit(self._run, job, work, on_done, on_error)
+        return job
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if not j.active), key=lambda j: j.id)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED)]:
+            del self._jobs[job.id]
+
+    def _run(self, job, work, on_done, on_error):
+        if job.cancelled:
+            return  # 排队时就取消了
+        job.status = RUNNING
+        job.started = time.time()
+        self._changed(job)
+        try:
+            result = work(job)
+            job.check_cancelled()
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.error(f"❌ 任务 #{job.id}「{job.title}」失败: {e}")
+            job.error = e
+            self._finish(job, FAILED)
+            if on_error is not None:
+                self._in_ui(self._deliver, job, on_error, e)
+        else:
+            self._finish(job, DONE)
+            if on_done is not None:
+                self._in_ui(self._deliver, job, on_done, result)
+
+    def _finish(self, job, status):
+        job.status = CANCELLED if job.cancelled else status
+        job.finished = time.time()
+        self._changed(job)
+
+    @staticmethod
+    def _deliver(job, callback, value):
+        if job.cancelled:
+            return  # 在界面线程排队等着的时候被取消了
+        callback(value)
+
+    def cancel(self, job_id):
+        """取消一个任务；已经结束的返回False"""
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return False
+        job._cancel.set()
+        job.message = "已取消 cancelled"
+        if job.status == QUEUED:
+            job.finished = time.time()
+        job.status = CANCELLED
+        self._changed(job)
+        return True
+
+    def cancel_key(self, key):
+        """取消某个key下所有还没结束的任务，返回取消了几个"""
+        return sum(self.cancel(job.id) for job in self.jobs() if job.key == key and job.active)
+
+    def cancel_group(self, group):
+        """取消某一类所有还没结束的任务，返回取消了几个"""
+        return sum(self.cancel(job.id) for job in self.jobs() if job.group == group and job.active)
+
+    def cancel_all(self):
+        for job in self.jobs():
+            if job.active:
+                self.cancel(job.id)
+
+    def clear_finished(self):
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if not j.active]:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        """关窗口时调用: 取消所有任务，不等正在跑的那几个结束"""
+        self.cancel_all()
+        self._closed = True
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,90 @@
+"""
+lazy_import.py
+重量级依赖(cv2、numpy、pytesseract)第一次用到时才真正 import。
+
+原来 ocr_module / privacy_redact 在模块顶层就 import cv2、numpy、pytesseract，
+privacy_redact 还在 import 的时候就去找 Tesseract(读config、查PATH、试几个安装路径)；
+谁 import 了这几个模块，谁就要先等几百毫秒到一两秒。
+
+现在:
+    cv2 = lazy_module("cv2")       # 这一行几乎不花时间
+    img = cv2.imread(path)         # 第一次取属性时才 import，之后就是普通模块
+    - 没装的话，第一次用到时才抛 ImportError(e.name 照旧是 "cv2"，main.py 的 pip 提示不受影响)
+    - 每个模块真正 import 花了多久记在 import_timings() 里，启动报告(startup_profile)会打出来
+    - warm(name) 提前在后台线程里 import(窗口显示出来以后预热，点OCR时就不用再等)
+"""
+
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_timings = {}  # 模块名 -> 真正 import 花的秒数
+
+
+class LazyModule:
+    """模块的占位对象: 第一次访问属性时 import 真正的模块"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = load(self.__dict__["_name"])
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+
+def load(name):
+    """import 一个模块，并记下第一次 import 花的时间"""
+    with _lock:
+        timed = name not in _timings
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if timed:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            if name not in _timings:
+                _timings[name] = elapsed
+                logger.info(f"⏱️  按需加载 {name}: {elapsed * 1000:.0f} ms")
+    return module
+
+
+def warm(*names):
+    """提前 import 这些模块(给后台预热用)；没装的跳过，返回成功加载的模块名"""
+    loaded = []
+    for name in names:
+        try:
+            load(name)
+            loaded.append(name)
+        except ImportError as e:
+            logger.info(f"ℹ️  预热跳过 {name}: {e}")
+    return loaded
+
+
+def import_timings():
+    """{模块名: 秒数}，只包含经这里加载过的模块"""
+    with _lock:
+        return dict(_timings)
@@ -13,8 +13,13 @@ import shutil
 import logging
 from typing import Dict, List, Optional
 from pathlib import Path
-import cv2
-import numpy as np
+from functools import lru_cache
+
+from modules.lazy_import import lazy_module
+
+# cv2/numpy 要好几百毫秒才import完，第一次真正用到时才加载(见 lazy_import.py)
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -39,9 +44,11 @@ def _get_common_tesseract_paths():
 COMMON_TESSERACT_PATHS = _get_common_tesseract_paths()
 
 
+@lru_cache(maxsize=None)
 def find_tesseract_executable(config_path="config.json"):
     """
-    自动找Tesseract可执行文件的位置，依次尝试:
+    自动找Tesseract可执行文件的位置(结果缓存，整个进程只找一次；
+    改了config.json里的路径要立即生效的话调 find_tesseract_executable.cache_clear())，依次尝试:
     1. config.json 里的 "tesseract_path" 字段(如果你的路径比较特殊，可以在这里手动指定)
     2. 系统PATH环境变量(如果装的时候勾选了"Add to PATH"就能找到)
     3. Windows上几个最常见的默认安装路径
@@ -79,6 +86,12 @@ def find_tesseract_executable(config_path="config.json"):
     return None
 
 
+@lru_cache(maxsize=None)
+def _tesseract_version(tesseract_cmd):
+    import pytesseract
+    return pytesseract.get_tesseract_version()
+
+
 class DialysisOCR:
     """增强版OCR识别类 - 使用Tesseract + OpenCV预处理"""
     
@@ -105,8 +118,8 @@ class DialysisOCR:
             if tesseract_path:
                 pytesseract.pytesseract.tesseract_cmd = tesseract_path
             
-            # 测试Tesseract是否可用
-            version = pytesseract.get_tesseract_version()
+            # 测试Tesseract是否可用(每个路径只跑一次 tesseract --version)
+            version = _tesseract_version(pytesseract.pytesseract.tesseract_cmd)
             logger.info(f"✅ Tesseract OCR {version} initialized successfully!")
             
             self.pytesseract = pytesseract
@@ -120,7 +133,7 @@ class DialysisOCR:
         except Exception as e:
             logger.error(f"❌ Tesseract initialization failed: {e}")
             logger.error("Make sure Tesseract is installed and path is correct")
-    def preprocess_image(self, image_path: str, method: str = 'adaptive') -> np.ndarray:
+    def preprocess_image(self, image_path: str, method: str = 'adaptive') -> "np.ndarray":
         """
         图像预处理以提升OCR准确率
         Preprocess image for better OCR accuracy
@@ -170,6 +183,8 @@ class DialysisOCR:
             logger.info(f"✓ Image preprocessed using '{method}' method")
             return processed
             
+        except ImportError:
+            raise  # 没装opencv: 让调用方看到缺依赖(pip提示)，不要悄悄用没预处理的图继续
         except Exception as e:
             logger.error(f"❌ Preprocessing error: {e}")
             return None
@@ -223,6 +238,8 @@ class DialysisOCR:
             logger.info(f"✓ Extracted {len(text)} characters")
             return text
             
+        except ImportError:
+            raise
         except Exception as e:
             logger.error(f"❌ OCR error: {e}")
             return ""
@@ -276,6 +293,8 @@ class DialysisOCR:
             logger.info(f"✓ Found {len(results)} text regions with confidence")
             return results
             
+        except ImportError:
+            raise
         except Exception as e:
             logger.error(f"❌ Error: {e}")
             return []
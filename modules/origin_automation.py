@@ -14,19 +14,46 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
+import os
 import time
 import logging
 
+from modules.batch_journal import job_key
+from modules.chrome_driver import resolve_chromedriver_path
+from modules.step_tracer import StepTracer, traced_step, instrument_driver
+from modules.debug_capture import DebugCapture, flush_pending
+from modules.patient_lookup import PatientLookupStats, RANGE_DAYS
+from modules.queue_index import QueueIndex
+from modules.form_diff import (
+    READ_FIELDS_JS, READ_BACK_JS, HOURLY_GRID_JS, WRITE_VALUES_JS, HOURLY_FIELD_ORDER,
+    classify, new_fill_report, summarize_report, build_verification, summarize_verification,
+    UNREADABLE_VALUE,
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 浏览器配置档:
+#   "default"     原来的方式，最大化、完整渲染，护理师能看着浏览器一步步操作
+#   "batch_fast"  批量用的省资源模式: 新版无头模式、不加载图片/字体/视频、固定小窗口、
+#                 关掉GPU和后台节流，用固定的user-data-dir让Chrome的磁盘缓存可以跨次复用
+#                 (每位病人到底快多少还没实测过，用 python -m modules.origin_mock compare --headless 量)
+BROWSER_PROFILES = ("default", "batch_fast")
+BATCH_FAST_USER_DATA_DIR = os.path.join("data", "chrome_profile")
+BATCH_FAST_WINDOW_SIZE = "1280,900"
+# batch_fast 模式下直接在网络层拦掉的资源(表单页面用不到)。
+# 铅笔图标(edit2.png)不加载也没关系: 它仍然在DOM里，原生点击失败时有JS派发mousedown兜底
+BATCH_FAST_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm", "*.mp3",
+]
+
 
 class OriginAutomation:
     """Origin系统自动化类 - KLSCH完整版"""
     
-    def __init__(self, origin_url=None, headless=False):
-        """初始化Origin自动化"""
+    def __init__(self, origin_url=None, headless=False, profile="default"):
+        """初始化Origin自动化(profile见BROWSER_PROFILES)"""
         self.origin_urls = [
             "http://192.168.20.12:8080/EMR/main.jsp",
             "http://192.168.20.11:8080/EMR/main.jsp"
@@ -36,37 +63,189 @@ class OriginAutomation:
             self.origin_urls.insert(0, origin_url)
         
         self.headless = headless
+        self.profile = profile if profile in BROWSER_PROFILES else "default"
         self.driver = None
         self.wait = None
         self._hd_record_node = None  # Step4定位到的HD记录树节点,供Step5复用
+        self._logged_in_user = None  # 当前浏览器session是用哪个账号登录的(保温浏览器复用时判断)
+        self.tracer = StepTracer()  # 每一步的耗时/命令数/等待/重试，写进 logs/step_timings.jsonl
+        self.debug = DebugCapture.from_config()  # 调试截图/HTML，级别见config.json的debug_capture
+        self.lookup_stats = PatientLookupStats()  # 每位病人上次是用哪种方式在队列里找到的
+        self.last_lookup_timings = []
+        self.queue_index = None  # 批量模式下 MRN -> 队列表格位置 的索引(见 queue_index.py)
+        self._queue_range_days = None  # 队列页当前的日期范围天数(None=默认的当天)
+        # 填表前先读现有值，只写有变化的(见 form_diff.py)。表单里已有【不同】值的字段:
+        # overwrite_conflicts=True 直接覆盖；否则问 confirm_conflicts(conflicts)(单个填入时
+        # 主界面传一个弹窗进来)，没有这个回调就保留原值，记在 last_fill_report 里
+        self.overwrite_conflicts = False
+        self.confirm_conflicts = None
+        self.last_fill_report = None
+        # 保存后重新加载记录、一次读回来跟填进去的值逐个核对(verify_saved_record)
+        self.verify_after_save = True
+        self.last_fill_plan = None      # 这一次填表的 {"date", "fields": {字段: 值}, "held": [...]}
+        self.last_verification = None
         
     def initialize_driver(self):
         """初始化Chrome驱动"""
         try:
             logger.info("⏳ Initializing Chrome driver...")
             
-            chrome_options = Options()
-            if self.headless:
-                chrome_options.add_argument('--headless')
-            
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--start-maximized')
-            chrome_options.add_argument('--ignore-certificate-errors')
-            chrome_options.add_argument('--ignore-ssl-errors')
-            
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.maximize_window()
+            fast = self.profile == "batch_fast"
+            chrome_options = self._build_chrome_options(fast, use_profile_dir=fast)
+
+            # 驱动路径只解析一次并缓存到 data/chromedriver_cache.json，离线也能用；
+            # 解析不到就用不带路径的Service()，让Selenium Manager自己找
+            driver_path = resolve_chromedriver_path()
+            service = Service(driver_path) if driver_path else Service()
+            try:
+                self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            except Exception as e:
+                if not fast:
+                    raise
+                # 同一个user-data-dir同时只能给一个Chrome用(比如另一个批次还开着)，
+                # 这种情况下不用缓存目录再试一次，其他省资源的设置照旧
+                logger.warning(f"⚠️  用缓存目录启动Chrome失败({e})，改用临时配置再试一次")
+                chrome_options = self._build_chrome_options(fast, use_profile_dir=False)
+                self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            instrument_driver(self.driver, self.tracer)
+            if fast:
+                self._block_heavy_resources()
+            else:
+                self.driver.maximize_window()
             self.wait = WebDriverWait(self.driver, 15)
             
-            logger.info("✅ Chrome driver initialized")
+            logger.info(f"✅ Chrome driver initialized (profile: {self.profile})")
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize Chrome: {e}")
             return False
             
+    def _build_chrome_options(self, fast, use_profile_dir):
+        chrome_options = Options()
+        if fast or self.headless:
+            chrome_options.add_argument('--headless=new')
+
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--ignore-certificate-errors')
+        chrome_options.add_argument('--ignore-ssl-errors')
+
+        if not fast:
+            chrome_options.add_argument('--start-maximized')
+            return chrome_options
+
+        chrome_options.add_argument(f'--window-size={BATCH_FAST_WINDOW_SIZE}')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-background-timer-throttling')
+        chrome_options.add_argument('--disable-backgrounding-occluded-windows')
+        chrome_options.add_argument('--disable-renderer-backgrounding')
+        chrome_options.add_argument('--disable-features=Translate,MediaRouter,OptimizationHints')
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--no-first-run')
+        chrome_options.add_argument('--no-default-browser-check')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+        if use_profile_dir:
+            profile_dir = os.path.abspath(BATCH_FAST_USER_DATA_DIR)
+            os.makedirs(profile_dir, exist_ok=True)
+            chrome_options.add_argument(f'--user-data-dir={profile_dir}')
+        return chrome_options
+
+    def _block_heavy_resources(self):
+        """batch_fast: 通过DevTools协议在网络层直接拦掉图片/字体/音视频请求"""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BATCH_FAST_BLOCKED_URLS})
+        except Exception as e:
+            logger.info(f"ℹ️  无法设置资源拦截(不影响运行): {e}")
+
+    def is_driver_alive(self):
+        """浏览器还开着、WebDriver还能正常响应的话返回True(用户手动关掉了Chrome就是False)"""
+        if self.driver is None:
+            return False
+        try:
+            self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def prewarm(self):
+        """
+        提前把Chrome启动好，并打开Origin登录页，
+        真正开始自动化时就不用再等冷启动Chrome这几秒。
+        """
+        if self.is_driver_alive():
+            return True
+        if not self.initialize_driver():
+            return False
+        for url in self.origin_urls:
+            try:
+                self.driver.get(url)
+                logger.info(f"🔥 浏览器已预热 Browser pre-warmed: {url}")
+                return True
+            except Exception as e:
+                logger.warning(f"⚠️  预热时打开{url}失败: {e}")
+        return True
+
+    def ensure_logged_in(self, username, password, callback=None):
+        """
+        保证浏览器处于"已登录、在病人队列页"的状态:
+        - 浏览器还开着、而且是同一个账号登录的 -> 直接 return_to_queue() 回到队列，不重新登录
+        - 否则(第一次用/浏览器被关掉/换了账号) -> 按需启动浏览器，走一遍完整登录
+        返回True表示可以开始查找病人了。
+        """
+        def log_cb(msg):
+            if callback:
+                callback(msg)
+            logger.info(msg)
+
+        if self.is_driver_alive() and self._logged_in_user == username:
+            log_cb("♻️ 复用已登录的浏览器 Reusing the warm, logged-in browser...")
+            if self.return_to_queue(callback):
+                return True
+            log_cb("🔁 已登录的session失效了，重新登录 Session expired, logging in again...")
+        elif not self.is_driver_alive():
+            log_cb("⏳ 初始化浏览器 Initializing...")
+            if not self.initialize_driver():
+                return False
+
+        self._logged_in_user = None
+        log_cb("🔐 登录 Login...")
+        if not self.login_step1_credentials(username, password):
+            log_cb("❌ 登录失败 Login failed")
+            return False
+        if not self.login_step2_department():
+            log_cb("❌ 部门选择失败 Department selection failed")
+            return False
+        self._logged_in_user = username
+        return True
+
+    def _sleep(self, seconds):
+        """固定等待。跟time.sleep一样，只是会把等待时间算进当前步骤的耗时记录里"""
+        self.tracer.add_sleep(seconds)
+        time.sleep(seconds)
+
+    def _note_retry(self):
+        """当前方法失败、换下一个兜底方法时调用，计入当前步骤的重试次数"""
+        self.tracer.add_retry()
+
+    def close(self):
+        """关闭浏览器(保温模式下，主程序退出时调用)"""
+        self.tracer.flush()
+        flush_pending()
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+        self._logged_in_user = None
+
     def _accept_alert_if_present(self, timeout=3):
         """
         检测并自动确认(接受)页面弹出的原生JS弹窗(alert/confirm)
@@ -94,6 +273,7 @@ class OriginAutomation:
             logger.warning(f"⚠️  Error handling alert: {e}")
             return None
 
+    @traced_step()
     def login_step1_credentials(self, username, password):
         """
         步骤1: 输入用户名密码登录
@@ -114,7 +294,8 @@ class OriginAutomation:
                 try:
                     logger.info(f"🔗 Trying: {url}")
                     self.driver.get(url)
-                    time.sleep(2)
+                    self._queue_range_days = None
+                    self._sleep(2)
                     
                     if "KLSCH" in self.driver.page_source or "login" in self.driver.page_source.lower():
                         logger.info("✓ Page loaded")
@@ -127,7 +308,7 @@ class OriginAutomation:
             if not logged_in:
                 raise Exception("无法连接到Origin")
             
-            time.sleep(2)
+            self._sleep(2)
 
             # 防御性检查: 有可能此时session其实仍然有效，driver.get(url)
             # 已经被自动重定向到了部门选择页或病人队列页(没有真正的登录表单)。
@@ -161,7 +342,7 @@ class OriginAutomation:
             username_field.clear()
             username_field.send_keys(username)
             logger.info(f"✓ Username entered: {username}")
-            time.sleep(0.5)
+            self._sleep(0.5)
             
             # 查找密码输入框
             logger.info("📝 Finding password field...")
@@ -169,7 +350,7 @@ class OriginAutomation:
             password_field.clear()
             password_field.send_keys(password)
             logger.info("✓ Password entered")
-            time.sleep(0.5)
+            self._sleep(0.5)
             
             # 点击第一个LOGIN按钮
             logger.info("🔘 Clicking first LOGIN button...")
@@ -179,7 +360,7 @@ class OriginAutomation:
             )
             login_button.click()
             logger.info("✓ First LOGIN clicked")
-            time.sleep(3)
+            self._sleep(3)
             
             return True
             
@@ -188,6 +369,7 @@ class OriginAutomation:
             self.take_screenshot("login_step1_error.png")
             return False
             
+    @traced_step()
     def login_step2_department(self):
         """
         步骤2: 选择HAEMODIALYSIS UNIT并确认
@@ -195,7 +377,7 @@ class OriginAutomation:
         """
         try:
             logger.info("🏥 Step 2: Selecting HAEMODIALYSIS UNIT...")
-            time.sleep(2)
+            self._sleep(2)
             
             # 检查是否看到 "WELCOME TO ORIGIN"
             if "WELCOME" in self.driver.page_source.upper():
@@ -214,7 +396,7 @@ class OriginAutomation:
 
                     # 处理选择部门后立刻弹出的JS confirm弹窗
                     self._accept_alert_if_present(timeout=3)
-                    time.sleep(1)
+                    self._sleep(1)
                 except Exception as e:
                     logger.info("ℹ️  Department already selected")
 
@@ -231,11 +413,11 @@ class OriginAutomation:
                     )
                     confirm_button.click()
                     logger.info("✓ Department confirmed")
-                    time.sleep(1)
+                    self._sleep(1)
 
                     # 点击后也可能再次弹出确认框，同样需要处理
                     self._accept_alert_if_present(timeout=3)
-                    time.sleep(2)
+                    self._sleep(2)
                 except Exception as e:
                     logger.warning(f"⚠️  Could not find confirm button: {e}")
                 
@@ -298,55 +480,18 @@ class OriginAutomation:
             self.driver.switch_to.default_content()
         return result
 
-    def dump_page_source(self, filename="page_debug.html"):
+    def dump_page_source(self, filename="page_debug.html", is_error=True):
         """
-        调试用：把当前主页面 + 所有iframe内的HTML都导出到logs/文件夹，
+        调试用：把当前主页面 + 所有同源iframe内的HTML导出到logs/debug/(gzip压缩)，
         方便定位真实的DOM结构(比截图更准确，能看到确切的class/id/标签)。
+        一次JS读完，不切换frame；写盘在后台线程。是否保存由debug_capture级别决定。
         """
-        try:
-            import os
-            os.makedirs("logs", exist_ok=True)
-            self.driver.switch_to.default_content()
-
-            parts = ["<!-- ===== MAIN DOCUMENT ===== -->\n", self.driver.page_source]
-
-            def collect_frames(depth, path):
-                if depth <= 0:
-                    return
-                frames = (
-                    self.driver.find_elements(By.TAG_NAME, "iframe")
-                    + self.driver.find_elements(By.TAG_NAME, "frame")
-                )
-                for idx in range(len(frames)):
-                    try:
-                        frames = (
-                            self.driver.find_elements(By.TAG_NAME, "iframe")
-                            + self.driver.find_elements(By.TAG_NAME, "frame")
-                        )
-                        self.driver.switch_to.frame(frames[idx])
-                        frame_path = f"{path}/frame[{idx}]"
-                        parts.append(f"\n\n<!-- ===== {frame_path} ===== -->\n")
-                        parts.append(self.driver.page_source)
-                        collect_frames(depth - 1, frame_path)
-                        self.driver.switch_to.parent_frame()
-                    except Exception as e:
-                        parts.append(f"\n<!-- Failed to read {path}/frame[{idx}]: {e} -->\n")
-                        try:
-                            self.driver.switch_to.parent_frame()
-                        except Exception:
-                            self.driver.switch_to.default_content()
-
-            collect_frames(3, "root")
-            self.driver.switch_to.default_content()
-
-            filepath = f"logs/{filename}"
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write("\n".join(parts))
+        filepath = self.debug.capture(
+            self.driver, filename, is_error=is_error, screenshot=False, page_source=True
+        )
+        if filepath:
             logger.info(f"📄 Page source dumped: {filepath}")
-            return filepath
-        except Exception as e:
-            logger.warning(f"⚠️  Could not dump page source: {e}")
-            return None
+        return filepath
 
     def _find_elements_in_any_frame(self, by, value, max_depth=3):
         """
@@ -438,7 +583,10 @@ class OriginAutomation:
             return False
 
         # 此时driver已经停留在找到mrn_cell的那个frame上下文中
+        return self._click_mrn_cell(mrn_cell)
 
+    def _click_mrn_cell(self, mrn_cell):
+        """driver已经在mrn_cell所在的frame里: 依次尝试点 MRN格子 -> 行内链接 -> 整行"""
         # 定位该单元格所在的整行
         try:
             row = mrn_cell.find_element(By.XPATH, "./ancestor::tr[1]")
@@ -458,13 +606,14 @@ class OriginAutomation:
                 self.driver.execute_script(
                     "arguments[0].scrollIntoView({block: 'center'});", target
                 )
-                time.sleep(0.3)
+                self._sleep(0.3)
                 target.click()
-                time.sleep(1.5)
+                self._sleep(1.5)
                 logger.info(f"✓ Clicked target: {target.tag_name}")
                 return True
             except Exception as e:
                 logger.info(f"  ⚠️  Click attempt failed on <{target.tag_name}>: {e}")
+                self._note_retry()
                 continue
 
         return False
@@ -513,6 +662,7 @@ class OriginAutomation:
                         logger.info(f"  ⚠️  设置日期失败: {e}")
 
             logger.info(f"✓ 日期范围已放宽: {past_str} ~ {today_str}")
+            self._queue_range_days = days_back
 
             # 点击 Reload 按钮刷新列表
             reload_btn = self._find_element_in_any_frame(
@@ -522,7 +672,7 @@ class OriginAutomation:
             if reload_btn is not None:
                 try:
                     reload_btn.click()
-                    time.sleep(2)
+                    self._sleep(2)
                     logger.info("✓ 已点击 Reload")
                 except Exception as e:
                     logger.info(f"  ⚠️  点击 Reload 失败: {e}")
@@ -534,48 +684,156 @@ class OriginAutomation:
             logger.warning(f"⚠️  放宽日期范围失败: {e}")
             return False
 
+    def _search_box_lookup(self, mrn):
+        """用队列页的搜索框按MRN过滤后再点这一行(排除From/To这两个日期框)"""
+        try:
+            search_box = self._find_element_in_any_frame(
+                By.XPATH,
+                "//input[(@type='text' or @type='search') and "
+                "not(contains(translate(@placeholder, 'YMD', 'ymd'), 'yyyy-mm-dd'))]"
+            )
+            if search_box is None:
+                return False
+            search_box.clear()
+            search_box.send_keys(mrn)
+            search_box.send_keys(Keys.RETURN)
+            self._sleep(2)
+            return self._click_patient_row_by_mrn(mrn)
+        except Exception as e:
+            logger.info(f"  ⚠️  Search box attempt failed: {e}")
+            return False
+
+    def _run_lookup_strategy(self, name, mrn):
+        if name == "today":
+            return self._click_patient_row_by_mrn(mrn)
+        if name == "search":
+            return self._search_box_lookup(mrn)
+        days = RANGE_DAYS.get(name)
+        if days:
+            return self._widen_date_range_and_reload(days_back=days) and self._click_patient_row_by_mrn(mrn)
+        return False
+
+    def prefetch_queue_index(self, mrns, callback=None):
+        """
+        批量开始时(已登录、在队列页)给这一批MRN建索引: 先扫当天列表，
+        还有没出现的MRN就依次放宽到7/30/90天再扫，直到全部找到或者放宽到头。
+        建不起来也没关系，find_patient_in_queue 会回到逐个查找。
+        """
+        def log_cb(msg):
+            if callback:
+                callback(msg)
+            logger.info(msg)
+
+        try:
+            self._sleep(2)
+            index = QueueIndex(mrns)
+            if not index.mrns:
+                return
+            index.snapshot(self.driver, self._queue_range_days)
+            for days in sorted(RANGE_DAYS.values()):
+                if not index.missing():
+                    break
+                if not self._widen_date_range_and_reload(days_back=days):
+                    break
+                index.snapshot(self.driver, days)
+            missing = index.missing()
+            log_cb(
+                f"📇 队列索引已建好: {len(index.mrns) - len(missing)}/{len(index.mrns)} 位病人可以直接定位"
+                + (f"，其余 {len(missing)} 位到时候再逐个查找" if missing else "")
+            )
+            self.queue_index = index
+        except Exception as e:
+            logger.warning(f"⚠️  建立队列索引失败，改回逐个查找: {e}")
+            self.queue_index = None
+        finally:
+            try:
+                self.driver.switch_to.default_content()
+            except Exception:
+                pass
+
+    def _click_from_queue_index(self, mrn):
+        """按索引点病人那一行；页面跟索引对不上时在当前页面重新扫一次再试"""
+        index = self.queue_index
+        level, location = index.locate(mrn, self._queue_range_days)
+        if location is None:
+            return False
+
+        current = self._queue_range_days
+        if level != current:
+            # 当前页面的范围已经比需要的宽，病人应该就在当前页面上，重扫当前页面即可；
+            # 否则放宽到索引里记录的那个范围
+            wider_now = current is not None and (level is None or current > level)
+            if not wider_now and not self._widen_date_range_and_reload(days_back=level):
+                return False
+            level = self._queue_range_days
+            location = index.levels.get(level, {}).get(mrn)
+
+        for attempt in range(2):
+            if location is not None:
+                cell = QueueIndex.fetch_cell(self.driver, location, mrn)
+                if cell is not None:
+                    return self._click_mrn_cell(cell)
+            if attempt == 0:
+                logger.info("ℹ️  队列页面跟索引对不上(页面变了)，重新扫描一次")
+                index.snapshot(self.driver, level)
+                location = index.levels.get(level, {}).get(mrn)
+        return False
+
+    @traced_step()
     def find_patient_in_queue(self, mrn):
         """
         步骤3: 在Dialysis Queue中找到病人
         Step 3: Find patient in dialysis queue
+
+        按 patient_lookup 给出的顺序逐个尝试查找策略(当天列表 -> 搜索框 ->
+        放宽到7/30/90天)，这位病人上次被哪个策略找到，这次就先试哪个。
+        每个策略的耗时都会打进日志，并累计到 data/lookup_stats.json。
         """
         try:
             mrn = str(mrn).strip()
             logger.info(f"🔍 Step 3: Finding patient MRN: {mrn} in queue...")
-            time.sleep(2)
-            
-            # 方法1: 直接在当前(默认日期范围/当天)页面精确查找MRN所在行并点击
-            logger.info("Looking for patient in current page (exact MRN match)...")
-            if self._click_patient_row_by_mrn(mrn):
-                logger.info("✓ Patient found and clicked")
-                return True
-            logger.info("Patient not found in default (today) range, widening date range...")
+            self._sleep(2)
 
-            # 方法2: 默认(今天)范围内没找到 -> 自动放宽日期范围(近90天)并重新查找
-            # 这样即使病人不是今天做透析，也能被列出来，不用手动改日期
-            if self._widen_date_range_and_reload(days_back=90):
-                if self._click_patient_row_by_mrn(mrn):
-                    logger.info("✓ Patient found after widening date range")
+            self.last_lookup_timings = []
+
+            # 批量模式: 先用批量开始时建好的队列索引直接点，不用逐个frame去搜
+            if self.queue_index is not None:
+                t0 = time.perf_counter()
+                try:
+                    ok = self._click_from_queue_index(mrn)
+                except Exception as e:
+                    logger.info(f"  ⚠️  用队列索引点击出错: {e}")
+                    ok = False
+                elapsed = time.perf_counter() - t0
+                self.last_lookup_timings.append({"strategy": "index", "seconds": round(elapsed, 2), "ok": ok})
+                logger.info(f"  ⏱️  查找策略 index: {elapsed:.2f}s {'✓ 找到' if ok else '✗ 没找到'}")
+                if ok:
+                    logger.info("✓ Patient found and clicked (strategy: index)")
                     return True
-            logger.info("Still not found after widening date range, trying search box...")
+                self._note_retry()
+                self.driver.switch_to.default_content()
 
-            # 方法3: 使用搜索框过滤后再定位该行
-            try:
-                search_box = self.driver.find_element(
-                    By.XPATH, 
-                    "//input[@type='text' or @type='search']"
-                )
-                search_box.clear()
-                search_box.send_keys(mrn)
-                search_box.send_keys(Keys.RETURN)
-                time.sleep(2)
-                
-                if self._click_patient_row_by_mrn(mrn):
-                    logger.info("✓ Patient found via search")
+            order = self.lookup_stats.order_for(mrn)
+            for i, name in enumerate(order):
+                if i > 0:
+                    self._note_retry()
+                t0 = time.perf_counter()
+                try:
+                    ok = bool(self._run_lookup_strategy(name, mrn))
+                except Exception as e:
+                    logger.info(f"  ⚠️  查找策略 {name} 出错: {e}")
+                    ok = False
+                elapsed = time.perf_counter() - t0
+                self.last_lookup_timings.append({"strategy": name, "seconds": round(elapsed, 2), "ok": ok})
+                self.lookup_stats.record_attempt(name, elapsed, ok)
+                logger.info(f"  ⏱️  查找策略 {name}: {elapsed:.2f}s {'✓ 找到' if ok else '✗ 没找到'}")
+                if ok:
+                    self.lookup_stats.record_success(mrn, name)
+                    self.lookup_stats.save()
+                    logger.info(f"✓ Patient found and clicked (strategy: {name})")
                     return True
-            except Exception as e:
-                logger.info(f"  ⚠️  Search box attempt failed: {e}")
-            
+            self.lookup_stats.save()
+
             logger.error(f"❌ Could not find patient with MRN: {mrn}")
             self.take_screenshot("patient_not_found.png")
             debug_file = self.dump_page_source("patient_not_found_page.html")
@@ -588,6 +846,7 @@ class OriginAutomation:
             self.take_screenshot("find_patient_error.png")
             return False
             
+    @traced_step()
     def open_hd_treatment_record(self):
         """
         步骤4: 打开HAEMODIALYSIS TREATMENT RECORD
@@ -602,7 +861,7 @@ class OriginAutomation:
         """
         try:
             logger.info("📋 Step 4: Opening HD Treatment Record...")
-            time.sleep(2)
+            self._sleep(2)
 
             # 优先用真实树状结构精确定位
             nursing_notes_node = self._find_element_prefer_current_frame(
@@ -624,7 +883,7 @@ class OriginAutomation:
                         )
                         anchor.click()
                         logger.info("✓ NURSING NOTES expanded")
-                        time.sleep(1.5)
+                        self._sleep(1.5)
                 except Exception as e:
                     logger.info(f"  ⚠️  Could not expand NURSING NOTES: {e}")
 
@@ -644,6 +903,7 @@ class OriginAutomation:
             # 精确定位失败，退回旧的宽泛搜索方式(兜底，不至于直接失败)
             if hd_record_node is None:
                 logger.info("ℹ️  改用宽泛搜索方式查找 HAEMODIALYSIS TREATMENT RECORD")
+                self._note_retry()
                 hd_record_node = self._find_element_prefer_current_frame(
                     By.XPATH,
                     "//*[contains(text(), 'HAEMODIALYSIS') and contains(text(), 'TREATMENT')"
@@ -669,7 +929,7 @@ class OriginAutomation:
             )
             click_target.click()
             logger.info("✓ HD Treatment Record node clicked/expanded")
-            time.sleep(2)
+            self._sleep(2)
 
             # 记住这个节点的定位方式，方便Step5(找最近日期)直接在它的子树里找，
             # 不用重新从头搜索整个页面
@@ -682,6 +942,7 @@ class OriginAutomation:
             self.take_screenshot("open_record_error.png")
             return False
 
+    @traced_step()
     def click_most_recent_date_record(self):
         """
         步骤5: 在HD Treatment Record的列表里，自动找出"日期最新"的那一条记录并点击。
@@ -708,7 +969,7 @@ class OriginAutomation:
             import re
 
             logger.info("📅 Step 5: Finding most recent date record...")
-            time.sleep(2)
+            self._sleep(2)
 
             date_pattern = re.compile(
                 r'^\s*('
@@ -776,10 +1037,10 @@ class OriginAutomation:
                     self.driver.execute_script(
                         "arguments[0].scrollIntoView({block:'center'});", best_link
                     )
-                    time.sleep(0.3)
+                    self._sleep(0.3)
                     best_link.click()
                     logger.info(f"✓ Clicked date record: {best_name}")
-                    time.sleep(2)
+                    self._sleep(2)
                     return True
                 else:
                     logger.info("ℹ️  树节点下没找到日期条目，改用兜底方式")
@@ -787,6 +1048,7 @@ class OriginAutomation:
                 logger.info("ℹ️  没有保存的HD记录树节点引用，改用兜底方式")
 
             # ===== 方法2(兜底): 原来的"扫描表格"方式 =====
+            self._note_retry()
             def collect_candidates_scoped():
                 heading = self._find_element_prefer_current_frame(
                     By.XPATH,
@@ -844,10 +1106,10 @@ class OriginAutomation:
                 self.driver.execute_script(
                     "arguments[0].scrollIntoView({block:'center'});", target
                 )
-                time.sleep(0.3)
+                self._sleep(0.3)
                 target.click()
                 logger.info("✓ Clicked most recent date record")
-                time.sleep(2)
+                self._sleep(2)
                 return True
 
             logger.info("ℹ️  Could not match any strict date pattern, falling back to first row")
@@ -860,7 +1122,7 @@ class OriginAutomation:
                 )
                 first_row.click()
                 logger.info("✓ Clicked first row as fallback")
-                time.sleep(2)
+                self._sleep(2)
                 return True
 
             logger.error("❌ Could not find any date record to click")
@@ -880,7 +1142,7 @@ class OriginAutomation:
         """
         try:
             logger.info("📅 Step 5: Opening current month table...")
-            time.sleep(2)
+            self._sleep(2)
             
             # 获取当前月份
             from datetime import datetime
@@ -897,7 +1159,7 @@ class OriginAutomation:
                 )
                 month_element.click()
                 logger.info(f"✓ {current_month} table found and clicked")
-                time.sleep(2)
+                self._sleep(2)
             except:
                 # 方法2: 点击第一个表格（假设是最新的）
                 logger.info("Current month not found, clicking first table...")
@@ -907,7 +1169,7 @@ class OriginAutomation:
                 )
                 first_row.click()
                 logger.info("✓ First table clicked")
-                time.sleep(2)
+                self._sleep(2)
             
             return True
             
@@ -972,6 +1234,7 @@ class OriginAutomation:
                 pass
             return False
 
+    @traced_step()
     def click_edit_button(self):
         """
         步骤6: 点击编辑按钮（铅笔图标）
@@ -979,7 +1242,7 @@ class OriginAutomation:
         """
         try:
             logger.info("✏️ Step 6: Clicking edit button...")
-            time.sleep(2)
+            self._sleep(2)
 
             # 优先尝试精确切换进 #main-frame (数字表单视图所在的iframe)
             switched = self._switch_to_main_frame_if_present()
@@ -998,6 +1261,7 @@ class OriginAutomation:
 
             # 方法2: 通过常见的"编辑图标"写法查找(跨iframe查找，范围更宽泛)
             if edit_button is None:
+                self._note_retry()
                 edit_button = self._find_element_prefer_current_frame(
                     By.XPATH,
                     "//button[contains(@class, 'edit')] | "
@@ -1067,7 +1331,7 @@ class OriginAutomation:
             self.driver.execute_script(
                 "arguments[0].scrollIntoView({block:'center'});", edit_button
             )
-            time.sleep(0.3)
+            self._sleep(0.3)
 
             # 这个图标绑定的是 onmousedown 事件(不是onclick!)，
             # Selenium原生的.click()通常会完整模拟mousedown+mouseup+click,应该能触发，
@@ -1077,6 +1341,7 @@ class OriginAutomation:
                 edit_button.click()
             except Exception as e:
                 logger.info(f"  ⚠️  Native click failed ({e}), trying JS mousedown dispatch...")
+                self._note_retry()
                 self.driver.execute_script(
                     """
                     var el = arguments[0];
@@ -1090,7 +1355,7 @@ class OriginAutomation:
                     edit_button
                 )
             logger.info("✓ Edit button clicked")
-            time.sleep(3)
+            self._sleep(3)
             return True
             
         except Exception as e:
@@ -1098,6 +1363,7 @@ class OriginAutomation:
             self.take_screenshot("edit_button_error.png")
             return False
             
+    @traced_step()
     def fill_data_in_form(self, data):
         """
         步骤7: 填入数据
@@ -1119,7 +1385,7 @@ class OriginAutomation:
         """
         try:
             logger.info("📝 Step 7: Filling data...")
-            time.sleep(1)
+            self._sleep(1)
 
             if self._accept_alert_if_present(timeout=2):
                 logger.info("ℹ️  Step7开始时发现并处理了一个残留弹窗")
@@ -1128,8 +1394,8 @@ class OriginAutomation:
             if not switched:
                 logger.info("ℹ️  未能切换进#main-frame/#editFrame，继续用当前frame/跨frame扫描")
 
-            self.take_screenshot("step7_start.png")
-            self.dump_page_source("step7_start.html")
+            # 正常流程的快照，只在debug_capture为always时保存
+            self.debug.capture(self.driver, "step7_start", is_error=False)
 
             UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ/"
             lower = "abcdefghijklmnopqrstuvwxyz "  # 顺便把"/"转成空格,兼容 KT/V <-> KT_V
@@ -1297,7 +1563,7 @@ class OriginAutomation:
                 except Exception as e:
                     logger.error(f"❌ 点击Add按钮失败: {e}")
                     return None, None
-                time.sleep(1.5)
+                self._sleep(1.5)
 
                 date_row = get_row_in_table(last_table, "date")  # 重新获取，避免stale element
                 new_cells = get_visible_cells(date_row) if date_row is not None else []
@@ -1319,7 +1585,9 @@ class OriginAutomation:
                 return last_table, new_idx
 
             basic_data = data.get("basic_data", {})
-            filled_count = 0
+            report = new_fill_report()
+            self.last_fill_report = report
+            self.last_fill_plan = None
 
             # ===== 先确定目标日期对应的表格+列 =====
             # 没有显式提供DATE的话(比如这次只想填HOURLY OBSERVATION，没跑护理记录那部分)，
@@ -1333,7 +1601,11 @@ class OriginAutomation:
             basic_data["DATE"] = target_date  # 规范化后的格式回填，后面统一使用
             target_table, column_index = find_target_table_and_column(target_date)
 
-            # ===== 填入基本数据 =====
+            # 先把所有要填的输入框都找出来(planned)，一次读出它们现在的值，
+            # 比较之后只写有变化的字段(见 form_diff.py)
+            planned = []
+
+            # ===== 定位基本数据的输入框 =====
             for key, value in basic_data.items():
                 if not value:
                     continue
@@ -1360,6 +1632,7 @@ class OriginAutomation:
 
                     if input_field is None:
                         logger.warning(f"  ⚠️  Could not find field for: {key} (尝试匹配的文字: '{field_name_lower}')")
+                        report["not_found"].append(key)
                         # 顺手把这张recordTbl表格里实际存在哪些字段名打进日志，
                         # 这样万一某个字段(比如HRS_OF_HD)一直填不进去，
                         # 直接看日志就知道Origin页面上真实的label文字长什么样，
@@ -1377,59 +1650,22 @@ class OriginAutomation:
                             pass
                         continue
 
-                    self.driver.execute_script(
-                        "arguments[0].scrollIntoView({block:'center'});", input_field
-                    )
-
-                    tag = input_field.tag_name.lower()
-                    if tag == "select":
-                        select = Select(input_field)
-                        try:
-                            select.select_by_visible_text(str(value))
-                        except Exception:
-                            matched = False
-                            for opt in select.options:
-                                if opt.text.strip().lower() == str(value).strip().lower():
-                                    select.select_by_visible_text(opt.text)
-                                    matched = True
-                                    break
-                            if not matched:
-                                raise
-                    else:
-                        field_class = input_field.get_attribute("class") or ""
-                        is_datepicker = "datepicker" in field_class.lower()
-
-                        send_value = str(value)
-                        if is_datepicker:
-                            # 不管这个日期类字段之前是什么格式(比如"1262025"这种没有分隔符的)，
-                            # 统一转成Origin要的 DD-MM-YYYY 格式再填入
-                            normalized = normalize_date(send_value)
-                            if normalized and normalized != send_value:
-                                logger.info(f"  ℹ️  {key} 日期格式已规范化: '{send_value}' → '{normalized}'")
-                            send_value = normalized or send_value
-
-                        input_field.clear()
-                        input_field.send_keys(send_value)
-                        if is_datepicker:
-                            input_field.send_keys(Keys.ESCAPE)
-
-                    filled_count += 1
-                    logger.info(f"  ✓ {key}: {value}")
-                    time.sleep(0.2)
+                    planned.append({"field": key, "el": input_field, "value": value, "hourly": False})
 
                 except Exception as e:
-                    logger.warning(f"  ⚠️  Could not fill {key}: {e}")
+                    logger.warning(f"  ⚠️  Could not locate {key}: {e}")
+                    report["failed"].append(key)
 
-            # ===== 填入 HOURLY OBSERVATION =====
+            # ===== 定位 HOURLY OBSERVATION 的输入框 =====
             # app.py里每条记录的key是: TIME, BP, VP, QB, QD, PULSE, UFR
             # 表单上这一列的input顺序是: TIME, BP, VP, QB, QD, TMP, UFR (7个input)
             # 注意: app的"PULSE"对应表单上的"TMP"位置——两边的数值格式都是"P-xx"这种，
             # 已经用实际数据核实过。
             hourly_obs = data.get("hourly_observations", [])
-            filled_hourly = 0
+            hourly_slots_used = 0
 
             # 用之前先确认一下target_table这个引用还有效(防御性检查，
-            # 万一前面filling basic_data的过程中出现了意外的页面/frame变动，
+            # 万一前面定位basic_data的过程中出现了意外的页面/frame变动，
             # 这里能重新定位一次，而不是直接崩溃或者悄悄填错地方)
             if target_table is not None:
                 try:
@@ -1439,96 +1675,213 @@ class OriginAutomation:
                     target_table, column_index = find_target_table_and_column(target_date)
 
             if hourly_obs and target_table is not None and column_index is not None:
-                # 找到目标表格里"HOURLY OBSERVATION"区块所有行，在目标列(column_index)取单元格。
-                # 区块从<th>HOURLY OBSERVATION</th>那一行开始，后面紧跟着若干个<th></th>(空标签)
-                # 的行都属于同一区块，直到遇到下一个有文字的<th>(比如REMARKS)为止。
-                # 注意: 必须限定在target_table这一张具体表格里搜，不能整页面搜。
-                rows = target_table.find_elements(By.XPATH, ".//tr[th]")
-                hourly_cells = []
-                collecting = False
-                if rows:
-                    for row in rows:
-                        try:
-                            th_text = row.find_element(By.TAG_NAME, "th").text.strip().upper()
-                        except Exception:
-                            th_text = ""
-                        if "HOURLY OBSERVATION" in th_text:
-                            collecting = True
-                            cells = get_visible_cells(row)
-                            if column_index < len(cells):
-                                hourly_cells.append(cells[column_index])
-                            continue
-                        if collecting:
-                            if th_text == "":
-                                cells = get_visible_cells(row)
-                                if column_index < len(cells):
-                                    hourly_cells.append(cells[column_index])
-                            else:
-                                break  # 遇到下一个有文字的标签(比如REMARKS)，停止收集
-
-                logger.info(f"✓ Found {len(hourly_cells)} hourly observation slot(s) in target column (第{column_index+1}列)")
-
-                field_order = ["TIME", "BP", "VP", "QB", "QD", "PULSE", "UFR"]  # 对应表单里第7个是TMP位置
+                # 一次JS把目标表格里"HOURLY OBSERVATION"区块、目标列(column_index)的
+                # 所有input按 时间点 x 7个格子 的矩阵取回来(规则见 form_diff.HOURLY_GRID_JS)，
+                # 不再逐行用WebDriver读<th>文字、逐格find_elements。
+                # 注意: 必须限定在target_table这一张具体表格里，不能整页面搜。
+                try:
+                    hourly_grid = self.driver.execute_script(HOURLY_GRID_JS, target_table, column_index) or []
+                except Exception as e:
+                    logger.warning(f"  ⚠️  读取HOURLY OBSERVATION网格失败: {e}")
+                    hourly_grid = []
+
+                logger.info(f"✓ Found {len(hourly_grid)} hourly observation slot(s) in target column (第{column_index+1}列)")
+
+                if len(hourly_obs) > len(hourly_grid):
+                    extra = hourly_obs[len(hourly_grid):]
+                    report["overflow"] = [
+                        f"HOURLY[{len(hourly_grid) + k + 1}]"
+                        + (f" {obs.get('TIME')}" if isinstance(obs, dict) and obs.get("TIME") else "")
+                        for k, obs in enumerate(extra)
+                    ]
+                    logger.warning(
+                        f"  ⚠️  有 {len(hourly_obs)} 个时间点的记录，但表格里HOURLY OBSERVATION只有"
+                        f"{len(hourly_grid)}行空位，以下 {len(extra)} 个没有填: {report['overflow']}"
+                    )
 
-                for i, obs in enumerate(hourly_obs):
-                    if i >= len(hourly_cells):
-                        logger.warning(
-                            f"  ⚠️  第{i+1}个时间点没有对应的表格行可填"
-                            f"(表格里HOURLY OBSERVATION只有{len(hourly_cells)}行空位)"
-                        )
-                        break
+                for i, obs in enumerate(hourly_obs[:len(hourly_grid)]):
                     if not isinstance(obs, dict):
                         continue
+                    inputs = hourly_grid[i]
+                    if len(inputs) < len(HOURLY_FIELD_ORDER):
+                        logger.warning(
+                            f"  ⚠️  第{i+1}个时间点的单元格里input数量不对"
+                            f"(找到{len(inputs)}个，预期{len(HOURLY_FIELD_ORDER)}个)"
+                        )
 
-                    cell = hourly_cells[i]
-                    try:
-                        inputs = cell.find_elements(By.TAG_NAME, "input")
-                    except Exception:
-                        inputs = []
-
-                    if len(inputs) < 7:
-                        logger.warning(f"  ⚠️  第{i+1}个时间点的单元格里input数量不对(找到{len(inputs)}个，预期7个)")
-
-                    for idx, field_key in enumerate(field_order):
+                    hourly_slots_used += 1
+                    # 表单里第6个格子是TMP位置，对应app的PULSE
+                    for idx, field_key in enumerate(HOURLY_FIELD_ORDER):
                         if idx >= len(inputs):
                             break
                         value = obs.get(field_key, "")
                         if not value:
                             continue
-                        try:
-                            inp = inputs[idx]
-                            self.driver.execute_script(
-                                "arguments[0].scrollIntoView({block:'center'});", inp
-                            )
-                            inp.clear()
-                            inp.send_keys(str(value))
-                            filled_hourly += 1
-                        except Exception as e:
-                            logger.warning(f"  ⚠️  Could not fill hourly[{i}].{field_key}: {e}")
+                        planned.append({
+                            "field": f"HOURLY[{i+1}].{field_key}", "el": inputs[idx],
+                            "value": value, "hourly": True,
+                        })
+            elif hourly_obs and (target_table is None or column_index is None):
+                logger.warning("⚠️  没有找到目标日期对应的表格/列，HOURLY OBSERVATION已跳过")
+
+            # ===== 一次读出现在的值，算出要写哪些 =====
+            try:
+                states = self.driver.execute_script(READ_FIELDS_JS, [p["el"] for p in planned]) or []
+            except Exception as e:
+                logger.warning(f"  ⚠️  批量读取表单现有值失败，所有字段都先保留原值等确认: {e}")
+                states = []
+
+            conflicts = []
+            for i, p in enumerate(planned):
+                state = states[i] if i < len(states) else None
+                p["tag"] = (state or {}).get("tag", "")
+                p["is_datepicker"] = "datepicker" in (state or {}).get("cls", "").lower()
+                send_value = str(p["value"])
+                current = (state or {}).get("value", "")
+                if p["is_datepicker"]:
+                    # 不管这个日期类字段之前是什么格式(比如"1262025"这种没有分隔符的)，
+                    # 统一转成Origin要的 DD-MM-YYYY 格式再比较/填入
+                    normalized = normalize_date(send_value)
+                    if normalized and normalized != send_value:
+                        logger.info(f"  ℹ️  {p['field']} 日期格式已规范化: '{send_value}' → '{normalized}'")
+                    send_value = normalized or send_value
+                    current = normalize_date(current) if current else current
+                p["send_value"] = send_value
+
+                # 读不到现在的值(读取脚本出错/元素stale)，不知道表单里是不是已经有别的数据，
+                # 不能直接写，跟冲突一样先保留、等确认
+                kind = classify(current, send_value) if state is not None else "conflict"
+                if state is None:
+                    current = UNREADABLE_VALUE
+                if kind == "unchanged":
+                    report["unchanged"].append(p["field"])
+                elif kind == "update":
+                    p["write"] = True
+                else:
+                    p["current"] = current
+                    conflicts.append(p)
+
+            if conflicts:
+                report["conflicts"] = [
+                    {"field": p["field"], "current": p["current"], "intended": p["send_value"]}
+                    for p in conflicts
+                ]
+                if self._allow_overwrite(report["conflicts"]):
+                    logger.info(f"  ℹ️  {len(conflicts)} 个字段跟表单里原来的值不同，已确认覆盖")
+                    for p in conflicts:
+                        p["write"] = True
+                else:
+                    for c in report["conflicts"]:
+                        logger.warning(
+                            f"  ⚠️  {c['field']}: 表单里已经是 '{c['current']}'，要填的是 '{c['intended']}' "
+                            f"——保留原值，需要确认 Conflict held for confirmation"
+                        )
+                    report["held"] = [p["field"] for p in conflicts]
 
-                    time.sleep(0.1)
+            # ===== 只写有变化的字段 =====
+            filled_count = 0
+            filled_hourly = 0
 
+            # 每小时记录(最多 7 x 时间点 个格子)用一次JS全部写进去；写不进去的再逐个用键盘输入
+            hourly_writes = [p for p in planned if p.get("write") and p["hourly"]]
+            if hourly_writes:
+                try:
+                    written = self.driver.execute_script(
+                        WRITE_VALUES_JS, [p["el"] for p in hourly_writes], [p["send_value"] for p in hourly_writes]
+                    ) or []
+                except Exception as e:
+                    logger.warning(f"  ⚠️  一次性写入每小时记录失败，改为逐个输入: {e}")
+                    written = []
+                for i, p in enumerate(hourly_writes):
+                    if i < len(written) and written[i]:
+                        p["write"] = False
+                        report["updated"].append(p["field"])
+                        filled_hourly += 1
+
+            for p in planned:
+                if not p.get("write"):
+                    continue
+                try:
+                    self._write_form_field(p)
+                    report["updated"].append(p["field"])
+                    if p["hourly"]:
+                        filled_hourly += 1
+                    else:
+                        filled_count += 1
+                        logger.info(f"  ✓ {p['field']}: {p['value']}")
+                except Exception as e:
+                    report["failed"].append(p["field"])
+                    logger.warning(f"  ⚠️  Could not fill {p['field']}: {e}")
+
+            if hourly_slots_used:
                 logger.info(
                     f"✅ Filled {filled_hourly} hourly-observation field(s) "
-                    f"across {min(len(hourly_obs), len(hourly_cells))} time slot(s)"
+                    f"across {hourly_slots_used} time slot(s)"
                 )
-                filled_count += filled_hourly
-            elif hourly_obs and (target_table is None or column_index is None):
-                logger.warning("⚠️  没有找到目标日期对应的表格/列，HOURLY OBSERVATION已跳过")
+            filled_count += filled_hourly
 
             logger.info(f"✅ Filled {filled_count} fields total")
+            logger.info(f"🧮 对比结果 Fill diff: {summarize_report(report)}")
+
+            # 保存后核对要用: 每个字段应该是什么值(没覆盖的冲突字段单独记)
+            self.last_fill_plan = {
+                "date": target_date,
+                "fields": {p["field"]: p["send_value"] for p in planned},
+                "held": list(report["held"]),
+            }
 
-            if filled_count == 0:
+            # 重跑时表单里可能已经全是同样的数据，0个写入也是正常的
+            if filled_count == 0 and not report["unchanged"] and not report["held"]:
                 logger.error("❌ 0个字段被成功填入！很可能是没找到对应的输入框")
                 self.dump_page_source("fill_data_zero_filled.html")
 
-            return filled_count > 0
+            return filled_count > 0 or bool(report["unchanged"]) or bool(report["held"])
             
         except Exception as e:
             logger.error(f"❌ Fill data error: {e}")
             self.take_screenshot("fill_data_error.png")
             return False
             
+    def _allow_overwrite(self, conflicts):
+        if self.overwrite_conflicts:
+            return True
+        if self.confirm_conflicts is None:
+            return False
+        try:
+            return bool(self.confirm_conflicts(conflicts))
+        except Exception as e:
+            logger.warning(f"⚠️  确认是否覆盖时出错，保留原值: {e}")
+            return False
+
+    def _write_form_field(self, p):
+        """写入一个字段(p来自fill_data_in_form的planned列表)"""
+        input_field = p["el"]
+        self.driver.execute_script(
+            "arguments[0].scrollIntoView({block:'center'});", input_field
+        )
+        tag = p.get("tag") or input_field.tag_name.lower()
+        if tag == "select":
+            select = Select(input_field)
+            try:
+                select.select_by_visible_text(p["send_value"])
+            except Exception:
+                matched = False
+                for opt in select.options:
+                    if opt.text.strip().lower() == p["send_value"].strip().lower():
+                        select.select_by_visible_text(opt.text)
+                        matched = True
+                        break
+                if not matched:
+                    raise
+        else:
+            input_field.clear()
+            input_field.send_keys(p["send_value"])
+            if p.get("is_datepicker"):
+                input_field.send_keys(Keys.ESCAPE)
+        if not p["hourly"]:
+            self._sleep(0.2)
+
+    @traced_step()
     def save_form(self):
         """
         步骤8: 保存表单
@@ -1536,7 +1889,7 @@ class OriginAutomation:
         """
         try:
             logger.info("💾 Step 8: Saving form...")
-            time.sleep(1)
+            self._sleep(1)
 
             # 保持在 #main-frame 里操作
             switched = self._switch_to_main_frame_if_present()
@@ -1561,7 +1914,7 @@ class OriginAutomation:
             )
             save_button.click()
             logger.info("✓ Save button clicked")
-            time.sleep(1.5)
+            self._sleep(1.5)
 
             # 关键: 点击UPDATE/SAVE后，Origin会弹出一个原生JS弹窗("Update Successfully.")，
             # 如果不处理掉，这个弹窗会一直悬在浏览器上，导致【下一步】任何Selenium操作
@@ -1596,7 +1949,7 @@ class OriginAutomation:
                 self.dump_page_source("save_no_alert.html")
                 return False
 
-            time.sleep(1.5)
+            self._sleep(1.5)
             
             logger.info("✅ Form saved")
             return True
@@ -1609,44 +1962,108 @@ class OriginAutomation:
             self.take_screenshot("save_error.png")
             return False
             
-    def take_screenshot(self, filename):
-        """截图"""
+    @traced_step()
+    def verify_saved_record(self):
+        """
+        保存后核对: 重新加载表单所在的frame(从服务器取回刚保存的记录)，
+        用一次JS读回目标日期那一列的 tbl1/recordTbl/HOURLY OBSERVATION，
+        跟 fill_data_in_form 填进去的值逐个比较。
+        返回 form_diff.build_verification 的报告，没有可核对的内容时返回None。
+        """
+        plan = self.last_fill_plan
+        self.last_verification = None
+        if not plan or not plan.get("fields"):
+            return None
         try:
-            self.driver.save_screenshot(f"logs/{filename}")
-            logger.info(f"📸 Screenshot: logs/{filename}")
-        except:
-            pass
+            logger.info("🔎 保存后核对 Verifying saved record...")
+            self._switch_to_main_frame_if_present()
+            # replace而不是reload: 表单如果是POST打开的，reload会弹"重新提交表单"的确认框
+            self.driver.execute_script("location.replace(location.href);")
+            self._sleep(1)
+            self._switch_to_main_frame_if_present()
+            WebDriverWait(self.driver, 15).until(lambda d: d.execute_script(
+                "return document.readyState === 'complete' && "
+                "!!document.querySelector('table.recordTbl, table.tbl1');"
+            ))
+            snapshot = self.driver.execute_script(READ_BACK_JS, plan["date"])
+        except Exception as e:
+            logger.warning(f"⚠️  保存后核对时重新加载/读取记录失败: {e}")
+            self.take_screenshot("verify_error.png")
+            self.last_verification = {
+                "status": "error", "reason": str(e), "fields": {},
+                "verified": 0, "mismatches": [], "missing": [],
+            }
+            return self.last_verification
+
+        verification = build_verification(plan["fields"], plan.get("held"), snapshot)
+        self.last_verification = verification
+        logger.info(f"🔎 核对结果 Verification: {summarize_verification(verification)}")
+        for field, info in verification["fields"].items():
+            if info["status"] in ("mismatch", "missing"):
+                logger.warning(
+                    f"  ⚠️  {field}: 填的是 '{info['expected']}'，Origin里读回来是 "
+                    f"{'(读不到)' if info['actual'] is None else repr(info['actual'])}"
+                )
+        if verification["status"] != "verified":
+            self.take_screenshot("verify_mismatch.png")
+        return verification
+
+    def take_screenshot(self, filename, is_error=True):
+        """截图(保存到logs/debug/，是否保存由debug_capture级别决定)"""
+        filepath = self.debug.capture(
+            self.driver, filename, is_error=is_error, screenshot=True, page_source=False
+        )
+        if filepath:
+            logger.info(f"📸 Screenshot: {filepath}")
             
-    def run_automation(self, username, password, mrn, data, callback=None):
+    def run_automation(self, username, password, mrn, data, callback=None, keep_browser_open=False):
         """
         运行完整的自动化流程
         Run complete automation workflow
+
+        keep_browser_open: True时是"保温浏览器"模式——跑完不关浏览器，
+            下一位病人再调用时直接复用已经登录好的session(见 ensure_logged_in)，
+            省掉冷启动Chrome+登录+选部门的时间。出错时依然会关掉浏览器，
+            避免下一次接着用一个状态不明的浏览器。
         """
         def log_cb(msg):
             if callback:
                 callback(msg)
             logger.info(msg)
-        
+
+        close_browser = not keep_browser_open
         try:
-            # 初始化
-            log_cb("⏳ 初始化浏览器 Initializing...")
-            if not self.initialize_driver():
-                return False
-            
-            # 步骤1: 用户名密码登录
-            log_cb("🔐 Step 1/8: 登录 Login...")
-            if not self.login_step1_credentials(username, password):
-                log_cb("❌ 登录失败 Login failed")
-                return False
-            log_cb("✅ Step 1 完成")
-            
-            # 步骤2: 选择部门
-            log_cb("🏥 Step 2/8: 选择部门 Select department...")
-            if not self.login_step2_department():
-                log_cb("❌ 部门选择失败 Department selection failed")
-                return False
-            log_cb("✅ Step 2 完成")
+            if keep_browser_open:
+                # 步骤1-2: 登录+选择部门(浏览器还开着且已登录的话直接跳过)
+                log_cb("🔐 Step 1-2/8: 登录 Login (复用已登录浏览器 if warm)...")
+                if not self.ensure_logged_in(username, password, callback):
+                    close_browser = True
+                    return False
+                log_cb("✅ Step 1-2 完成")
+            else:
+                # 初始化
+                log_cb("⏳ 初始化浏览器 Initializing...")
+                if not self.initialize_driver():
+                    return False
+
+                # 步骤1: 用户名密码登录
+                log_cb("🔐 Step 1/8: 登录 Login...")
+                if not self.login_step1_credentials(username, password):
+                    log_cb("❌ 登录失败 Login failed")
+                    return False
+                log_cb("✅ Step 1 完成")
+
+                # 步骤2: 选择部门
+                log_cb("🏥 Step 2/8: 选择部门 Select department...")
+                if not self.login_step2_department():
+                    log_cb("❌ 部门选择失败 Department selection failed")
+                    return False
+                log_cb("✅ Step 2 完成")
             
+            # 步骤3开始算这位病人自己的耗时(登录那几步单独记一条)
+            self.tracer.start_patient(mrn)
+            self.debug.mrn = mrn
+
             # 步骤3: 查找病人
             log_cb(f"🔍 Step 3/8: 查找病人 Finding patient {mrn}...")
             if not self.find_patient_in_queue(mrn):
@@ -1688,31 +2105,43 @@ class OriginAutomation:
             if not save_success:
                 log_cb("⚠️  Could not verify save")
             log_cb("✅ Step 8 完成")
+
+            if save_success and self.verify_after_save:
+                verification = self.verify_saved_record()
+                if verification:
+                    log_cb(f"🔎 保存后核对 Verification: {summarize_verification(verification)}")
             
             if fill_success and save_success:
                 log_cb("✅ 自动化完成，数据已填入并保存！Automation completed successfully!")
             else:
                 log_cb("⚠️  自动化流程跑完了，但数据可能没有真正填入/保存，请手动检查表单！")
                 log_cb("⚠️  Automation ran to completion, but data may NOT actually be filled/saved — please verify manually!")
-            self.take_screenshot("success.png")
+            self.take_screenshot("success.png", is_error=False)
+            self.tracer.finish_patient(fill_success and save_success)
             return fill_success and save_success
             
         except Exception as e:
             log_cb(f"❌ 错误 Error: {str(e)}")
             self.take_screenshot("automation_error.png")
+            close_browser = True
             return False
             
         finally:
-            if self.driver:
-                log_cb("⏳ 5秒后关闭浏览器 Closing browser in 5s...")
-                time.sleep(5)
-                self.driver.quit()
+            self.tracer.flush()  # 中途失败的病人/登录记录也写出去
+            if self.driver and close_browser:
+                if not keep_browser_open:
+                    log_cb("⏳ 5秒后关闭浏览器 Closing browser in 5s...")
+                    self._sleep(5)
+                self.close()
                 log_cb("✅ 浏览器已关闭 Browser closed")
+            elif self.driver:
+                log_cb("🔥 浏览器保持登录状态，下一位病人可直接开始 Browser kept warm for the next patient")
 
     # ============================================================
     # 批量处理 Batch Processing
     # ============================================================
 
+    @traced_step()
     def return_to_queue(self, callback=None):
         """
         批量处理时，处理完一个病人后，尝试回到 Dialysis Queue，
@@ -1747,7 +2176,8 @@ class OriginAutomation:
             url = self.origin_urls[0] if self.origin_urls else None
             if url:
                 self.driver.get(url)
-                time.sleep(2)
+                self._queue_range_days = None  # 重新打开的队列页回到默认(当天)范围
+                self._sleep(2)
 
             page_upper = self.driver.page_source.upper()
 
@@ -1781,27 +2211,55 @@ class OriginAutomation:
             log_cb(f"⚠️  返回队列时出错 Error returning to queue: {e}")
             return False
 
-    def process_single_patient_in_session(self, mrn, data, callback=None):
+    def process_single_patient_in_session(self, mrn, data, callback=None, on_state=None):
         """
         在【已经登录】的会话里，处理单个病人的步骤3-8
         (查找病人 -> 打开治疗记录 -> 打开最近日期 -> 点编辑 -> 填数据 -> 保存)。
         不负责登录/初始化浏览器/关闭浏览器 —— 这些由调用方(run_batch_automation)负责，
         这样多个病人可以复用同一个已登录的session，不用每个病人都重新登录一次。
 
-        返回一个 dict: {"success": bool, "reason": str}
+        on_state: 可选，每到一个关键节点就调用一次 on_state(状态名)，
+                  状态依次是 found / editing / filled / saved / failed，
+                  批量模式下用它把进度写进落盘日志(batch_journal)，崩溃后可以续跑。
+
+        返回一个 dict: {"success": bool, "reason": str, "fill_report": dict或None,
+                      "verification": dict(保存成功时才有)}
+        (fill_report 见 form_diff.new_fill_report: 哪些字段相同没写/更新了/有冲突没覆盖；
+         verification 见 form_diff.build_verification: 保存后读回来逐个字段核对的结果)
         """
         def log_cb(msg):
             if callback:
                 callback(msg)
             logger.info(msg)
 
+        def mark(state, reason=""):
+            if on_state:
+                try:
+                    on_state(state, reason)
+                except Exception as e:
+                    logger.warning(f"⚠️  记录状态'{state}'失败: {e}")
+
+        self.tracer.start_patient(mrn)
+        self.debug.mrn = mrn
+        result = self._process_single_patient_steps(mrn, data, log_cb, mark)
+        self.tracer.finish_patient(result["success"])
+        if result["success"]:
+            mark("saved", result["reason"])
+        else:
+            mark("needs_review" if result.get("needs_review") else "failed", result["reason"])
+        return result
+
+    def _process_single_patient_steps(self, mrn, data, log_cb, mark):
+        """process_single_patient_in_session 的实际步骤，状态回调由外层统一收尾"""
         result = {"success": False, "reason": ""}
+        self.last_fill_report = None
         try:
             log_cb(f"🔍 查找病人 Finding patient MRN {mrn}...")
             if not self.find_patient_in_queue(mrn):
                 result["reason"] = "找不到病人 Patient not found in queue"
                 log_cb(f"❌ {result['reason']}")
                 return result
+            mark("found")
 
             log_cb("📋 打开治疗记录 Opening HD treatment record...")
             if not self.open_hd_treatment_record():
@@ -1818,34 +2276,65 @@ class OriginAutomation:
                 result["reason"] = "找不到编辑按钮，表单未进入可编辑状态 Edit button not found"
                 log_cb(f"❌ {result['reason']}")
                 return result
+            mark("editing")
 
             log_cb("📝 填入数据 Filling data...")
             fill_success = self.fill_data_in_form(data)
             if not fill_success:
                 log_cb("⚠️  没有任何字段被成功填入 No fields were filled")
+            else:
+                mark("filled")
 
             log_cb("💾 保存 Saving...")
             save_success = self.save_form()
             if not save_success:
                 log_cb("⚠️  无法确认保存状态 Could not verify save")
 
+            if save_success and self.verify_after_save:
+                verification = self.verify_saved_record()
+                if verification:
+                    log_cb(f"🔎 保存后核对 Verification: {summarize_verification(verification)}")
+                    result["verification"] = verification
+
             result["success"] = bool(fill_success and save_success)
+            result["fill_report"] = self.last_fill_report
             if not result["success"]:
                 result["reason"] = "数据可能没有完全填入/保存，请手动检查 Please verify manually"
+            elif result.get("verification", {}).get("status") in ("mismatch", "not_found", "error"):
+                # 保存了，但不能算成功: 留在队列里，落盘日志也不记为saved，等护理师确认
+                result["success"] = False
+                result["needs_review"] = True
+                result["reason"] = (
+                    f"已保存，但核对发现问题: {summarize_verification(result['verification'])}，"
+                    "请在Origin里检查这些字段 Saved, but read-back verification found problems"
+                )
+            elif self.last_fill_report and self.last_fill_report.get("held"):
+                result["success"] = False
+                result["needs_review"] = True
+                result["reason"] = (
+                    f"有 {len(self.last_fill_report['held'])} 个字段跟Origin里已有的值不同，未覆盖，"
+                    "需要确认 Conflicting fields held for confirmation"
+                )
             return result
 
         except Exception as e:
             result["reason"] = str(e)
             log_cb(f"❌ 处理该病人时出错 Error processing patient: {e}")
-            self.take_screenshot(f"batch_error_{mrn}.png")
+            self.take_screenshot("batch_error.png")
             return result
 
-    def run_batch_automation(self, username, password, jobs, callback=None):
+    def run_batch_automation(self, username, password, jobs, callback=None, journal=None):
         """
         批量处理多个病人：只登录一次，依次处理名单里的每一个病人，
         全部处理完才统一关闭浏览器。
 
-        jobs: list of dict，每个dict至少要有:
+        journal: 可选，一个 modules.batch_journal.BatchJournal。传了的话，
+            每位病人的状态变化都会立刻落盘；日志里已经确认保存成功(saved)的病人
+            会直接跳过，不会重复写入——程序崩溃/重启后续跑时靠的就是这个。
+
+        jobs: 可以是list，也可以是任何可迭代对象(比如 modules.batch_pipeline.BatchPipeline:
+            边OCR边填入时病人是陆续交进来的，取不到下一位时就在循环里等着)。
+            每个元素是一个dict，至少要有:
             {
                 "mrn": "22001725",              # 病人MRN(病历号)，必须
                 "name": "GOH GAIK MOOI",         # 病人姓名，仅用于显示/日志
@@ -1864,7 +2353,8 @@ class OriginAutomation:
             logger.info(msg)
 
         results = []
-        total = len(jobs)
+        # 流水线模式下事先不知道一共几位
+        total = len(jobs) if hasattr(jobs, "__len__") else None
 
         try:
             log_cb("⏳ 初始化浏览器 Initializing...")
@@ -1879,7 +2369,18 @@ class OriginAutomation:
             if not self.login_step2_department():
                 log_cb("❌ 部门选择失败，批量处理终止 Department selection failed")
                 return results
-            log_cb(f"✅ 登录成功，开始批量处理 {total} 位病人")
+            if total is None:
+                log_cb("✅ 登录成功，病人核对完一位就填入一位 Logged in, filling patients as they arrive")
+            else:
+                log_cb(f"✅ 登录成功，开始批量处理 {total} 位病人")
+
+                # 一次扫完整个队列页，给这一批(还没保存过的)病人建 MRN -> 表格位置 索引
+                # (流水线模式下病人是陆续来的，没法事先建，逐个查找)
+                pending_mrns = [
+                    job.get("mrn") for job in jobs
+                    if journal is None or not journal.is_saved(job_key(job))
+                ]
+                self.prefetch_queue_index(pending_mrns, callback)
 
             for idx, job in enumerate(jobs, start=1):
                 mrn = str(job.get("mrn", "")).strip()
@@ -1887,7 +2388,8 @@ class OriginAutomation:
                 data = job.get("data", {})
 
                 log_cb(f"\n{'='*50}")
-                log_cb(f"👤 [{idx}/{total}] 处理病人 Processing: {name} (MRN: {mrn})")
+                position = f"{idx}/{total}" if total is not None else f"{idx}"
+                log_cb(f"👤 [{position}] 处理病人 Processing: {name} (MRN: {mrn})")
                 log_cb(f"{'='*50}")
 
                 if not mrn:
@@ -1895,6 +2397,15 @@ class OriginAutomation:
                     results.append({"mrn": mrn, "name": name, "success": False, "reason": "缺少MRN"})
                     continue
 
+                key = job_key(job) if journal is not None else None
+                if journal is not None and journal.is_saved(key):
+                    log_cb(f"⏭️  [{name}] 落盘日志显示上次已经保存成功，跳过(不重复写入)")
+                    results.append({
+                        "mrn": mrn, "name": name, "success": True,
+                        "reason": "上次运行已保存 Already saved in a previous run"
+                    })
+                    continue
+
                 # 第一个病人不需要"返回队列"(登录后本来就在队列页附近)
                 if idx > 1:
                     back_ok = self.return_to_queue(callback)
@@ -1910,24 +2421,33 @@ class OriginAutomation:
                                 "mrn": mrn, "name": name,
                                 "success": False, "reason": "重新登录失败 Re-login failed"
                             })
+                            if journal is not None:
+                                journal.record(key, "failed", "重新登录失败 Re-login failed")
                             continue
 
-                patient_result = self.process_single_patient_in_session(mrn, data, callback)
-                results.append({
-                    "mrn": mrn, "name": name,
-                    "success": patient_result["success"],
-                    "reason": patient_result["reason"]
-                })
+                on_state = None
+                if journal is not None:
+                    on_state = lambda state, reason="", k=key: journal.record(k, state, reason)
+                # 护理师在开始前确认过"覆盖"的病人(上次有字段没覆盖)，这一位直接覆盖
+                self.overwrite_conflicts = bool(job.get("overwrite_conflicts"))
+                patient_result = self.process_single_patient_in_session(
+                    mrn, data, callback, on_state=on_state
+                )
+                results.append({"mrn": mrn, "name": name, **patient_result})
 
                 status_icon = "✅" if patient_result["success"] else "⚠️"
                 log_cb(f"{status_icon} [{name}] 处理完毕")
 
             # 批量处理总结
             success_count = sum(1 for r in results if r["success"])
+            review_count = sum(1 for r in results if r.get("needs_review"))
             log_cb(f"\n{'='*50}")
-            log_cb(f"📊 批量处理完成 Batch complete: {success_count}/{total} 成功")
+            log_cb(
+                f"📊 批量处理完成 Batch complete: {success_count}/{len(results)} 成功"
+                + (f"，{review_count} 位需要确认 need review" if review_count else "")
+            )
             for r in results:
-                mark = "✅" if r["success"] else "❌"
+                mark = "✅" if r["success"] else ("⚠️" if r.get("needs_review") else "❌")
                 extra = f" — {r['reason']}" if r["reason"] else ""
                 log_cb(f"  {mark} {r['name']} (MRN: {r['mrn']}){extra}")
             log_cb(f"{'='*50}")
@@ -1940,10 +2460,11 @@ class OriginAutomation:
             return results
 
         finally:
+            self.queue_index = None
             if self.driver:
                 log_cb("⏳ 5秒后关闭浏览器 Closing browser in 5s...")
-                time.sleep(5)
-                self.driver.quit()
+                self._sleep(5)
+                self.close()
                 log_cb("✅ 浏览器已关闭 Browser closed")
 
 
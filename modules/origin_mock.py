@@ -0,0 +1,678 @@
+"""
+origin_mock.py
+本地的"假Origin"——照着真实Origin页面结构(调试HTML里确认过的那些)搭的一个Flask小网站，
+只覆盖 OriginAutomation 会碰到的页面，用来在不连医院内网的情况下
+端到端地跑自动化、测速度、查回归。
+
+覆盖的页面/结构:
+- 登录页(KLSCH，USER ID/密码框 + LOGIN按钮)
+- "WELCOME TO ORIGIN" 部门选择页(下拉框选 HAEMODIALYSIS UNIT 会弹 confirm，再点LOGIN)
+- Dialysis Queue(在 #tab-frame 里): From/To 日期框(placeholder="yyyy-MM-dd") + Reload，
+  默认只列出当天的病人；点MRN所在行进入该病人的 MEDICAL FOLDER
+- MEDICAL FOLDER 树: div[data-type=4] NURSING NOTES > HAEMODIALYSIS UNIT TREATMENT RECORD
+  > span > div[data-type=19] 日期条目(含 "Open Full View" 和 "... more file(s)")，
+  INVESTIGATIONS 下也放了一个同名节点(真实系统就是这样)
+- 点日期条目 -> parent.OpenMainFrame() 把记录加载进顶层的 #main-frame，
+  里面有 DoDigitalEdit 铅笔图标(edit2.png)和 iframe#editFrame
+- 表单: table.tbl1(病人固定信息) + 两张 table.recordTbl(每个日期一列，
+  每行都带一个隐藏的 td.copy 模板格，btn-addcolumn 的 Add 按钮用它新增一列)，
+  HOURLY OBSERVATION 区块每格7个input，UPDATE 按钮保存后弹 "Update Successfully."
+- 保存的数据存在内存里，下次打开同一位病人能看到上次保存的值
+
+用法:
+    python -m modules.origin_mock serve --port 8090 --delay 0.2
+        然后在 config.json 里把 origin_url 设成 http://127.0.0.1:8090/EMR/main.jsp
+    python -m modules.origin_mock bench --patients 10 --delay 0.1 --headless
+        起一个假Origin，用 run_batch_automation 跑一批病人，报告每分钟处理几位
+    python -m modules.origin_mock compare --patients 10 --delay 0.1
+        default / batch_fast 两种浏览器配置各跑一遍，对比每位病人的耗时(--headless: default 也无头)
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+try:
+    from flask import Flask, request, session, redirect, render_template_string, jsonify, Response
+    FLASK_AVAILABLE = True
+except ImportError:
+    FLASK_AVAILABLE = False
+
+DEFAULT_PORT = 8090
+DEPARTMENT = "HAEMODIALYSIS UNIT"
+
+# 每个页面可以单独设置响应延迟(秒)，模拟医院内网/服务器的速度
+DELAY_KEYS = ("login", "department", "main", "queue", "folder", "record", "form", "save")
+
+# tbl1: 病人固定信息(label在td，值在下一个td)
+TBL1_FIELDS = [
+    "HEIGHT", "WEIGHT", "DIALYZER", "VASCULAR ACCESS", "QD", "QB", "CONSTRUCTION",
+    "INSERTION", "EPO", "IV IRON", "HEPARIN", "ALLERGY", "NOTE",
+]
+
+# recordTbl: 每次透析一列(label在th)
+RECORD_FIELDS = [
+    "DATE", "NUMBER OF HD", "HRS OF HD", "PRE BP", "POST BP", "PRE PULSE", "TEMPERATURE",
+    "PRE WEIGHT", "IDWG", "POST WEIGHT", "UF", "KT/V", "WEIGHT LOSS",
+    "COMFORTABLE", "DIZZINESS", "BLEEDING", "DRESSING",
+]
+SELECT_FIELDS = {"COMFORTABLE": ["", "Yes", "No"], "DIZZINESS": ["", "Yes", "No"],
+                 "BLEEDING": ["", "Yes", "No"], "DRESSING": ["", "Yes", "No"]}
+HOURLY_SLOTS = 5     # HOURLY OBSERVATION 区块的行数
+HOURLY_INPUTS = 7    # 每格 TIME, BP, VP, QB, QD, TMP, UFR
+
+
+# ------------------------------------------------------------
+# 假数据
+# ------------------------------------------------------------
+
+class MockOriginState:
+    """假Origin的内存数据: 病人名单 + 每位病人的记录 + 保存历史"""
+
+    def __init__(self, patients=20, seed=7):
+        rng = random.Random(seed)
+        today = datetime.now().date()
+        self.lock = threading.Lock()
+        self.patients = []   # [{"mrn","name","visit_date"}]
+        self.records = {}    # mrn -> {"profile": {...}, "tables": [[column,...], ...]}
+        self.saves = []      # [(mrn, timestamp)]
+        for i in range(patients):
+            mrn = str(22001000 + i)
+            # 一半病人是今天透析(默认范围能直接看到)，另一半是前几天的(要放宽日期范围才找得到)
+            visit = today if i % 2 == 0 else today - timedelta(days=rng.randint(3, 40))
+            self.patients.append({"mrn": mrn, "name": f"MOCK PATIENT {i + 1:03d}", "visit_date": visit})
+            self.records[mrn] = self._initial_record(today)
+
+    @staticmethod
+    def _empty_column(date_str):
+        column = {field: "" for field in RECORD_FIELDS}
+        column["DATE"] = date_str
+        column["HOURLY"] = [[""] * HOURLY_INPUTS for _ in range(HOURLY_SLOTS)]
+        column["REMARKS"] = ""
+        return column
+
+    def _initial_record(self, today):
+        # 第一张表是几周前的三次透析，第二张是最近一次；都不是今天，所以每次都会走"Add新增一列"
+        first = [self._empty_column((today - timedelta(days=d)).strftime("%d-%m-%Y")) for d in (20, 17, 14)]
+        second = [self._empty_column((today - timedelta(days=3)).strftime("%d-%m-%Y"))]
+        return {"profile": {field: "" for field in TBL1_FIELDS}, "tables": [first, second]}
+
+    def find(self, mrn):
+        return next((p for p in self.patients if p["mrn"] == mrn), None)
+
+    def in_range(self, date_from, date_to):
+        return [p for p in self.patients if date_from <= p["visit_date"] <= date_to]
+
+
+def sample_job(patient):
+    """给基准测试用的一份填表数据(格式跟 collect_all_data() 一样)"""
+    today = datetime.now().strftime("%d-%m-%Y")
+    return {
+        "mrn": patient["mrn"],
+        "name": patient["name"],
+        "data": {
+            "basic_data": {
+                "DATE": today, "NUMBER_OF_HD": "609", "HRS_OF_HD": "4",
+                "PRE_BP": "150/80", "POST_BP": "130/70", "PRE_PULSE": "84",
+                "TEMPERATURE": "36.5", "PRE_WEIGHT": "71.2", "POST_WEIGHT": "68.6",
+                "UF": "2.5", "KT_V": "1.2", "COMFORTABLE": "Yes", "DIZZINESS": "No",
+                "DIALYZER": "PES 1.4LF", "HEPARIN": "1 MLS",
+            },
+            "hourly_observations": [
+                {"TIME": f"{7 + h:02d}:10", "BP": "140/80", "VP": "120", "QB": "300",
+                 "QD": "500", "PULSE": "P-80", "UFR": "625"}
+                for h in range(4)
+            ],
+        },
+    }
+
+
+# ------------------------------------------------------------
+# 页面模板
+# ------------------------------------------------------------
+
+LOGIN_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>KLSCH ORIGIN - Login</title></head>
+<body>
+<h2>KLSCH ORIGIN</h2>
+<form method="post" action="/EMR/login">
+  <input type="text" name="username" placeholder="USER ID">
+  <input type="password" name="password" placeholder="PASSWORD">
+  <button type="submit">LOGIN</button>
+</form>
+</body></html>
+"""
+
+DEPARTMENT_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>Origin</title></head>
+<body>
+<h2>WELCOME TO ORIGIN</h2>
+<form method="post" action="/EMR/department">
+  <select name="department" onchange="confirm('Switch to ' + this.value + '?')">
+    <option value="">-- SELECT --</option>
+    <option value="OUTPATIENT">OUTPATIENT</option>
+    <option value="{{ dept }}">{{ dept }}</option>
+  </select>
+  <button type="submit">LOGIN</button>
+</form>
+</body></html>
+"""
+
+MAIN_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>Origin - {{ dept }}</title>
+<style>
+  iframe { border: 1px solid #ccc; }
+  #tab-frame { width: 38%; height: 92vh; float: left; }
+  #main-frame { width: 60%; height: 92vh; float: right; }
+</style>
+<script>
+  function OpenMainFrame(url) { document.getElementById('main-frame').src = url; }
+</script>
+</head>
+<body>
+<div>{{ user }} | {{ dept }} | <a href="#">Change Password</a></div>
+<iframe id="tab-frame" name="tab-frame" src="/EMR/queue"></iframe>
+<iframe id="main-frame" name="main-frame" src="about:blank"></iframe>
+</body></html>
+"""
+
+QUEUE_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>Dialysis Queue</title>
+<script>
+  function doReload() {
+    var f = document.getElementById('dateFrom').value, t = document.getElementById('dateTo').value;
+    location.href = '/EMR/queue?from=' + encodeURIComponent(f) + '&to=' + encodeURIComponent(t);
+  }
+</script>
+</head>
+<body>
+<h3>Dialysis Queue</h3>
+From <input type="text" id="dateFrom" placeholder="yyyy-MM-dd" value="{{ date_from }}">
+To <input type="text" id="dateTo" placeholder="yyyy-MM-dd" value="{{ date_to }}">
+<button type="button" onclick="doReload()">Reload</button>
+<table class="queue">
+  <thead><tr><th>NAME</th><th>MRN</th><th>VISIT NUMBER</th><th>DATE</th></tr></thead>
+  <tbody>
+  {% for p in patients %}
+    <tr onclick="location.href='/EMR/folder/{{ p.mrn }}'">
+      <td><a href="/EMR/folder/{{ p.mrn }}">{{ p.name }}</a></td>
+      <td>{{ p.mrn }}</td>
+      <td>V{{ p.mrn }}01</td>
+      <td>{{ p.visit_date }}</td>
+    </tr>
+  {% endfor %}
+  </tbody>
+</table>
+</body></html>
+"""
+
+FOLDER_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>MEDICAL FOLDER</title>
+<style> .children { margin-left: 16px; } div[expand=false] > span.children { display: none; } </style>
+<script>
+  function toggleNode(a) {
+    var node = a.parentNode.parentNode;
+    node.setAttribute('expand', node.getAttribute('expand') === 'true' ? 'false' : 'true');
+    return false;
+  }
+</script>
+</head>
+<body>
+<div data-type="1" data-unitname="MEDICAL FOLDER" expand="true">
+  <div class="tree-anchor-wrap"><a class="treeLeaf" href="#" onclick="return toggleNode(this)">MEDICAL FOLDER</a></div>
+  <span class="children">
+  <div data-type="2" data-unitname="{{ mrn }}" expand="true">
+    <div class="tree-anchor-wrap"><a class="treeLeaf" href="#" onclick="return toggleNode(this)">{{ mrn }} {{ name }}</a></div>
+    <span class="children">
+    <div data-type="4" data-unitname="INVESTIGATIONS" expand="false">
+      <div class="tree-anchor-wrap"><a class="treeLeaf" href="#" onclick="return toggleNode(this)">INVESTIGATIONS</a></div>
+      <span class="children">
+        <div data-type="4" data-unitname="HAEMODIALYSIS UNIT TREATMENT RECORD " expand="false">
+          <div class="tree-anchor-wrap"><a class="treeLeaf" href="#" onclick="return toggleNode(this)">HAEMODIALYSIS UNIT TREATMENT RECORD</a></div>
+        </div>
+      </span>
+    </div>
+    <div data-type="4" data-unitname="NURSING NOTES" expand="false">
+      <div class="tree-anchor-wrap"><a class="treeLeaf" href="#" onclick="return toggleNode(this)">NURSING NOTES</a></div>
+      <span class="children">
+        <div data-type="4" data-unitname="HAEMODIALYSIS UNIT TREATMENT RECORD" expand="false">
+          <div class="tree-anchor-wrap"><a class="treeLeaf" href="#" onclick="return toggleNode(this)">HAEMODIALYSIS UNIT TREATMENT RECORD</a></div>
+          <span class="children">
+            <div data-type="19" data-unitname="Open Full View">
+              <a class="treeLeaf" href="javascript:void(0)" onclick="parent.OpenMainFrame('/EMR/record/{{ mrn }}')">Open Full View</a>
+            </div>
+            {% for label in entries %}
+            <div data-type="19" data-unitname="{{ label }}">
+              <a class="treeLeaf" href="javascript:void(0)" onclick="parent.OpenMainFrame('/EMR/record/{{ mrn }}')">{{ label }}</a>
+            </div>
+            {% endfor %}
+            <div data-type="19" data-unitname="... 2 more file(s)">
+              <a class="treeLeaf" href="javascript:void(0)">... 2 more file(s)</a>
+            </div>
+          </span>
+        </div>
+      </span>
+    </div>
+    </span>
+  </div>
+  </span>
+</div>
+</body></html>
+"""
+
+RECORD_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>Patient Facesheet</title>
+<script>
+  function DoDigitalEdit(img) {
+    document.getElementById('editFrame').src = '/EMR/form/{{ mrn }}?mode=edit';
+  }
+</script>
+</head>
+<body>
+<div class="toolbar">
+  <img src="/EMR/radial1/edit2.png" onmousedown="DoDigitalEdit(this)" alt="edit" width="24" height="24">
+  <span>{{ mrn }} {{ name }}</span>
+</div>
+<div id="editregion">
+  <iframe id="editFrame" src="/EMR/form/{{ mrn }}?mode=view" style="width:100%;height:85vh;border:0"></iframe>
+</div>
+</body></html>
+"""
+
+FORM_PAGE = """
+<!DOCTYPE html><html><head><meta charset="utf-8"><title>HAEMODIALYSIS UNIT TREATMENT RECORD</title>
+<style> td.copy { display: none; } table { border-collapse: collapse; margin-bottom: 12px; }
+        td, th { border: 1px solid #ccc; padding: 2px; } .hourly input { width: 48px; } </style>
+<script>
+  function AddColumnVertical(btn) {
+    var table = btn.closest('table');
+    var rows = table.querySelectorAll('tr');
+    for (var i = 0; i < rows.length; i++) {
+      var copy = rows[i].querySelector('td.copy');
+      if (!copy) continue;
+      var cell = copy.cloneNode(true);
+      cell.className = '';
+      cell.style.display = '';
+      rows[i].appendChild(cell);
+    }
+  }
+  function rowValues(td) {
+    var els = td.querySelectorAll('input, select, textarea');
+    var out = [];
+    for (var i = 0; i < els.length; i++) out.push(els[i].value);
+    return out;
+  }
+  function DoUpdate() {
+    var payload = {profile: {}, tables: []};
+    var t1 = document.querySelectorAll('table.tbl1 tr');
+    for (var i = 0; i < t1.length; i++) {
+      var tds = t1[i].querySelectorAll('td');
+      if (tds.length >= 2) payload.profile[tds[0].textContent.trim()] = rowValues(tds[1])[0] || '';
+    }
+    var tables = document.querySelectorAll('table.recordTbl');
+    for (var t = 0; t < tables.length; t++) {
+      var columns = [], hourlyIndex = -1, inHourly = false;
+      var rows = tables[t].querySelectorAll('tr');
+      for (var r = 0; r < rows.length; r++) {
+        var th = rows[r].querySelector('th');
+        if (!th) continue;
+        var label = th.textContent.trim();
+        var cells = rows[r].querySelectorAll('td:not(.copy)');
+        if (label === 'HOURLY OBSERVATION') { inHourly = true; hourlyIndex = 0; }
+        else if (label !== '') { inHourly = false; }
+        for (var c = 0; c < cells.length; c++) {
+          columns[c] = columns[c] || {HOURLY: []};
+          var values = rowValues(cells[c]);
+          if (inHourly) { columns[c].HOURLY[hourlyIndex] = values; }
+          else { columns[c][label] = values[0] || ''; }
+        }
+        if (inHourly) hourlyIndex++;
+      }
+      payload.tables.push(columns);
+    }
+    var xhr = new XMLHttpRequest();
+    xhr.open('POST', '/EMR/save/{{ mrn }}', false);
+    xhr.setRequestHeader('Content-Type', 'application/json');
+    xhr.send(JSON.stringify(payload));
+    alert(xhr.status === 200 ? 'Update Successfully.' : 'Update failed: ' + xhr.responseText);
+  }
+</script>
+</head>
+<body>
+<h3>HAEMODIALYSIS UNIT TREATMENT RECORD</h3>
+<p>Date/Time: {{ now }}</p>
+<table class="tbl1">
+  {% for field in tbl1_fields %}
+  <tr><td>{{ field }}</td><td><input type="text" value="{{ record.profile.get(field, '') }}" {{ dis }}></td></tr>
+  {% endfor %}
+</table>
+
+{% macro field_cell(field, column, extra_class='') %}
+  <td class="{{ extra_class }}">
+  {% if field in select_fields %}
+    <select {{ dis }}>{% for opt in select_fields[field] %}<option value="{{ opt }}" {% if column and column.get(field) == opt %}selected{% endif %}>{{ opt }}</option>{% endfor %}</select>
+  {% elif field == 'DATE' %}
+    <input type="text" class="datepicker" value="{{ column.get(field, '') if column else '' }}" {{ dis }}>
+  {% else %}
+    <input type="text" value="{{ column.get(field, '') if column else '' }}" {{ dis }}>
+  {% endif %}
+  </td>
+{% endmacro %}
+
+{% macro hourly_cell(values, extra_class='') %}
+  <td class="hourly {{ extra_class }}">{% for k in range(hourly_inputs) %}<input type="text" value="{{ values[k] if values else '' }}" {{ dis }}>{% endfor %}</td>
+{% endmacro %}
+
+{% for columns in record.tables %}
+<table class="recordTbl" table-number="{{ loop.index }}">
+  <tr><td colspan="{{ columns|length + 1 }}">{% if editable %}<button type="button" class="btn-addcolumn" onclick="AddColumnVertical(this)">Add</button>{% endif %}</td></tr>
+  {% for field in record_fields %}
+  <tr><th>{{ field }}</th>{% for column in columns %}{{ field_cell(field, column) }}{% endfor %}{{ field_cell(field, None, 'copy') }}</tr>
+  {% endfor %}
+  {% for slot in range(hourly_slots) %}
+  <tr><th>{% if slot == 0 %}HOURLY OBSERVATION{% endif %}</th>{% for column in columns %}{{ hourly_cell(column.HOURLY[slot]) }}{% endfor %}{{ hourly_cell(None, 'copy') }}</tr>
+  {% endfor %}
+  <tr><th>REMARKS</th>{% for column in columns %}<td><textarea {{ dis }}>{{ column.get('REMARKS', '') }}</textarea></td>{% endfor %}<td class="copy"><textarea {{ dis }}></textarea></td></tr>
+</table>
+{% endfor %}
+{% if editable %}<button type="button" onclick="DoUpdate()">UPDATE</button>{% endif %}
+</body></html>
+"""
+
+# 1x1 的PNG，当作铅笔图标
+_EDIT_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082"
+)
+
+
+# ------------------------------------------------------------
+# Flask app
+# ------------------------------------------------------------
+
+def create_mock_app(state=None, delay=0.0, delays=None):
+    """
+    建一个假Origin的Flask app。
+    delay: 所有页面统一的响应延迟(秒)；delays: {页面: 秒}，单独覆盖某些页面(见DELAY_KEYS)
+    """
+    if not FLASK_AVAILABLE:
+        raise RuntimeError("缺少flask，无法启动假Origin。请运行: pip install flask")
+
+    state = state or MockOriginState()
+    page_delays = {key: delay for key in DELAY_KEYS}
+    page_delays.update(delays or {})
+
+    app = Flask(__name__)
+    app.secret_key = "origin-mock"
+    app.config["MOCK_STATE"] = state
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    def wait(key):
+        seconds = page_delays.get(key, 0)
+        if seconds:
+            time.sleep(seconds)
+
+    def parse_day(text, default):
+        try:
+            return datetime.strptime(text, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return default
+
+    @app.route("/EMR/main.jsp")
+    def main_page():
+        wait("main")
+        if not session.get("user"):
+            return render_template_string(LOGIN_PAGE)
+        if session.get("dept") != DEPARTMENT:
+            return render_template_string(DEPARTMENT_PAGE, dept=DEPARTMENT)
+        return render_template_string(MAIN_PAGE, user=session["user"], dept=DEPARTMENT)
+
+    @app.route("/EMR/login", methods=["POST"])
+    def login():
+        wait("login")
+        if request.form.get("username") and request.form.get("password"):
+            session["user"] = request.form["username"]
+            session.pop("dept", None)
+        return redirect("/EMR/main.jsp")
+
+    @app.route("/EMR/department", methods=["POST"])
+    def department():
+        wait("department")
+        if not session.get("user"):
+            return redirect("/EMR/main.jsp")
+        if request.form.get("department") == DEPARTMENT:
+            session["dept"] = DEPARTMENT
+        return redirect("/EMR/main.jsp")
+
+    @app.route("/EMR/queue")
+    def queue_page():
+        wait("queue")
+        if not session.get("dept"):
+            return redirect("/EMR/main.jsp")
+        today = datetime.now().date()
+        date_from = parse_day(request.args.get("from"), today)
+        date_to = parse_day(request.args.get("to"), today)
+        return render_template_string(
+            QUEUE_PAGE, patients=state.in_range(date_from, date_to),
+            date_from=date_from.isoformat(), date_to=date_to.isoformat(),
+        )
+
+    @app.route("/EMR/folder/<mrn>")
+    def folder(mrn):
+        wait("folder")
+        patient = state.find(mrn)
+        if patient is None:
+            return "Patient not found", 404
+        tables = state.records[mrn]["tables"]
+        # 树里的日期条目最新的排最前面
+        labels = []
+        for columns in tables:
+            for column in columns:
+                try:
+                    d = datetime.strptime(column["DATE"], "%d-%m-%Y")
+                    labels.append(d)
+                except ValueError:
+                    continue
+        entries = [d.strftime("%d %b %Y_12:15") for d in sorted(labels, reverse=True)]
+        return render_template_string(FOLDER_PAGE, mrn=mrn, name=patient["name"], entries=entries)
+
+    @app.route("/EMR/record/<mrn>")
+    def record(mrn):
+        wait("record")
+        patient = state.find(mrn)
+        if patient is None:
+            return "Patient not found", 404
+        return render_template_string(RECORD_PAGE, mrn=mrn, name=patient["name"])
+
+    @app.route("/EMR/radial1/edit2.png")
+    def edit_icon():
+        return Response(_EDIT_PNG, mimetype="image/png")
+
+    @app.route("/EMR/form/<mrn>")
+    def form(mrn):
+        wait("form")
+        if mrn not in state.records:
+            return "Patient not found", 404
+        editable = request.args.get("mode") == "edit"
+        with state.lock:
+            record_data = json.loads(json.dumps(state.records[mrn]))
+        return render_template_string(
+            FORM_PAGE, mrn=mrn, record=record_data, editable=editable,
+            dis="" if editable else "disabled",
+            tbl1_fields=TBL1_FIELDS, record_fields=RECORD_FIELDS, select_fields=SELECT_FIELDS,
+            hourly_slots=HOURLY_SLOTS, hourly_inputs=HOURLY_INPUTS,
+            now=datetime.now().strftime("%d-%m-%Y %H:%M"),
+        )
+
+    @app.route("/EMR/save/<mrn>", methods=["POST"])
+    def save(mrn):
+        wait("save")
+        if not session.get("dept") or mrn not in state.records:
+            return "Session expired", 403
+        payload = request.get_json(silent=True) or {}
+        tables = []
+        for columns in payload.get("tables", []):
+            cleaned = []
+            for column in columns:
+                if not column:
+                    continue
+                hourly = column.get("HOURLY") or []
+                hourly = (hourly + [[""] * HOURLY_INPUTS] * HOURLY_SLOTS)[:HOURLY_SLOTS]
+                column["HOURLY"] = [list(v or [""] * HOURLY_INPUTS) for v in hourly]
+                cleaned.append(column)
+            tables.append(cleaned)
+        with state.lock:
+            state.records[mrn] = {"profile": payload.get("profile", {}), "tables": tables}
+            state.saves.append((mrn, datetime.now().isoformat(timespec="seconds")))
+        return jsonify({"ok": True})
+
+    @app.route("/EMR/_state/<mrn>")
+    def dump_state(mrn):
+        """调试用: 看某位病人当前保存的数据"""
+        return jsonify(state.records.get(mrn, {}))
+
+    return app
+
+
+class MockOriginServer:
+    """在后台线程里跑假Origin，可以干净地停掉(基准测试用)"""
+
+    def __init__(self, port=DEFAULT_PORT, state=None, delay=0.0, delays=None):
+        from werkzeug.serving import make_server
+        self.state = state or MockOriginState()
+        self.app = create_mock_app(self.state, delay=delay, delays=delays)
+        self.port = port
+        self._server = make_server("127.0.0.1", port, self.app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/EMR/main.jsp"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+
+def run_benchmark(patients=10, port=DEFAULT_PORT, delay=0.0, headless=False, profile="default"):
+    """
+    起一个假Origin，用 run_batch_automation 跑 patients 位病人，
+    返回并打印: 成功数、假Origin实际收到的保存次数、总耗时、每分钟处理几位病人。
+    "病人阶段"的耗时从第一位病人开始算，不含启动Chrome+登录和最后关浏览器前的等待；
+    每分钟几位只按真正保存成功的病人算(Chrome没起来/登录失败时是0，不会算出一个假的高速度)。
+    """
+    from modules.origin_automation import OriginAutomation
+
+    state = MockOriginState(patients=patients)
+    server = MockOriginServer(port=port, state=state, delay=delay).start()
+    marks = {}
+    failures = []
+
+    def callback(msg):
+        if msg.startswith("❌"):
+            failures.append(msg)
+        if "[1/" in msg and "first_patient" not in marks:
+            marks["first_patient"] = time.perf_counter()
+        if "批量处理完成" in msg:
+            marks["patients_done"] = time.perf_counter()
+
+    try:
+        automation = OriginAutomation(server.url, headless=headless, profile=profile)
+        automation.origin_urls = [server.url]  # 只连假Origin，不去试医院内网地址
+        jobs = [sample_job(p) for p in state.patients]
+        t0 = time.perf_counter()
+        results = automation.run_batch_automation("mock", "mock", jobs, callback=callback)
+        total_s = time.perf_counter() - t0
+    finally:
+        server.stop()
+
+    succeeded = sum(1 for r in results if r.get("success"))
+    patient_s = marks.get("patients_done", t0 + total_s) - marks.get("first_patient", t0)
+    if not succeeded:
+        reasons = failures or sorted({str(r.get("reason") or "") for r in results} - {""})
+        print(f"⚠️  没有一位病人处理成功，计时无效: {'; '.join(reasons) or '看上面的日志'}")
+    report = {
+        "patients": patients,
+        "succeeded": succeeded,
+        "saves_received": len(state.saves),
+        "total_s": round(total_s, 1),
+        "patient_phase_s": round(patient_s, 1),
+        "seconds_per_patient": round(patient_s / succeeded, 2) if succeeded else 0,
+        "patients_per_min": round(succeeded / patient_s * 60, 2) if succeeded and patient_s > 0 else 0,
+        "delay_s": delay,
+        "headless": headless,
+        "profile": profile,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def compare_profiles(patients=10, port=DEFAULT_PORT, delay=0.0, headless=False):
+    """
+    同一批病人、同样的延迟，分别用 default 和 batch_fast 两种浏览器配置各跑一遍。
+    batch_fast 本身就是无头的；headless=True 时 default 也无头跑(没有显示器的机器上只能这样)，
+    这样比出来的只是 batch_fast 拦资源/小窗口那部分的差别
+    """
+    reports = [
+        run_benchmark(patients, port, delay, headless=headless, profile="default"),
+        run_benchmark(patients, port, delay, headless=True, profile="batch_fast"),
+    ]
+    base, fast = reports
+    print(f"\n{'profile':<12}{'s/patient':>11}{'patients/min':>14}{'total(s)':>10}")
+    for r in reports:
+        print(f"{r['profile']:<12}{r['seconds_per_patient']:>11}{r['patients_per_min']:>14}{r['total_s']:>10}")
+    if base["seconds_per_patient"] and fast["seconds_per_patient"]:
+        saved = 1 - fast["seconds_per_patient"] / base["seconds_per_patient"]
+        print(f"batch_fast 每位病人的耗时 {-saved:+.0%} (负数是更快)")
+    return reports
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地假Origin Local Origin stand-in")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_p = sub.add_parser("serve", help="启动假Origin")
+    serve_p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_p.add_argument("--patients", type=int, default=20)
+    serve_p.add_argument("--delay", type=float, default=0.0, help="每个页面的响应延迟(秒)")
+    serve_p.add_argument("--delays", default=None, help='单独设置某些页面，JSON，如 {"save": 1.5}')
+
+    bench_p = sub.add_parser("bench", help="用run_batch_automation跑一批病人并计时")
+    bench_p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    bench_p.add_argument("--patients", type=int, default=10)
+    bench_p.add_argument("--delay", type=float, default=0.0)
+    bench_p.add_argument("--headless", action="store_true")
+    bench_p.add_argument("--profile", choices=["default", "batch_fast"], default="default")
+
+    compare_p = sub.add_parser("compare", help="default 和 batch_fast 两种浏览器配置各跑一遍对比")
+    compare_p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    compare_p.add_argument("--patients", type=int, default=10)
+    compare_p.add_argument("--delay", type=float, default=0.0)
+    compare_p.add_argument("--headless", action="store_true", help="default 也用无头模式跑")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        delays = json.loads(args.delays) if args.delays else None
+        app = create_mock_app(MockOriginState(patients=args.patients), delay=args.delay, delays=delays)
+        print(f"假Origin: http://127.0.0.1:{args.port}/EMR/main.jsp")
+        app.run(host="127.0.0.1", port=args.port, debug=False, use_reloader=False, threaded=True)
+    elif args.command == "bench":
+        logging.basicConfig(level=logging.WARNING)
+        run_benchmark(args.patients, args.port, args.delay, args.headless, args.profile)
+    elif args.command == "compare":
+        logging.basicConfig(level=logging.WARNING)
+        compare_profiles(args.patients, args.port, args.delay, args.headless)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""
+origin_session.py
+常驻的Origin登录会话服务——一整个班次只登录一次。
+
+原来 main.py 的"自动填入"、app.py(Streamlit网页版)的Step 3、批量填入，
+每次都各自新建一个 OriginAutomation、登录、选部门、做完再关浏览器，
+登录+选部门这段时间每次都要重新付一遍。
+
+这个服务自己持有【一个】已经登录好的浏览器:
+- 所有填表请求都丢进同一个队列，由唯一的工作线程按顺序处理
+  (Selenium的driver不是线程安全的，只能有一个线程在操作它)
+- 队列空闲时，每隔一段时间用 return_to_queue() 探一下session，
+  顺便把页面停在病人队列页；探测发现被踢回登录页就自动重新登录，
+  session不会因为长时间没操作而过期
+- 同一台电脑上的其他程序(Streamlit网页版、命令行)可以通过本机socket
+  (只监听127.0.0.1，带authkey校验)把填表请求交给这个服务。
+  authkey 是第一次运行时随机生成、存在 data/origin_session.key 里的(只有当前用户能读)，
+  代码里写死的默认key、以前 config.example.json 里的占位符 "change-me" 一律不用来开端口——
+  谁都知道的key等于没有key，本机任何程序都能冒充护理师提交填表。
+  请求/结果用JSON传，不用pickle，连上来的一方没法让这边执行任意代码
+
+用法(在main.py里):
+    service = OriginSessionService(origin_url)
+    service.start(username, password)          # 登录一次
+    future = service.submit(mrn, data, name)   # 之后每位病人只走步骤3-8
+    result = future.result()                   # {"success": bool, "reason": str}
+
+命令行:
+    python -m modules.origin_session serve                 # 单独起一个常驻会话
+    python -m modules.origin_session fill --mrn 22001725 --json data/exports/xxx.json
+"""
+
+import os
+import json
+import queue
+import logging
+import secrets
+import socket
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+
+logger = logging.getLogger(__name__)
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 6001
+DEFAULT_AUTHKEY = b"dialysis-origin-session"
+# 公开的key(代码里的默认值、config.example.json 里的占位符)，不能用来开端口
+WEAK_AUTHKEYS = {b"", DEFAULT_AUTHKEY, b"change-me"}
+AUTHKEY_PATH = os.path.join("data", "origin_session.key")
+KEEPALIVE_INTERVAL = 240  # 秒，空闲时多久探测一次session
+
+
+def load_or_create_authkey(path=AUTHKEY_PATH):
+    """这台电脑专用的随机authkey: 第一次调用时生成，存成只有当前用户能读写的文件"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            key = f.read().strip()
+        if key:
+            return key.encode()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    key = secrets.token_hex(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return load_or_create_authkey(path)  # 另一个进程刚好同时生成了，用它的
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(key)
+    logger.info(f"🔑 已生成常驻会话的本机authkey: {path}")
+    return key.encode()
+
+
+def _resolve_authkey(configured):
+    """config.json 里配了自己的key就用它；没配或者是公开的占位key，就用本机随机生成的那个"""
+    key = configured.encode() if isinstance(configured, str) else (configured or b"")
+    if key in WEAK_AUTHKEYS:
+        if key:
+            logger.warning("⚠️  config.json 里的 origin_session_service.authkey 是公开的占位值，改用本机随机key")
+        return load_or_create_authkey()
+    return key
+
+
+def load_service_settings(config_path="config.json"):
+    """从config.json读 "origin_session_service" 设置，没有就用默认值(authkey 没配时是本机随机key)"""
+    settings = {
+        "port": SERVICE_PORT,
+        "authkey": "",
+        "keepalive_interval": KEEPALIVE_INTERVAL,
+    }
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        settings.update(cfg.get("origin_session_service", {}) or {})
+    except Exception:
+        pass
+    settings["authkey"] = _resolve_authkey(settings.get("authkey"))
+    return settings
+
+
+def _send_json(conn, payload):
+    conn.send_bytes(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _recv_json(conn, max_bytes=16 * 1024 * 1024):
+    return json.loads(conn.recv_bytes(max_bytes).decode("utf-8"))
+
+
+class OriginSessionService:
+    """持有一个已登录浏览器的常驻服务"""
+
+    def __init__(self, origin_url=None, keepalive_interval=None, callback=None,
+                 port=None, authkey=None):
+        settings = load_service_settings()
+        self.origin_url = origin_url
+        self.keepalive_interval = keepalive_interval or settings["keepalive_interval"]
+        self.port = port or settings["port"]
+        key = authkey or settings["authkey"]
+        self.authkey = key.encode() if isinstance(key, str) else key
+        self.callback = callback
+
+        self.origin = None
+        self._username = None
+        self._password = None
+        self._jobs = queue.Queue()
+        self._worker = None
+        self._listener = None
+        self._stop = threading.Event()
+        self._at_queue = False  # 浏览器当前是否停在病人队列页(刚登录完/刚探测完)
+        self.processed_count = 0
+
+    def _log(self, msg):
+        if self.callback:
+            try:
+                self.callback(msg)
+            except Exception:
+                pass
+        logger.info(msg)
+
+    # ------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------
+
+    @property
+    def running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def start(self, username, password, listen=True):
+        """
+        登录一次，然后在后台线程里常驻等待填表请求。
+        登录在工作线程里做，这个方法本身不阻塞；返回一个Future，
+        登录完成后结果是True/False。
+        listen=True 时同时开本机socket，让Streamlit/命令行也能提交请求。
+        """
+        from modules.origin_automation import OriginAutomation
+
+        if self.running:
+            done = Future()
+            done.set_result(True)
+            return done
+
+        self._username, self._password = username, password
+        self.origin = OriginAutomation(self.origin_url)
+        self._stop.clear()
+        login_future = Future()
+        self._worker = threading.Thread(target=self._run, args=(login_future,), daemon=True)
+        self._worker.start()
+        if listen:
+            self._start_listener()
+        return login_future
+
+    def stop(self):
+        """停止服务并关掉浏览器(主程序退出/下班时调用)"""
+        self._stop.set()
+        self._jobs.put(None)  # 唤醒正在等待的工作线程
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            # close() 打断不了正在阻塞的 accept()，先连一下把它叫醒，它看到服务停了就退出
+            try:
+                socket.create_connection((SERVICE_HOST, self.port), timeout=1).close()
+            except OSError:
+                pass
+            try:
+                listener.close()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------
+    # 提交任务
+    # ------------------------------------------------------------
+
+    def submit(self, mrn, data, name=None, on_state=None, overwrite_conflicts=False):
+        """
+        提交一位病人的填表任务，返回Future，结果是 {"success": bool, "reason": str}。
+        overwrite_conflicts: Origin里已有不同的值时直接覆盖(不给的话留着不动，结果是needs_review)
+        """
+        future = Future()
+        if not self.running:
+            future.set_result({"success": False, "reason": "常驻会话没有在运行 Session service not running"})
+            return future
+        self._jobs.put({
+            "mrn": str(mrn).strip(), "name": name or mrn, "data": data,
+            "on_state": on_state, "overwrite_conflicts": overwrite_conflicts, "future": future,
+        })
+        return future
+
+    def run_batch(self, jobs, journal=None):
+        """
+        批量填入走常驻会话: 逐个提交并等待结果，返回格式跟
+        OriginAutomation.run_batch_automation() 一样。不用再登录一次。
+        """
+        from modules.batch_journal import job_key
+
+        results = []
+        for job in jobs:
+            mrn = str(job.get("mrn", "")).strip()
+            name = job.get("name") or mrn
+            if not mrn:
+                results.append({"mrn": mrn, "name": name, "success": False, "reason": "缺少MRN"})
+                continue
+            on_state = None
+            if journal is not None:
+                key = job_key(job)
+                if journal.is_saved(key):
+                    self._log(f"⏭️  [{name}] 落盘日志显示上次已经保存成功，跳过(不重复写入)")
+                    results.append({
+                        "mrn": mrn, "name": name, "success": True,
+                        "reason": "上次运行已保存 Already saved in a previous run"
+                    })
+                    continue
+                on_state = lambda state, reason="", k=key: journal.record(k, state, reason)
+            result = self.submit(
+                mrn, job.get("data", {}), name, on_state=on_state,
+                overwrite_conflicts=bool(job.get("overwrite_conflicts")),
+            ).result()
+            results.append({"mrn": mrn, "name": name, **result})
+        return results
+
+    def status(self):
+        return {
+            "running": self.running,
+            "username": self._username,
+            "pending": self._jobs.qsize(),
+            "processed": self.processed_count,
+        }
+
+    # ------------------------------------------------------------
+    # 工作线程
+    # ------------------------------------------------------------
+
+    def _login(self):
+        ok = self.origin.ensure_logged_in(self._username, self._password, self.callback)
+        self._at_queue = ok
+        return ok
+
+    def _probe(self):
+        """空闲探测: 跟批量模式里换下一位病人时一样，用return_to_queue()回到队列页"""
+        if self.origin.is_driver_alive() and self.origin.return_to_queue(self.callback):
+            self._at_queue = True
+            return True
+        self._log("🔁 常驻会话探测失败，重新登录 Session probe failed, logging in again...")
+        return self._login()
+
+    def _run(self, login_future):
+        try:
+            ok = self._login()
+        except Exception as e:
+            self._log(f"❌ 常驻会话登录出错: {e}")
+            ok = False
+        login_future.set_result(ok)
+        if not ok:
+            self._log("❌ 常驻会话登录失败，服务未启动 Session service login failed")
+            self.origin.close()
+            return
+        self._log("✅ 常驻Origin会话已就绪，本班次不用再重复登录 Shift session ready")
+
+        while not self._stop.is_set():
+            try:
+                job = self._jobs.get(timeout=self.keepalive_interval)
+            except queue.Empty:
+                try:
+                    self._probe()
+                except Exception as e:
+                    self._log(f"⚠️  常驻会话探测出错: {e}")
+                continue
+            if job is None:
+                break
+            self._process(job)
+
+        self.origin.close()
+        # 服务停止后还没处理的任务，统一回复失败，不让调用方一直等
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job["future"].set_result({"success": False, "reason": "常驻会话已停止 Session service stopped"})
+        self._log("🛑 常驻Origin会话已关闭 Shift session closed")
+
+    def _process(self, job):
+        try:
+            if not self._at_queue and not self._probe():
+                reason = "重新登录失败 Re-login failed"
+                if job.get("on_state"):
+                    job["on_state"]("failed", reason)
+                job["future"].set_result({"success": False, "reason": reason})
+                return
+            self._at_queue = False  # 开始处理病人，页面会离开队列页
+            self._log(f"👤 常驻会话处理病人 Processing: {job['name']} (MRN: {job['mrn']})")
+            self.origin.overwrite_conflicts = bool(job.get("overwrite_conflicts"))
+            result = self.origin.process_single_patient_in_session(
+                job["mrn"], job["data"], self.callback, on_state=job.get("on_state")
+            )
+            self.processed_count += 1
+            job["future"].set_result(result)
+        except Exception as e:
+            job["future"].set_result({"success": False, "reason": str(e)})
+
+    # ------------------------------------------------------------
+    # 本机socket，给Streamlit/命令行这些别的进程用
+    # ------------------------------------------------------------
+
+    def _start_listener(self):
+        if self.authkey in WEAK_AUTHKEYS:
+            self._log("⚠️  常驻会话的authkey是公开的默认值，不开本机端口(只能在本程序内使用)")
+            return
+        try:
+            self._listener = Listener((SERVICE_HOST, self.port), authkey=self.authkey)
+        except Exception as e:
+            self._log(f"⚠️  常驻会话的本机端口 {self.port} 打不开(其他程序可能占用了)，只能在本程序内使用: {e}")
+            return
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self._log(f"🔌 常驻会话在 {SERVICE_HOST}:{self.port} 等待其他程序提交任务")
+
+    def _accept_loop(self):
+        listener = self._listener
+        while not self._stop.is_set() and self._listener is listener:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError, EOFError) as e:
+                # authkey不对的客户端、握手时断开的连接只影响这一个连接；
+                # 只有服务停了(listener被关掉)才退出循环
+                if self._stop.is_set() or self._listener is not listener:
+                    break
+                logger.warning(f"⚠️  常驻会话拒绝了一个本机连接: {e!r}")
+                continue
+            threading.Thread(target=self._handle_conn, args=(conn,), daemon=True).start()
+
+    def _handle_conn(self, conn):
+        try:
+            with conn:
+                request = _recv_json(conn)
+                op = request.get("op") if isinstance(request, dict) else None
+                if op == "status":
+                    _send_json(conn, self.status())
+                elif op == "fill":
+                    future = self.submit(request.get("mrn"), request.get("data") or {}, request.get("name"))
+                    _send_json(conn, future.result())
+                else:
+                    _send_json(conn, {"success": False, "reason": f"未知操作: {op}"})
+        except Exception as e:
+            logger.warning(f"处理常驻会话请求出错: {e}")
+
+
+class SessionServiceClient:
+    """其他进程(Streamlit/命令行)连本机常驻会话用的客户端"""
+
+    def __init__(self, port=None, authkey=None):
+        settings = load_service_settings()
+        self.port = port or settings["port"]
+        key = authkey or settings["authkey"]
+        self.authkey = key.encode() if isinstance(key, str) else key
+
+    def _request(self, payload):
+        with Client((SERVICE_HOST, self.port), authkey=self.authkey) as conn:
+            _send_json(conn, payload)
+            return _recv_json(conn)
+
+    def status(self):
+        """服务不在的话返回None"""
+        try:
+            return self._request({"op": "status"})
+        except Exception:
+            return None
+
+    def is_available(self):
+        status = self.status()
+        return bool(status and status.get("running"))
+
+    def fill(self, mrn, data, name=None):
+        """提交一位病人并等待结果 {"success": bool, "reason": str}"""
+        return self._request({"op": "fill", "mrn": mrn, "data": data, "name": name})
+
+
+def main():
+    import argparse
+    import getpass
+
+    parser = argparse.ArgumentParser(description="常驻Origin登录会话 Persistent Origin session service")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_p = sub.add_parser("serve", help="登录一次并常驻，等待填表请求")
+    serve_p.add_argument("--username", default=None)
+    serve_p.add_argument("--origin-url", default=None)
+
+    fill_p = sub.add_parser("fill", help="把一位病人的数据交给常驻会话去填")
+    fill_p.add_argument("--mrn", required=True)
+    fill_p.add_argument("--json", required=True, help="Export JSON导出的数据文件")
+    fill_p.add_argument("--name", default=None)
+
+    sub.add_parser("status", help="查看常驻会话状态")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        username = args.username or input("Username 用户名: ")
+        password = getpass.getpass("Password 密码: ")
+        origin_url = args.origin_url
+        if origin_url is None:
+            try:
+                with open("config.json", "r", encoding="utf-8") as f:
+                    origin_url = json.load(f).get("origin_url")
+            except Exception:
+                origin_url = None
+        service = OriginSessionService(origin_url, callback=lambda m: print(f"  {m}"))
+        if not service.start(username, password).result():
+            raise SystemExit(1)
+        print("常驻会话运行中，按 Ctrl+C 退出 Session running, Ctrl+C to stop")
+        try:
+            while service.running:
+                service._worker.join(timeout=1)
+        except KeyboardInterrupt:
+            service.stop()
+            service._worker.join(timeout=10)
+
+    elif args.command == "fill":
+        with open(args.json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        result = SessionServiceClient().fill(args.mrn, data, args.name)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    elif args.command == "status":
+        print(json.dumps(SessionServiceClient().status(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
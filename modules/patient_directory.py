@@ -5,34 +5,96 @@ patient_directory.py
 
 存成本地的 patients.json，跟 config.json 一样属于包含病人信息的敏感文件，
 不应该提交到git仓库(已经在.gitignore里加了)。
+
+load_patients() 返回的是 PatientList(用起来就是list)，上面挂着 patient_index 的搜索索引；
+search_patients 走索引，add_or_update_patient / remove_patient 顺手逐条更新索引。
+传普通list进来也照样能用(逐条扫描，跟原来一样)。
+
+存储可以换成 SQLite(patient_store，config.json 里 patient_directory.backend = "sqlite"，
+main.py 启动时调用 configure_backend)。函数还是这几个，只是:
+    add_or_update_patient / remove_patient  同时写一行到数据库(单行upsert/delete)
+    add_or_update_patients                  批量导入，一个事务
+    save_patients                           名单都是逐条写进去的话什么都不用做；普通list就整份替换
+第一次用 sqlite 时自动把 patients.json 迁移进去。
 """
 
 import json
 import os
 import logging
 
+from modules.patient_index import PatientIndex, PatientList, name_key
+
 logger = logging.getLogger(__name__)
 
 PATIENTS_FILE = "patients.json"
+PATIENTS_DB = "patients.db"
+
+BACKENDS = ("json", "sqlite")
+_backend = "json"
+_store = None
+
+
+def configure_backend(backend="json"):
+    """选择存储方式: "json"(默认，patients.json) 或 "sqlite"(patients.db)"""
+    global _backend, _store
+    if backend not in BACKENDS:
+        logger.warning(f"未知的病人名录存储方式 {backend!r}，改用json")
+        backend = "json"
+    if backend != _backend and _store is not None:
+        _store.close()
+        _store = None
+    _backend = backend
+
+
+def _get_store():
+    """sqlite模式下的数据库(第一次用到时打开，顺便从patients.json迁移)；json模式返回None"""
+    global _store
+    if _backend != "sqlite":
+        return None
+    if _store is None:
+        from modules.patient_store import PatientStore
+
+        _store = PatientStore(PATIENTS_DB)
+        _store.migrate_from_json(PATIENTS_FILE)
+    return _store
 
 
 def load_patients():
     """读取病人名录，文件不存在就返回空列表"""
+    store = _get_store()
+    if store is not None:
+        try:
+            patients = PatientList(store.load())
+            patients.write_through = True
+            return patients
+        except Exception as e:
+            logger.warning(f"读取{PATIENTS_DB}失败: {e}")
+            return PatientList()
     if not os.path.exists(PATIENTS_FILE):
-        return []
+        return PatientList()
     try:
         with open(PATIENTS_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
         if isinstance(data, list):
-            return data
-        return []
+            return PatientList(data)
+        return PatientList()
     except Exception as e:
         logger.warning(f"读取{PATIENTS_FILE}失败: {e}")
-        return []
+        return PatientList()
 
 
 def save_patients(patients):
     """保存病人名录，按姓名排序后存盘，方便管理时浏览"""
+    store = _get_store()
+    if store is not None:
+        if getattr(patients, "write_through", False):
+            return True  # 每次增删都已经单行写进数据库了
+        try:
+            store.replace_all(patients)
+            return True
+        except Exception as e:
+            logger.error(f"保存{PATIENTS_DB}失败: {e}")
+            return False
     try:
         patients_sorted = sorted(patients, key=lambda p: p.get("name", "").upper())
         with open(PATIENTS_FILE, "w", encoding="utf-8") as f:
@@ -43,21 +105,76 @@ def save_patients(patients):
         return False
 
 
-def search_patients(patients, query):
-    """按姓名或MRN模糊搜索(大小写不敏感)，query为空就返回全部"""
+def _search_index(patients):
+    index = getattr(patients, "search_index", None)
+    return index if isinstance(index, PatientIndex) else None
+
+
+def search_patients(patients, query, limit=None, fuzzy=False):
+    """
+    按姓名或MRN搜索(大小写不敏感)，query为空就返回全部(最多limit条)；有索引时按相关程度排序。
+    fuzzy=True: 精确匹配不够时，再补上打错字/不同拼法也能对上的病人(需要索引)
+    """
     q = (query or "").strip().lower()
     if not q:
-        return patients
-    return [
+        return patients if limit is None else patients[:limit]
+    index = _search_index(patients)
+    if index is not None:
+        return index.search(q, limit=limit, fuzzy=fuzzy) or []
+    if patients is None and _get_store() is not None:
+        return _get_store().search(q, limit=limit)  # 没加载名单: 直接用数据库的全文索引搜
+    matches = [
         p for p in patients
         if q in str(p.get("name", "")).lower() or q in str(p.get("mrn", "")).lower()
     ]
+    return matches if limit is None else matches[:limit]
+
+
+def _write_through(patients, write):
+    """sqlite模式: 把这一次增删写进数据库。写失败的话名单标记为要整份保存"""
+    store = _get_store()
+    if store is None:
+        return
+    try:
+        write(store)
+    except Exception as e:
+        logger.error(f"写入{PATIENTS_DB}失败，下次保存时整份重写: {e}")
+        if getattr(patients, "write_through", False):
+            patients.write_through = False
 
 
 def add_or_update_patient(patients, name, mrn):
     """新增病人，如果姓名已存在(大小写不敏感)就改成更新MRN，避免同一个人存两条"""
     name = name.strip()
     mrn = mrn.strip()
+    _write_through(patients, lambda store: store.upsert(name, mrn))
+    return _apply_upsert(patients, name, mrn)
+
+
+def add_or_update_patients(patients, entries):
+    """批量新增/更新(批量导入用): 名单逐条更新，数据库一个事务写完"""
+    entries = [
+        {"name": str(e.get("name", "")).strip(), "mrn": str(e.get("mrn", "")).strip()}
+        for e in entries if str(e.get("name", "")).strip()
+    ]
+    _write_through(patients, lambda store: store.upsert_many(entries))
+    for e in entries:
+        patients = _apply_upsert(patients, e["name"], e["mrn"])
+    return patients
+
+
+def _apply_upsert(patients, name, mrn):
+    index = _search_index(patients)
+    if index is not None:
+        existing = index.get(name)
+        if existing is not None:
+            existing["mrn"] = mrn
+            index.update(existing)
+            return patients
+        patient = {"name": name, "mrn": mrn}
+        patients.append(patient)
+        index.add(patient)
+        return patients
     for p in patients:
         if p.get("name", "").strip().lower() == name.lower():
             p["mrn"] = mrn
@@ -68,7 +185,14 @@ def add_or_update_patient(patients, name, mrn):
 
 def remove_patient(patients, name):
     """按姓名删除(大小写不敏感)"""
-    return [p for p in patients if p.get("name", "").strip().lower() != name.strip().lower()]
+    _write_through(patients, lambda store: store.delete(name))
+    index = _search_index(patients)
+    if index is not None:
+        patient = index.remove(name)
+        if patient is not None:
+            patients[:] = [p for p in patients if p is not patient]
+        return patients
+    return [p for p in patients if name_key(p.get("name", "")) != name_key(name)]
 
 
 def parse_bulk_text(text):
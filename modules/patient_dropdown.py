@@ -0,0 +1,185 @@
+"""
+patient_dropdown.py
+Step 3 "搜索病人" 输入框下面的候选下拉框。
+
+原来每按一个键，都在界面线程里同步搜一遍名录，再把旧的 Toplevel 整个 destroy、
+新建一个 Toplevel + Listbox、重新算位置；名录大了以后打字一卡一卡的，下拉框还会闪。
+
+现在:
+    dropdown = PatientDropdown(root, entry, search=lambda q: ..., on_pick=lambda patient: ...)
+    - Toplevel/Listbox 只建一次，平时 withdraw 藏起来；有结果时只替换 Listbox 里的行，
+      位置只有在输入框挪过之后才重新设
+    - 防抖: 停止打字 DEBOUNCE_MS 毫秒后才搜，连续打字只搜最后一次
+    - 搜索在一个后台线程里跑(search 回调，比如 search_patients(..., fuzzy=True))，
+      结果经 root.after 交回界面线程
+    - 每次搜索带一个序号，结果回来时输入框已经又变了(序号不是最新的)就直接丢掉，
+      慢的旧结果不会盖掉新结果
+    - 键盘: ↓/↑ 在候选里移动，回车选中，Esc 收起
+"""
+
+import logging
+import threading
+import tkinter as tk
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_MS = 120
+MAX_ROWS = 8
+
+
+class PatientDropdown:
+    def __init__(self, root, entry, search, on_pick, debounce_ms=DEBOUNCE_MS, max_rows=MAX_ROWS, width=35):
+        """
+        search:  search(query) -> [{"name","mrn"}]，在后台线程里调用
+        on_pick: on_pick(patient) 选中一个病人时调用(界面线程)
+        """
+        self.root = root
+        self.entry = entry
+        self.search = search
+        self.on_pick = on_pick
+        self.debounce_ms = debounce_ms
+        self.max_rows = max_rows
+
+        self._matches = []
+        self._position = None
+        self._after_id = None
+        self._seq = 0              # 最新一次输入的序号(界面线程里改)
+        self._request = None       # 等后台线程处理的 (序号, 查询)，只留最新的一个
+        self._wake = threading.Condition()
+        self._closed = False
+
+        self._popup = tk.Toplevel(root)
+        self._popup.wm_overrideredirect(True)
+        self._popup.withdraw()
+        self._listbox = tk.Listbox(self._popup, width=width, height=1, exportselection=False)
+        self._listbox.pack()
+        self._listbox.bind("<ButtonRelease-1>", lambda e: self._pick_selected())
+
+        entry.bind("<KeyRelease>", self._on_key, add="+")
+        entry.bind("<Down>", lambda e: self._move(1))
+        entry.bind("<Up>", lambda e: self._move(-1))
+        entry.bind("<Return>", lambda e: self._pick_selected() if self.visible else None, add="+")
+        entry.bind("<Escape>", lambda e: self.hide(), add="+")
+        entry.bind("<FocusOut>", lambda e: root.after(150, self._hide_unless_focused), add="+")
+
+        self._worker = threading.Thread(target=self._run, name="patient-search", daemon=True)
+        self._worker.start()
+
+    @property
+    def visible(self):
+        return self._popup.winfo_viewable()
+
+    # ------------------------------------------------------------
+    # 输入 -> 防抖 -> 后台搜索
+    # ------------------------------------------------------------
+
+    def _on_key(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        self._seq += 1  # 输入变了，之前还没回来的结果都作废
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = self.root.after(self.debounce_ms, self._submit)
+
+    def _submit(self):
+        self._after_id = None
+        query = self.entry.get()
+        if not query.strip():
+            self.hide()
+            return
+        with self._wake:
+            self._request = (self._seq, query)
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while self._request is None and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                seq, query = self._request
+                self._request = None
+            try:
+                matches = self.search(query)
+            except Exception as e:
+                logger.warning(f"⚠️  病人搜索出错({query!r}): {e}")
+                matches = []
+            try:
+                self.root.after(0, self._deliver, seq, matches)
+            except (RuntimeError, tk.TclError):
+                return  # 主窗口已经关了
+
+    def _deliver(self, seq, matches):
+        if seq != self._seq or self._closed:
+            return  # 过时的结果
+        if not matches or not self.entry.get().strip():
+            self.hide()
+            return
+        self._show(matches)
+
+    # ------------------------------------------------------------
+    # 显示/选择
+    # ------------------------------------------------------------
+
+    def _show(self, matches):
+        self._matches = list(matches)
+        listbox = self._listbox
+        listbox.delete(0, tk.END)
+        listbox.insert(tk.END, *(f"{p.get('name', '')}  ({p.get('mrn', '')})" for p in self._matches))
+        listbox.configure(height=min(len(self._matches), self.max_rows))
+        listbox.selection_clear(0, tk.END)
+        position = (self.entry.winfo_rootx(), self.entry.winfo_rooty() + self.entry.winfo_height())
+        if position != self._position:
+            self._popup.wm_geometry(f"+{position[0]}+{position[1]}")
+            self._position = position
+        if not self.visible:
+            self._popup.deiconify()
+        self._popup.lift()
+
+    def _move(self, step):
+        if not self.visible or not self._matches:
+            return "break"
+        sel = self._listbox.curselection()
+        i = (sel[0] + step) if sel else (0 if step > 0 else len(self._matches) - 1)
+        i = max(0, min(i, len(self._matches) - 1))
+        self._listbox.selection_clear(0, tk.END)
+        self._listbox.selection_set(i)
+        self._listbox.see(i)
+        return "break"
+
+    def _pick_selected(self):
+        sel = self._listbox.curselection()
+        if not sel and len(self._matches) == 1:
+            sel = (0,)  # 只有一个候选时回车直接选它
+        if sel and sel[0] < len(self._matches):
+            self.on_pick(self._matches[sel[0]])
+        self.hide()
+        return "break"
+
+    def _hide_unless_focused(self):
+        try:
+            focused = self.root.focus_get()
+        except (KeyError, tk.TclError):
+            focused = None
+        if focused is not self._listbox:
+            self.hide()
+
+    def hide(self):
+        self._seq += 1  # 还在路上的结果回来也不要再弹出来
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        try:
+            self._popup.withdraw()
+        except tk.TclError:
+            pass
+
+    def close(self):
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        try:
+            self._popup.destroy()
+        except tk.TclError:
+            pass
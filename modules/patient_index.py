@@ -0,0 +1,491 @@
+"""
+patient_index.py
+病人名录的搜索索引: 加载名录时建一次，之后增删病人时逐条更新。
+
+原来 search_patients 每按一个键就把整个名录扫一遍，每条都重新 .lower() 一次，
+几个病区加起来几千个病人时，打字会一卡一卡的。
+
+现在:
+    - 每个病人的姓名/MRN 预先规范化一次(去掉大小写、重音符号、标点，多个空格合成一个)
+    - 姓名、MRN、姓名里的每个词各存一份排好序的列表(前缀索引)，"以…开头"的匹配用二分查找直接定位
+    - "中间包含"的匹配(比如MRN中间几位): 所有规范化好的姓名/MRN预先拼成一个大字符串，
+      用正则在C层面一次扫完，再按偏移量二分查回是哪个病人；增删病人后下次用到时才重新拼
+      (试过三字组倒排索引，10万人建索引要好几秒，换来的只是这一档快一点，不划算)
+    - 结果按相关程度排序: MRN/姓名完全一样 > MRN开头 > 姓名开头 > 某个词开头 > 中间包含，
+      一档一档地取，下拉框只要前15条的话，凑够就停，不用把几万条匹配都排一遍
+
+容错搜索(search(..., fuzzy=True)): 上面几档凑不够时，再按"每个输入的词都能对上名字里的某个词"补:
+    词开头一样 > 读音相近(phonetic_key: 马来/华人名字常见的拼法差别，比如 CHONG/CHUNG、SIEW/SEOW、
+    MOHD/MUHAMMAD) > 打错一个字母(多/少/换一个字母、相邻两个字母颠倒)。
+名字里出现过的每个词(词表)预先做好: 词 -> 病人ID、读音key -> 词、"删掉一个字母"的变体 -> 词
+(SymSpell的做法，查打错一个字母不用跟整个词表逐个比)，增删病人时一起更新。
+
+基准测试(生成假名录，跟原来的逐条扫描比):
+    python -m modules.patient_index bench --sizes 10000 100000
+"""
+
+import re
+import time
+import heapq
+import bisect
+import itertools
+import random
+import threading
+import unicodedata
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize(text):
+    """搜索用的规范化: 去重音、不分大小写、标点当空格、多个空格合成一个"""
+    text = str(text or "")
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text.casefold()).split())
+
+
+# 常见的缩写/不同拼法，读音key之前先统一
+ALIASES = {
+    "mohd": "muhammad", "mohamad": "muhammad", "mohammad": "muhammad", "mohamed": "muhammad",
+    "muhamad": "muhammad", "muhd": "muhammad", "mhd": "muhammad",
+    "bt": "binti", "bte": "binti", "binte": "binti",
+    "abd": "abdul", "abdol": "abdul",
+    "noor": "nur", "nor": "nur",
+}
+
+_DIGRAPHS = [("ph", "f"), ("gh", "g"), ("kh", "k"), ("dh", "d"), ("th", "t"), ("sh", "s"), ("ch", "c"),
+             ("tj", "c"), ("dj", "j"), ("oo", "u"), ("ou", "u"), ("oe", "u"), ("ee", "i")]
+_LETTERS = str.maketrans({"q": "k", "z": "s", "x": "s", "v": "w", "y": "i"})
+
+# 容错搜索的分数(越小越靠前)，一个输入的词对上名字里一个词
+SCORE_TOKEN = 0.0      # 整个词一样
+SCORE_PREFIX = 0.2     # 名字里的词以它开头
+SCORE_PHONETIC = 0.6   # 读音相近
+SCORE_EDIT = 0.8       # 打错一个字母
+FUZZY_PREFIX_MAX = 12  # 删字母变体只做到词的前12个字母
+
+
+def phonetic_key(token):
+    """粗略的读音key: 统一常见拼法，保留第一个字母，去掉后面的元音和h，连续重复的字母只留一个"""
+    token = ALIASES.get(token, token)
+    for a, b in _DIGRAPHS:
+        token = token.replace(a, b)
+    token = token.translate(_LETTERS)
+    if not token:
+        return ""
+    key = token[0]
+    for c in token[1:]:
+        if c in "aeiouh" or c == key[-1]:
+            continue
+        key += c
+    return key
+
+
+def _deletes(text):
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+def within_one_edit(a, b):
+    """a和b是不是最多差一个字母(多/少/换一个，或者相邻两个颠倒)"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:] or (
+            i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+        )
+    if la > lb:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+def _fuzzy_word(token):
+    """只有字母的词才进容错词表(名字里偶尔夹的数字、编号不算)"""
+    return len(token) >= 2 and token.isalpha()
+
+
+def name_key(name):
+    """判断"是不是同一个病人"用的key，跟原来 add_or_update_patient 的比较规则一样"""
+    return str(name or "").strip().lower()
+
+
+class PatientIndex:
+    """patients 列表(里面是 {"name","mrn"} dict)的搜索索引"""
+
+    def __init__(self, patients=()):
+        self._entries = {}   # id -> (patient, 规范化姓名, 规范化MRN)
+        self._by_key = {}    # name_key -> id
+        self._names = []     # 排好序的 (规范化姓名, id)，姓名开头的匹配用二分查找
+        self._mrns = []      # 排好序的 (规范化MRN, id)
+        self._tokens = []    # 排好序的 (姓名里的每个词, 规范化姓名, id)，某个词开头的匹配
+        self._haystack = None  # (拼起来的大字符串, 每条记录的起始偏移, 对应的id)；None代表要重新拼
+        # 容错搜索的词表
+        self._word_ids = {}    # 词 -> {id}
+        self._vocab = []       # 排好序的词表(词开头的匹配)
+        self._phonetic = {}    # 读音key -> {词}
+        self._edits = {}       # 词前缀删掉一个字母后的变体 -> {词}
+        self._next_id = 0
+        # 下拉框在后台线程里搜，病人名单管理在界面线程里增删，两边共用这把锁
+        self._lock = threading.RLock()
+        for p in patients:
+            self._insert(p, bulk=True)
+        self._names.sort()
+        self._mrns.sort()
+        self._tokens.sort()
+        self._vocab.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------
+    # 增删
+    # ------------------------------------------------------------
+
+    def _insert(self, patient, bulk=False):
+        key = name_key(patient.get("name"))
+        if key in self._by_key:
+            self._drop(self._by_key[key])
+        pid = self._next_id
+        self._next_id += 1
+        name, mrn = normalize(patient.get("name")), normalize(patient.get("mrn"))
+        self._entries[pid] = (patient, name, mrn)
+        self._by_key[key] = pid
+        rows = [(self._names, (name, pid)), (self._mrns, (mrn, pid))]
+        rows += [(self._tokens, (token, name, pid)) for token in set(name.split()[1:])]
+        for target, row in rows:
+            if bulk:
+                target.append(row)   # 整批建索引时最后一起排序
+            else:
+                bisect.insort(target, row)
+        for word in set(name.split()):
+            ids = self._word_ids.get(word)
+            if ids is None:
+                ids = self._word_ids[word] = set()
+                self._add_word(word, bulk)
+            ids.add(pid)
+        self._haystack = None
+        return pid
+
+    @staticmethod
+    def _edit_keys(word):
+        keys = set()
+        for n in range(2, min(len(word), FUZZY_PREFIX_MAX) + 1):
+            prefix = word[:n]
+            keys.add(prefix)
+            keys |= _deletes(prefix)
+        return keys
+
+    def _add_word(self, word, bulk=False):
+        if bulk:
+            self._vocab.append(word)
+        else:
+            bisect.insort(self._vocab, word)
+        if not _fuzzy_word(word):
+            return
+        self._phonetic.setdefault(phonetic_key(word), set()).add(word)
+        for key in self._edit_keys(word):
+            self._edits.setdefault(key, set()).add(word)
+
+    def _remove_word(self, word):
+        i = bisect.bisect_left(self._vocab, word)
+        if i < len(self._vocab) and self._vocab[i] == word:
+            del self._vocab[i]
+        if not _fuzzy_word(word):
+            return
+        for index, keys in ((self._phonetic, (phonetic_key(word),)), (self._edits, self._edit_keys(word))):
+            for key in keys:
+                words = index.get(key)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del index[key]
+
+    def add(self, patient):
+        """加一条(同名的已经有了就先替换掉)"""
+        with self._lock:
+            return self._insert(patient)
+
+    def get(self, name):
+        """按姓名(大小写不敏感)找病人dict，没有返回None"""
+        with self._lock:
+            pid = self._by_key.get(name_key(name))
+            return self._entries[pid][0] if pid is not None else None
+
+    def update(self, patient):
+        """病人dict的内容改过了(比如MRN)，重新索引"""
+        self.add(patient)
+
+    def remove(self, name):
+        """按姓名删除，返回被删掉的病人dict(没有就None)"""
+        with self._lock:
+            pid = self._by_key.get(name_key(name))
+            if pid is None:
+                return None
+            patient = self._entries[pid][0]
+            self._drop(pid)
+            return patient
+
+    @staticmethod
+    def _remove_sorted(target, row):
+        i = bisect.bisect_left(target, row)
+        if i < len(target) and target[i] == row:
+            del target[i]
+
+    def _drop(self, pid):
+        patient, name, mrn = self._entries.pop(pid)
+        self._by_key.pop(name_key(patient.get("name")), None)
+        self._remove_sorted(self._names, (name, pid))
+        self._remove_sorted(self._mrns, (mrn, pid))
+        for token in set(name.split()[1:]):
+            self._remove_sorted(self._tokens, (token, name, pid))
+        for word in set(name.split()):
+            ids = self._word_ids.get(word)
+            if ids is not None:
+                ids.discard(pid)
+                if not ids:
+                    del self._word_ids[word]
+                    self._remove_word(word)
+        self._haystack = None
+
+    # ------------------------------------------------------------
+    # 搜索
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _prefix_ids(target, q, exact=False):
+        """排好序的列表里，第一项以q开头(exact: 就等于q)的那一段的id，按列表顺序逐个给出"""
+        lo = bisect.bisect_left(target, (q,))
+        hi = bisect.bisect_left(target, (q + "\U0010ffff",))
+        return (target[i][-1] for i in range(lo, hi) if not exact or target[i][0] == q)
+
+    def _build_haystack(self):
+        # 每条记录是 "姓名\tMRN\n"；规范化后的文字里不会有\t和\n，匹配不会跨记录
+        parts, offsets, ids, pos = [], [], [], 0
+        for pid, (_, name, mrn) in self._entries.items():
+            text = f"{name}\t{mrn}\n"
+            parts.append(text)
+            offsets.append(pos)
+            ids.append(pid)
+            pos += len(text)
+        self._haystack = ("".join(parts), offsets, ids)
+
+    def _contains(self, q):
+        """中间包含q的id(还没去掉前面几档已经有的)，按姓名排序"""
+        if self._haystack is None:
+            self._build_haystack()
+        text, offsets, ids = self._haystack
+        found = set()
+        for m in re.finditer(re.escape(q), text):
+            found.add(ids[bisect.bisect_right(offsets, m.start()) - 1])
+        return sorted(found, key=lambda pid: (self._entries[pid][1], pid))
+
+    def search_ids(self, query, limit=None):
+        """
+        按相关程度一档一档地找，凑够 limit 条就停:
+        完全一样 > MRN开头 > 姓名开头 > 某个词开头 > 中间包含。
+        同一档里按姓名排(MRN开头那一档按MRN排，某个词开头那一档先按那个词再按姓名排)。
+        """
+        q = normalize(query)
+        if not q:
+            return None
+        result, seen = [], set()
+
+        def take(pids):
+            for pid in pids:
+                if pid not in seen:
+                    seen.add(pid)
+                    result.append(pid)
+                    if limit is not None and len(result) >= limit:
+                        return True
+            return False
+
+        exact = {*self._prefix_ids(self._names, q, exact=True), *self._prefix_ids(self._mrns, q, exact=True)}
+        tiers = (
+            lambda: sorted(exact, key=lambda pid: (self._entries[pid][1], pid)),
+            lambda: self._prefix_ids(self._mrns, q),
+            lambda: self._prefix_ids(self._names, q),
+            lambda: self._prefix_ids(self._tokens, q),
+            lambda: self._contains(q),
+        )
+        for tier in tiers:
+            if take(tier()):
+                break
+        return result
+
+    def _word_matches(self, q):
+        """输入的一个词能对上词表里的哪些词，各自多少分 {词: 分数}"""
+        matches = {}
+
+        def offer(word, score):
+            if score < matches.get(word, 99):
+                matches[word] = score
+
+        lo = bisect.bisect_left(self._vocab, q)
+        hi = bisect.bisect_left(self._vocab, q + "\U0010ffff")
+        for i in range(lo, hi):
+            word = self._vocab[i]
+            offer(word, SCORE_TOKEN if word == q else SCORE_PREFIX)
+        if not _fuzzy_word(q):
+            return matches
+        for word in self._phonetic.get(phonetic_key(q), ()):
+            offer(word, SCORE_PHONETIC)
+        if len(q) >= 3:
+            candidates = set()
+            for key in {q[:FUZZY_PREFIX_MAX]} | _deletes(q[:FUZZY_PREFIX_MAX]):
+                candidates |= self._edits.get(key, set())
+            n = len(q)
+            for word in candidates:
+                if any(within_one_edit(q, word[:m]) for m in (n - 1, n, n + 1) if m <= len(word)):
+                    offer(word, SCORE_EDIT)
+        return matches
+
+    def fuzzy_ids(self, query, limit=10):
+        """
+        容错搜索: 每个输入的词都要对上名字里的某个词，分数相加，取分数最低的前limit个。
+        不逐个病人打分: 每个词按分数分几档(每档是一组病人ID)，按总分从低到高枚举各档的组合，
+        用集合求交集(C层面完成)，凑够limit个就停。
+        """
+        words = normalize(query).split()
+        if not words:
+            return []
+        levels = []
+        for q in words:
+            by_score = {}
+            for word, score in self._word_matches(q).items():
+                by_score.setdefault(score, set()).update(self._word_ids.get(word, ()))
+            if not by_score:
+                return []
+            levels.append(sorted(by_score.items(), key=lambda item: item[0]))
+        combos = sorted(itertools.product(*levels), key=lambda combo: sum(score for score, _ in combo))
+
+        result, seen = [], set()
+        for _, group in itertools.groupby(combos, key=lambda combo: round(sum(score for score, _ in combo), 6)):
+            found = set()
+            for combo in group:
+                sets = sorted((ids for _, ids in combo), key=len)
+                found |= sets[0].intersection(*sets[1:])
+            found -= seen
+            if not found:
+                continue
+            seen |= found
+            result += heapq.nsmallest(limit - len(result), found, key=lambda pid: (self._entries[pid][1], pid))
+            if len(result) >= limit:
+                break
+        return result
+
+    def search(self, query, limit=None, fuzzy=False):
+        """
+        按姓名或MRN搜索，按相关程度排序；query为空返回None(调用方自己决定返回全部)。
+        fuzzy=True: 精确的几档凑不够limit条时，再用容错搜索补(打错字、不同拼法)
+        """
+        with self._lock:
+            ids = self.search_ids(query, limit)
+            if ids is None:
+                return None
+            if fuzzy and (limit is None or len(ids) < limit):
+                seen = set(ids)
+                extra = self.fuzzy_ids(query, limit=(limit or 10) + len(ids))
+                ids += [pid for pid in extra if pid not in seen][:None if limit is None else limit - len(ids)]
+            return [self._entries[pid][0] for pid in ids]
+
+
+class PatientList(list):
+    """
+    load_patients() 返回的名录: 用起来跟普通list一样(len/遍历/sorted都照旧)，
+    另外挂着一个 search_index，patient_directory 里的增删函数会顺手更新它。
+    (不叫 .index，免得盖掉 list 自己的 index() 方法)
+    """
+
+    def __init__(self, patients=()):
+        super().__init__(patients)
+        self.search_index = PatientIndex(self)
+        self.write_through = False  # True: 增删已经逐条写进存储了(patient_directory 的sqlite模式)
+
+
+# ------------------------------------------------------------
+# 基准测试
+# ------------------------------------------------------------
+
+_SURNAMES = ["TAN", "LIM", "LEE", "WONG", "NG", "CHAN", "ONG", "GOH", "CHONG", "LAU", "YAP", "TEH"]
+_GIVEN = ["AH KOW", "MEI LING", "WEI JIE", "SIEW LAN", "KOK WAI", "LI NA", "CHEE KEONG", "HUI MIN"]
+_MALAY = ["AHMAD", "SITI", "NURUL", "MOHD", "FARIDAH", "AZMAN", "ROSLAN", "ZAINAB", "HASSAN", "AMINAH"]
+_INDIAN = ["MUTHU", "KUMAR", "LAKSHMI", "RAJU", "DEVI", "SELVAM", "PRIYA", "GANESAN"]
+
+
+def fake_patients(n, seed=0):
+    rnd = random.Random(seed)
+    patients = []
+    for i in range(n):
+        kind = rnd.random()
+        if kind < 0.45:
+            name = f"{rnd.choice(_SURNAMES)} {rnd.choice(_GIVEN)}"
+        elif kind < 0.8:
+            link = "BIN" if rnd.random() < 0.5 else "BINTI"
+            name = f"{rnd.choice(_MALAY)} {link} {rnd.choice(_MALAY)}"
+        else:
+            link = "A/L" if rnd.random() < 0.5 else "A/P"
+            name = f"{rnd.choice(_INDIAN)} {link} {rnd.choice(_INDIAN)}"
+        patients.append({"name": f"{name} {i}", "mrn": f"{rnd.randint(10 ** 7, 10 ** 8 - 1)}"})
+    return patients
+
+
+def _linear_search(patients, query):
+    """原来 search_patients 的做法，用来对比"""
+    q = (query or "").strip().lower()
+    return [
+        p for p in patients
+        if q in str(p.get("name", "")).lower() or q in str(p.get("mrn", "")).lower()
+    ]
+
+
+def bench(sizes=(10000, 100000), repeat=20):
+    queries = ["t", "ta", "tan", "tan ah", "siti binti", "a/l raju", "1234", "999", "zzz",
+               "chung mei", "mohd binti", "seow lan", "kumr", "lakshmi a/p dvei"]
+    rows = []
+    for n in sizes:
+        patients = fake_patients(n)
+        started = time.perf_counter()
+        index = PatientIndex(patients)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        def timed(fn):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for q in queries:
+                    fn(q)
+            return (time.perf_counter() - started) * 1000 / (repeat * len(queries))
+
+        rows.append({
+            "records": n,
+            "build_ms": round(build_ms, 1),
+            "linear_ms_per_query": round(timed(lambda q: _linear_search(patients, q)), 3),
+            "index_ms_per_query": round(timed(lambda q: index.search(q)), 3),
+            "index_top15_ms_per_query": round(timed(lambda q: index.search(q, limit=15)), 3),
+            "fuzzy_top15_ms_per_query": round(timed(lambda q: index.search(q, limit=15, fuzzy=True)), 3),
+        })
+    return rows
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="病人名录搜索索引 Patient search index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_p = sub.add_parser("bench", help="生成假名录，对比逐条扫描和索引的搜索耗时")
+    bench_p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    bench_p.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        for row in bench(args.sizes, args.repeat):
+            print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+patient_lookup.py
+在 Dialysis Queue 里找病人的"查找策略"选择 + 记忆。
+
+原来 find_patient_in_queue 的顺序是固定的: 当天列表 -> 放宽到90天并Reload -> 搜索框。
+不是今天透析的病人每次都要等90天那张大表重新加载完，偏偏这是最慢的一条路。
+
+现在把每种找法当成一个"策略":
+    today     直接在当前(当天)列表里找，不刷新页面，最便宜
+    search    用队列页的搜索框按MRN过滤
+    range_7   From/To放宽到最近7天再Reload
+    range_30  放宽到30天
+    range_90  放宽到90天(原来的做法，表最大、最慢)
+默认按上面的顺序从便宜到贵一个个试；每位病人上一次是被哪个策略找到的，
+记在 data/lookup_stats.json 里，下次这位病人直接先试那个策略。
+每个策略每次用了多久、成功没有，也累计在同一个文件里(平均耗时/命中率)，
+日志里也会逐个打出来。
+
+跟 patients.json 一样只存MRN，不存病人姓名/数据。
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_STATS_FILE = os.path.join("data", "lookup_stats.json")
+
+# 默认尝试顺序: 从便宜到贵
+DEFAULT_STRATEGY_ORDER = ["today", "search", "range_7", "range_30", "range_90"]
+
+# range_N 策略对应放宽的天数
+RANGE_DAYS = {"range_7": 7, "range_30": 30, "range_90": 90}
+
+
+class PatientLookupStats:
+    """记住每个MRN上次是用哪个策略找到的 + 每个策略的累计耗时/命中率"""
+
+    def __init__(self, path=LOOKUP_STATS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    data.setdefault("patients", {})
+                    data.setdefault("strategies", {})
+                    return data
+        except Exception as e:
+            logger.warning(f"读取{self.path}失败，重新开始记录: {e}")
+        return {"patients": {}, "strategies": {}}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with self._lock:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning(f"保存{self.path}失败: {e}")
+
+    def remembered(self, mrn):
+        entry = self._data["patients"].get(str(mrn).strip())
+        return entry.get("method") if entry else None
+
+    def order_for(self, mrn):
+        """这位病人该按什么顺序试: 上次成功的策略放最前面，其余保持默认顺序"""
+        order = list(DEFAULT_STRATEGY_ORDER)
+        method = self.remembered(mrn)
+        if method in order:
+            order.remove(method)
+            order.insert(0, method)
+        return order
+
+    def record_attempt(self, method, elapsed, ok):
+        with self._lock:
+            s = self._data["strategies"].setdefault(method, {"tries": 0, "hits": 0, "total_s": 0.0})
+            s["tries"] += 1
+            s["hits"] += 1 if ok else 0
+            s["total_s"] = round(s["total_s"] + elapsed, 3)
+
+    def record_success(self, mrn, method):
+        with self._lock:
+            self._data["patients"][str(mrn).strip()] = {
+                "method": method,
+                "updated": datetime.now().isoformat(timespec="seconds"),
+            }
+
+    def strategy_summary(self):
+        """{策略: {"tries","hit_rate","avg_s"}}，给日志/排查用"""
+        summary = {}
+        for method, s in self._data["strategies"].items():
+            tries = s.get("tries", 0) or 1
+            summary[method] = {
+                "tries": s.get("tries", 0),
+                "hit_rate": round(s.get("hits", 0) / tries, 2),
+                "avg_s": round(s.get("total_s", 0.0) / tries, 2),
+            }
+        return summary
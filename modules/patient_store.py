@@ -0,0 +1,175 @@
+"""
+patient_store.py
+病人名录的 SQLite 存储(patients.db)，config.json 里 patient_directory.backend = "sqlite" 时启用。
+
+原来每加/删一个病人，save_patients 都要把整个名单重新排序、整份 patients.json 重写一遍；
+add_or_update_patient 按姓名找人也是逐条比较。
+
+现在:
+    - patients 表: 姓名、name_key(小写去空格，UNIQUE，判断同一个病人用)、MRN(有索引)
+    - 加/改一个病人就是一条 upsert，删一个就是一条 delete，不动其他行
+    - patients_fts 全文索引(FTS5，sqlite没编译FTS5的话退回 LIKE)，不加载名单也能直接按词前缀搜
+    - 批量导入(parse_bulk_text 解析出来的几十上百个病人)在一个事务里写完
+    - 第一次打开时，如果旁边有老的 patients.json，一次性导进来(json文件原样留着当备份)
+
+跟 patients.json 一样是包含病人信息的敏感文件，只留在本机。
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from modules.patient_index import normalize, name_key
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id       INTEGER PRIMARY KEY,
+    name     TEXT NOT NULL,
+    name_key TEXT NOT NULL UNIQUE,
+    mrn      TEXT NOT NULL DEFAULT '',
+    updated  TEXT
+);
+CREATE INDEX IF NOT EXISTS patients_mrn ON patients (mrn);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+    name, mrn, content='patients', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS patients_ai AFTER INSERT ON patients BEGIN
+    INSERT INTO patients_fts (rowid, name, mrn) VALUES (new.id, new.name, new.mrn);
+END;
+CREATE TRIGGER IF NOT EXISTS patients_ad AFTER DELETE ON patients BEGIN
+    INSERT INTO patients_fts (patients_fts, rowid, name, mrn) VALUES ('delete', old.id, old.name, old.mrn);
+END;
+CREATE TRIGGER IF NOT EXISTS patients_au AFTER UPDATE ON patients BEGIN
+    INSERT INTO patients_fts (patients_fts, rowid, name, mrn) VALUES ('delete', old.id, old.name, old.mrn);
+    INSERT INTO patients_fts (rowid, name, mrn) VALUES (new.id, new.name, new.mrn);
+END;
+"""
+
+_UPSERT = (
+    "INSERT INTO patients (name, name_key, mrn, updated) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (name_key) DO UPDATE SET mrn = excluded.mrn, updated = excluded.updated"
+)
+
+
+class PatientStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️  sqlite没有FTS5，病人搜索改用LIKE: {e}")
+            self.fts = False
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------
+    # 读
+    # ------------------------------------------------------------
+
+    def load(self):
+        """全部病人 [{"name","mrn"}]，按姓名排"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name, mrn FROM patients ORDER BY UPPER(name)").fetchall()
+        return [{"name": name, "mrn": mrn} for name, mrn in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def search(self, query, limit=None):
+        """按词前缀(FTS)或MRN前缀搜；MRN开头的排最前面，其余按姓名"""
+        tokens = normalize(query).split()
+        if not tokens:
+            return []
+        q = normalize(query)
+        limit_sql = "" if limit is None else f" LIMIT {int(limit)}"
+        with self._lock:
+            if self.fts:
+                match = " ".join(f'"{t}"*' for t in tokens)
+                rows = self._conn.execute(
+                    "SELECT name, mrn FROM patients WHERE id IN "
+                    "(SELECT rowid FROM patients_fts WHERE patients_fts MATCH ?) OR mrn LIKE ? "
+                    "ORDER BY (mrn LIKE ?) DESC, UPPER(name)" + limit_sql,
+                    (match, q + "%", q + "%"),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT name, mrn FROM patients WHERE name_key LIKE ? OR mrn LIKE ? "
+                    "ORDER BY (mrn LIKE ?) DESC, UPPER(name)" + limit_sql,
+                    (f"%{q}%", f"%{q}%", q + "%"),
+                ).fetchall()
+        return [{"name": name, "mrn": mrn} for name, mrn in rows]
+
+    # ------------------------------------------------------------
+    # 写(每个方法一个事务)
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _row(name, mrn, now):
+        name = str(name or "").strip()
+        return (name, name_key(name), str(mrn or "").strip(), now)
+
+    def upsert(self, name, mrn):
+        self.upsert_many([{"name": name, "mrn": mrn}])
+
+    def upsert_many(self, patients):
+        """批量加/改，一个事务"""
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = [self._row(p.get("name"), p.get("mrn"), now) for p in patients if str(p.get("name") or "").strip()]
+        with self._lock, self._conn:
+            self._conn.executemany(_UPSERT, rows)
+
+    def delete(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM patients WHERE name_key = ?", (name_key(name),))
+
+    def replace_all(self, patients):
+        """整份名单替换(给没有走逐条写入的调用方用)，一个事务"""
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = [self._row(p.get("name"), p.get("mrn"), now) for p in patients if str(p.get("name") or "").strip()]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM patients")
+            self._conn.executemany(_UPSERT, rows)
+
+    # ------------------------------------------------------------
+    # 从 patients.json 迁移
+    # ------------------------------------------------------------
+
+    def migrate_from_json(self, json_path):
+        """第一次打开时把老的 patients.json 导进来(只做一次，json文件原样保留)"""
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取{json_path}失败，跳过迁移: {e}")
+            return 0
+        patients = [p for p in data if isinstance(p, dict)] if isinstance(data, list) else []
+        self.upsert_many(patients)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (datetime.now().isoformat(timespec="seconds"),),
+            )
+        logger.info(f"🗂️  已把 {json_path} 里的 {len(patients)} 位病人迁移到 {self.path}")
+        return len(patients)
@@ -0,0 +1,198 @@
+"""
+photo_catalog.py
+手机上传照片的目录(SQLite，存在 uploads_incoming/.catalog.db)。
+
+原来网页每次打开、桌面端"从手机导入"弹窗每次打开，都要 os.listdir 整个文件夹再逐个
+os.path.isfile，照片越积越多越慢；文件名只精确到秒，同一秒里几台手机一起传，
+多线程的服务器上两边可能拿到同一个名字。
+
+现在每张照片上传时在这里记一行:
+    id        自增ID(文件名里带上它，同一秒传多少张都不会撞名)
+    filename  在 uploads_incoming/ 里的文件名
+    created   上传时间
+    size      文件大小(字节)
+    sha256    手机传上来的原始字节的哈希，同一张照片重复上传时认得出来
+    kind      "jpeg"(转换好的) 或者原始格式的扩展名(转换失败按原格式保存的)
+    status    converting(后台转换中) / pending(待导入) / imported(已导入) / failed / missing
+
+待处理列表就是 status='pending' 的查询，只跟待处理的照片数量有关。
+上传服务(可能在单独的进程里)和桌面端共用这一个文件，每次操作开一个短连接，WAL模式下互不阻塞。
+第一次建库时把文件夹里已有的照片补登记进来(backfill)。
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CATALOG_NAME = ".catalog.db"  # 点开头: 不会出现在照片列表里
+
+STATUSES = ("converting", "pending", "imported", "failed", "missing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename      TEXT UNIQUE,
+    original_name TEXT,
+    created       TEXT NOT NULL,
+    size          INTEGER,
+    sha256        TEXT,
+    kind          TEXT,
+    status        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS photos_status ON photos (status, id);
+CREATE INDEX IF NOT EXISTS photos_sha256 ON photos (sha256);
+"""
+
+
+def file_sha256(path, buffer_size=64 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(buffer_size), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def _kind_of(filename):
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    return "jpeg" if ext in ("jpg", "jpeg") else (ext or "dat")
+
+
+class PhotoCatalog:
+    """一个 uploads_incoming/ 文件夹对应一个目录"""
+
+    def __init__(self, incoming_dir, imported_subdir="imported"):
+        self.incoming_dir = incoming_dir
+        self.imported_subdir = imported_subdir
+        self.path = os.path.join(incoming_dir, CATALOG_NAME)
+        os.makedirs(incoming_dir, exist_ok=True)
+        is_new = not os.path.exists(self.path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        if is_new:
+            self.backfill()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ------------------------------------------------------------
+    # 写
+    # ------------------------------------------------------------
+
+    def add(self, original_name, size, sha256, status="converting"):
+        """登记一张新上传的照片，返回ID(文件名由调用方用ID拼出来后再 set_filename)"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO photos (original_name, created, size, sha256, status) VALUES (?, ?, ?, ?, ?)",
+                (original_name, datetime.now().isoformat(timespec="seconds"), size, sha256, status),
+            )
+            return cur.lastrowid
+
+    def set_filename(self, photo_id, filename):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE photos SET filename = ?, kind = ? WHERE id = ?",
+                (filename, _kind_of(filename), photo_id),
+            )
+
+    def finish_conversion(self, filename, final_filename=None, size=None):
+        """
+        后台转换结束: final_filename 是最后留在文件夹里的文件(转换好的JPG，或者按原格式保存的)，
+        None 代表连原格式都没保存下来
+        """
+        with self._connect() as conn:
+            if final_filename is None:
+                conn.execute("UPDATE photos SET status = 'failed' WHERE filename = ?", (filename,))
+                return
+            conn.execute(
+                "UPDATE photos SET filename = ?, kind = ?, size = COALESCE(?, size), status = 'pending' "
+                "WHERE filename = ?",
+                (final_filename, _kind_of(final_filename), size, filename),
+            )
+
+    def set_status(self, filename, status):
+        with self._connect() as conn:
+            conn.execute("UPDATE photos SET status = ? WHERE filename = ?", (status, filename))
+
+    # ------------------------------------------------------------
+    # 读
+    # ------------------------------------------------------------
+
+    def filenames(self, status="pending"):
+        """某个状态的照片文件名，新的在前"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT filename FROM photos WHERE status = ? AND filename IS NOT NULL ORDER BY id DESC",
+                (status,),
+            ).fetchall()
+        return [row["filename"] for row in rows]
+
+    def count(self, status="pending"):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM photos WHERE status = ?", (status,)).fetchone()[0]
+
+    def find_duplicate(self, sha256):
+        """同一份字节已经传过(还在转换/待导入/已导入)的话，返回那一行(dict)；没有返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM photos WHERE sha256 = ? AND status IN ('converting', 'pending', 'imported') "
+                "ORDER BY id DESC LIMIT 1",
+                (sha256,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get(self, filename):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM photos WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def pending_paths(self):
+        """待导入照片的路径，新的在前。文件被人手动删掉了的标记为missing，不再列出来"""
+        paths, gone = [], []
+        for filename in self.filenames("pending"):
+            path = os.path.join(self.incoming_dir, filename)
+            if os.path.isfile(path):
+                paths.append(path)
+            else:
+                gone.append(filename)
+        for filename in gone:
+            logger.info(f"ℹ️  待导入照片已经不在文件夹里了: {filename}")
+            self.set_status(filename, "missing")
+        return paths
+
+    # ------------------------------------------------------------
+    # 第一次建库: 把已有的照片补登记进来
+    # ------------------------------------------------------------
+
+    def backfill(self):
+        entries = []
+        for status, folder in (("pending", self.incoming_dir),
+                               ("imported", os.path.join(self.incoming_dir, self.imported_subdir))):
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name)
+                if name.startswith(".") or name.endswith((".upload", ".tmp")) or not os.path.isfile(path):
+                    continue
+                st = os.stat(path)
+                entries.append((
+                    name, name, datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds"),
+                    st.st_size, file_sha256(path), _kind_of(name), status,
+                ))
+        if not entries:
+            return 0
+        entries.sort(key=lambda e: e[0])  # 旧文件名是时间戳，按名字排就是按上传先后
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO photos (filename, original_name, created, size, sha256, kind, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                entries,
+            )
+        logger.info(f"🗂️  照片目录: 补登记了 {len(entries)} 张已有的照片")
+        return len(entries)
@@ -14,16 +14,22 @@ import os
 import logging
 from difflib import SequenceMatcher
 
-import pytesseract
 from PIL import Image, ImageDraw
 
+from modules.lazy_import import lazy_module
 from modules.ocr_module import find_tesseract_executable
 
-# 模块加载时就自动检测并设置一次Tesseract路径(config.json/PATH/常见安装路径)，
-# 跟ocr_module.py的DialysisOCR用的是同一套检测逻辑，保持一致
-_tess_path = find_tesseract_executable()
-if _tess_path:
-    pytesseract.pytesseract.tesseract_cmd = _tess_path
+pytesseract = lazy_module("pytesseract")
+
+
+def _use_detected_tesseract():
+    """
+    第一次打码时才检测并设置Tesseract路径(config.json/PATH/常见安装路径)，
+    跟ocr_module.py的DialysisOCR用的是同一套(有缓存的)检测逻辑，保持一致
+    """
+    tess_path = find_tesseract_executable()
+    if tess_path:
+        pytesseract.pytesseract.tesseract_cmd = tess_path
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +80,7 @@ def redact_sensitive_fields(
     """
     if labels is None:
         labels = DEFAULT_LABELS
+    _use_detected_tesseract()
 
     img = Image.open(image_path).convert("RGB")
     img_width, img_height = img.size
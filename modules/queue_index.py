@@ -0,0 +1,103 @@
+"""
+queue_index.py
+批量模式下 Dialysis Queue 的 "MRN -> 表格行位置" 索引。
+
+原来批量里的每一位病人，都要在所有iframe里逐层切换、用
+//td[normalize-space(text())='{mrn}'] 去搜一遍 MRN 所在的格子，
+每切一次frame、每找一次都是一次WebDriver来回。
+
+现在批量开始时(登录之后)用【一次】execute_script，从 window.top 递归扫一遍
+所有同源frame里的<td>，把这一批要处理的MRN各自在哪个frame(frame下标路径)、
+是文档里第几个<td>记下来。之后每位病人:
+  1. 切进记录的frame(几次switch_to.frame，不用搜)
+  2. 一次JS按下标取出那个<td>，同时核对文字确实还是这个MRN
+  3. 核对不上(页面变了)就在当前页面重新扫一次，再试
+当天列表里没有的MRN，会依次放宽到7/30/90天再扫，记住每个MRN在哪个范围才出现，
+轮到它的时候只放宽到需要的那个范围。
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 参数: MRN列表。返回 {"hits": {mrn: {"path": [frame下标...], "td": 第几个td}}, "td_total": n}
+_SNAPSHOT_JS = """
+var wanted = {};
+for (var i = 0; i < arguments[0].length; i++) wanted[String(arguments[0][i]).trim()] = true;
+var hits = {}, total = 0;
+function scan(win, path) {
+    var doc;
+    try { doc = win.document; doc.documentElement; } catch (e) { return; }
+    var tds = doc.getElementsByTagName('td');
+    total += tds.length;
+    for (var k = 0; k < tds.length; k++) {
+        var text = (tds[k].textContent || '').replace(/\\s+/g, ' ').trim();
+        if (wanted[text] && !hits[text]) hits[text] = {path: path, td: k};
+    }
+    for (var f = 0; f < win.frames.length; f++) scan(win.frames[f], path.concat([f]));
+}
+var root;
+try { root = window.top; root.document.documentElement; } catch (e) { root = window; }
+scan(root, []);
+return {hits: hits, td_total: total};
+"""
+
+# 在已经切进去的frame里，按下标取<td>并核对文字，对不上返回null
+_FETCH_CELL_JS = """
+var td = document.getElementsByTagName('td')[arguments[0]];
+if (!td) return null;
+var text = (td.textContent || '').replace(/\\s+/g, ' ').trim();
+return text === String(arguments[1]).trim() ? td : null;
+"""
+
+
+class QueueIndex:
+    """
+    按日期范围分层保存的索引: levels[None] 是当天列表扫出来的，
+    levels[7]/[30]/[90] 是放宽到对应天数后扫出来的。
+    """
+
+    def __init__(self, mrns):
+        self.mrns = [str(m).strip() for m in mrns if str(m).strip()]
+        self.levels = {}
+
+    def snapshot(self, driver, range_days):
+        """在当前页面扫一次，结果存到range_days这一层；返回这一层找到了几个MRN"""
+        result = driver.execute_script(_SNAPSHOT_JS, self.mrns) or {}
+        hits = result.get("hits") or {}
+        self.levels[range_days] = hits
+        logger.info(
+            f"📇 队列索引(范围: {range_days or '当天'}): 扫了 {result.get('td_total', 0)} 个格子，"
+            f"找到 {len(hits)}/{len(self.mrns)} 位病人"
+        )
+        return len(hits)
+
+    def missing(self):
+        found = set()
+        for hits in self.levels.values():
+            found.update(hits)
+        return [m for m in self.mrns if m not in found]
+
+    def locate(self, mrn, current_range):
+        """
+        返回 (需要的日期范围, 位置)。当前页面这一层里就有的话直接用当前层；
+        否则返回最小的、扫到过这个MRN的那一层(调用方需要先放宽到那个范围)。
+        都没有返回 (None, None)。
+        """
+        mrn = str(mrn).strip()
+        if mrn in self.levels.get(current_range, {}):
+            return current_range, self.levels[current_range][mrn]
+        for level in sorted((k for k in self.levels if k is not None)):
+            if mrn in self.levels[level]:
+                return level, self.levels[level][mrn]
+        if mrn in self.levels.get(None, {}):
+            return None, self.levels[None][mrn]
+        return None, None
+
+    @staticmethod
+    def fetch_cell(driver, location, mrn):
+        """切进记录的frame，取出并核对那个<td>；对不上返回None(driver停在那个frame里)"""
+        driver.switch_to.default_content()
+        for index in location.get("path", []):
+            driver.switch_to.frame(index)
+        return driver.execute_script(_FETCH_CELL_JS, location.get("td", -1), mrn)
@@ -0,0 +1,177 @@
+"""
+startup_profile.py
+桌面端冷启动的计时和预热。
+
+原来双击启动以后，要等 Flask 上传服务起来、各个模块 import 完，窗口才出来；
+到底慢在哪里也没有数字可看。
+
+现在:
+    - StartupProfile: main.py 从进程一开始就计时，关键节点 mark() 一下
+      (imports / ui / window_shown ...)，窗口真正能操作时把每一段的耗时写进日志，
+      同时列出那时已经被加载的重量级模块(理想情况是一个都没有)
+    - 手机上传服务(要 import flask、打开目录数据库)等窗口显示出来以后，在后台线程里启动
+    - cv2/numpy/pytesseract 改成第一次用到时才 import(lazy_import.py)，
+      Tesseract 的路径检测结果缓存起来(ocr_module.find_tesseract_executable)
+    - 窗口出来几秒后，在后台线程里预热这些模块(config.json 的 startup.prewarm)，
+      护理师第一次点OCR时就不用再等 import
+
+单独看 import 耗时(python -X importtime 的汇总):
+    python -m modules.startup_profile imports --module main --top 25
+main.py 一 import 就会往 logs/automation.log 写日志，所以子进程在项目根目录下跑，
+import 之前先建好 logs/ (跟 main() 启动时一样)，干净的checkout上也能直接跑。
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+from modules.lazy_import import warm, import_timings
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动时不应该被加载的重量级模块(用到时才加载)
+HEAVY_MODULES = ("cv2", "numpy", "pytesseract", "google.genai", "flask", "waitress")
+
+# 后台预热的模块: OCR/打码/AI识别第一次点下去要用的那些
+PREWARM_MODULES = ("numpy", "cv2", "pytesseract", "modules.ocr_module", "modules.privacy_redact",
+                   "modules.ai_ocr_module", "google.genai")
+
+DEFAULT_SETTINGS = {
+    "prewarm": True,           # 窗口出来后在后台预热OCR用的模块
+    "prewarm_delay_ms": 2000,  # 窗口出来多久以后开始预热(先让界面把第一屏画完)
+}
+
+
+def load_settings(config):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((config or {}).get("startup", {}))
+    return settings
+
+
+class StartupProfile:
+    def __init__(self, started=None):
+        """started: time.perf_counter() 的起点，最好是 main.py 一开头就记下来的"""
+        self.started = time.perf_counter() if started is None else started
+        self.marks = []  # [(名称, 距起点的秒数)]
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def elapsed(self, name=None):
+        if name is None:
+            return time.perf_counter() - self.started
+        for mark_name, seconds in self.marks:
+            if mark_name == name:
+                return seconds
+        return None
+
+    def report(self):
+        """每一段的耗时，一行一段"""
+        lines, previous = [], 0.0
+        for name, seconds in self.marks:
+            lines.append(f"  {name:<16} {seconds * 1000:7.0f} ms  (+{(seconds - previous) * 1000:.0f} ms)")
+            previous = seconds
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        lines.append(f"  启动时已加载的重量级模块 heavy modules loaded: {', '.join(loaded) or '无 none'}")
+        return lines
+
+
+def prewarm_in_background(modules=PREWARM_MODULES, on_done=None):
+    """
+    后台线程里 import 这些模块、检测一次 Tesseract；on_done(秒数, 加载了的模块) 在后台线程里调用
+    (要碰界面的话调用方自己经 root.after 转回去)
+    """
+    def run():
+        start = time.perf_counter()
+        loaded = warm(*modules)
+        try:
+            from modules.ocr_module import find_tesseract_executable
+            find_tesseract_executable()
+        except ImportError:
+            pass
+        elapsed = time.perf_counter() - start
+        logger.info(f"🔥 后台预热完成 {elapsed:.1f}s: {', '.join(loaded) or '无'}")
+        if on_done is not None:
+            on_done(elapsed, loaded)
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+# ------------------------------------------------------------
+# import 耗时报告(python -X importtime)
+# ------------------------------------------------------------
+
+def parse_importtime(stderr_text):
+    """解析 -X importtime 的输出，返回 [(模块名, 自身微秒, 累计微秒)]"""
+    rows = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # 表头那一行
+        rows.append((parts[2].strip(), self_us, cumulative_us))
+    return rows
+
+
+def import_report(module="main", top=25):
+    """
+    在一个新的解释器里(项目根目录下，先建好logs/) import module，汇总 import 耗时；
+    返回 (总毫秒, 前top个最慢的, 被加载的重量级模块, 错误输出)
+    """
+    import subprocess
+
+    # 建 logs/ 的 os 在 import 之前就加载了，不算进被测模块的耗时里
+    code = f"import os; os.makedirs('logs', exist_ok=True); import {module}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=PROJECT_ROOT,
+    )
+    rows = parse_importtime(proc.stderr)
+    total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+    slowest = sorted(rows, key=lambda r: r[2], reverse=True)[:top]
+    names = {name for name, _, _ in rows}
+    heavy = [name for name in HEAVY_MODULES if name in names]
+    error = proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else ""
+    return total_ms, slowest, heavy, error
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="启动耗时 Startup profile")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imports_p = sub.add_parser("imports", help="用 python -X importtime 汇总 import 一个模块的耗时")
+    imports_p.add_argument("--module", default="main")
+    imports_p.add_argument("--top", type=int, default=25)
+    warm_p = sub.add_parser("warm", help="在当前进程里预热OCR用的模块，看每个要多久")
+    warm_p.add_argument("modules", nargs="*", default=list(PREWARM_MODULES))
+    args = parser.parse_args()
+
+    if args.command == "imports":
+        total_ms, slowest, heavy, error = import_report(args.module, args.top)
+        if error:
+            print(f"⚠️  import {args.module} 出错: {error}")
+        print(f"import {args.module}: 共 {total_ms:.0f} ms")
+        print(f"{'累计 ms':>9} {'自身 ms':>9}  模块")
+        for name, self_us, cumulative_us in slowest:
+            print(f"{cumulative_us / 1000:9.1f} {self_us / 1000:9.1f}  {name}")
+        print(f"启动时被加载的重量级模块: {', '.join(heavy) or '无'}")
+    elif args.command == "warm":
+        warm(*args.modules)
+        for name, seconds in sorted(import_timings().items(), key=lambda kv: kv[1], reverse=True):
+            print(f"{seconds * 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
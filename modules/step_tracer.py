@@ -0,0 +1,323 @@
+"""
+step_tracer.py
+Origin自动化每一步的耗时记录 + 汇总报告。
+
+原来慢的时候只能看日志里的 "Step 4/8"，看不出一位病人的时间到底花在哪。
+现在 OriginAutomation 的每个步骤方法(login_step1/2、find_patient_in_queue、
+open_hd_treatment_record、click_most_recent_date_record、click_edit_button、
+fill_data_in_form、save_form)都套了 @traced_step，每一步记录:
+- wall_s    实际耗时(秒)
+- commands  这一步发了多少条WebDriver命令(每条都是一次跟Chrome的来回)
+- sleep_s   其中有多少秒是固定的 time.sleep 等待
+- retries   走了多少次"上一个方法失败，换下一个方法"的兜底
+- ok        这一步成功没有
+
+每位病人跑完追加一行到 logs/step_timings.jsonl。不属于某位病人的步骤另算:
+- "session"  第一位病人之前的登录那几步
+- "between"  上一位病人结束之后、下一位开始之前(return_to_queue 回队列页、中途重新登录、
+             常驻会话空闲时的探测)；以前这段会被记成 "session"，看起来像登录慢
+
+看汇总报告(所有批次的p50/p95):
+    python -m modules.step_tracer report
+    python -m modules.step_tracer report --last 200
+    python -m modules.step_tracer report --collapsed logs/steps.folded
+第三种会额外导出一份"折叠栈"格式(flamegraph.pl / speedscope 都能直接打开)。
+"""
+
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+TIMINGS_FILE = os.path.join("logs", "step_timings.jsonl")
+
+# 报告里按流程顺序排列
+STEP_ORDER = [
+    "login_step1_credentials",
+    "login_step2_department",
+    "find_patient_in_queue",
+    "open_hd_treatment_record",
+    "click_most_recent_date_record",
+    "click_edit_button",
+    "fill_data_in_form",
+    "save_form",
+    "verify_saved_record",
+    "return_to_queue",
+]
+
+
+class StepTracer:
+    """收集一次运行(一个OriginAutomation实例)里每一步的耗时"""
+
+    def __init__(self, path=TIMINGS_FILE, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.run_id = datetime.now().strftime("run_%Y%m%d_%H%M%S")
+        self._lock = threading.Lock()
+        self._stack = []      # 正在进行中的步骤(登录步骤里不会嵌套，但以防万一)
+        self._record = None   # 当前病人(或登录session/病人之间)的记录
+        self._seen_patient = False  # 这次运行里是不是已经开始过病人了
+
+    # ------------------------------------------------------------
+    # 记录的开始/结束
+    # ------------------------------------------------------------
+
+    def _new_record(self, kind, mrn=None):
+        return {
+            "run_id": self.run_id,
+            "kind": kind,
+            "mrn": mrn,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "_t0": time.perf_counter(),
+            "steps": [],
+        }
+
+    def start_patient(self, mrn):
+        """开始一位病人；之前没写出去的记录(比如登录那几步)先落盘"""
+        if not self.enabled:
+            return
+        self.flush()
+        self._seen_patient = True
+        self._record = self._new_record("patient", str(mrn).strip())
+
+    def finish_patient(self, success):
+        if not self.enabled or self._record is None:
+            return
+        self._record["success"] = bool(success)
+        self.flush()
+
+    def flush(self):
+        """把当前记录追加写进JSONL(没有步骤的空记录不写)"""
+        record, self._record = self._record, None
+        if not record or not record["steps"]:
+            return
+        record["total_s"] = round(time.perf_counter() - record.pop("_t0"), 3)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.warning(f"写入步骤耗时记录失败 {self.path}: {e}")
+
+    # ------------------------------------------------------------
+    # 步骤内的计数
+    # ------------------------------------------------------------
+
+    def begin_step(self, name):
+        if self._record is None:
+            # 还没开始任何病人就在跑的步骤 = 登录；病人之间的(回队列页、重新登录) = between
+            self._record = self._new_record("between" if self._seen_patient else "session")
+        frame = {"step": name, "_t0": time.perf_counter(),
+                 "commands": 0, "sleep_s": 0.0, "retries": 0}
+        self._stack.append(frame)
+        return frame
+
+    def end_step(self, frame, ok):
+        if self._stack and self._stack[-1] is frame:
+            self._stack.pop()
+        entry = {
+            "step": frame["step"],
+            "wall_s": round(time.perf_counter() - frame["_t0"], 3),
+            "commands": frame["commands"],
+            "sleep_s": round(frame["sleep_s"], 3),
+            "retries": frame["retries"],
+            "ok": bool(ok),
+        }
+        if self._record is not None:
+            self._record["steps"].append(entry)
+        # 嵌套的情况下，外层步骤的命令数/等待也要包含内层的
+        if self._stack:
+            parent = self._stack[-1]
+            parent["commands"] += frame["commands"]
+            parent["sleep_s"] += frame["sleep_s"]
+            parent["retries"] += frame["retries"]
+
+    def count_command(self):
+        with self._lock:
+            if self._stack:
+                self._stack[-1]["commands"] += 1
+
+    def add_sleep(self, seconds):
+        if self._stack:
+            self._stack[-1]["sleep_s"] += seconds
+
+    def add_retry(self):
+        if self._stack:
+            self._stack[-1]["retries"] += 1
+
+
+def traced_step(name=None):
+    """
+    套在 OriginAutomation 的步骤方法上。实例上没有tracer(或者没启用)时原样调用，
+    不影响任何行为；返回值为真视为这一步成功。
+    """
+    def decorator(func):
+        step_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            tracer = getattr(self, "tracer", None)
+            if tracer is None or not tracer.enabled:
+                return func(self, *args, **kwargs)
+            frame = tracer.begin_step(step_name)
+            result = None
+            try:
+                result = func(self, *args, **kwargs)
+                return result
+            finally:
+                tracer.end_step(frame, ok=bool(result))
+        return wrapper
+    return decorator
+
+
+def instrument_driver(driver, tracer):
+    """
+    把 driver.execute 包一层，每发一条WebDriver命令(find_element、click、
+    execute_script、switch_to.frame……最后都会走到这里)就给当前步骤计一次数。
+    """
+    if driver is None or tracer is None or getattr(driver, "_step_tracer_wrapped", False):
+        return driver
+    original_execute = driver.execute
+
+    def execute(driver_command, params=None):
+        tracer.count_command()
+        return original_execute(driver_command, params)
+
+    driver.execute = execute
+    driver._step_tracer_wrapped = True
+    return driver
+
+
+# ------------------------------------------------------------
+# 汇总报告
+# ------------------------------------------------------------
+
+def load_records(path=TIMINGS_FILE, last=None):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records[-last:] if last else records
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(records):
+    """返回 {step: {"n","p50","p95","mean","commands","sleep","retries","fail"}}，按流程顺序"""
+    per_step = {}
+    for record in records:
+        for s in record.get("steps", []):
+            per_step.setdefault(s["step"], []).append(s)
+
+    summary = {}
+    ordered = [s for s in STEP_ORDER if s in per_step] + sorted(set(per_step) - set(STEP_ORDER))
+    for step in ordered:
+        rows = per_step[step]
+        walls = [r["wall_s"] for r in rows]
+        n = len(rows)
+        summary[step] = {
+            "n": n,
+            "p50": _percentile(walls, 50),
+            "p95": _percentile(walls, 95),
+            "mean": sum(walls) / n,
+            "commands": sum(r.get("commands", 0) for r in rows) / n,
+            "sleep": sum(r.get("sleep_s", 0) for r in rows) / n,
+            "retries": sum(r.get("retries", 0) for r in rows) / n,
+            "fail": sum(1 for r in rows if not r.get("ok")),
+        }
+    return summary
+
+
+def format_report(summary, bar_width=30):
+    if not summary:
+        return "还没有步骤耗时记录 No step timings recorded yet"
+    max_p95 = max(v["p95"] for v in summary.values()) or 1.0
+    lines = [
+        f"{'step':<32}{'n':>5}{'p50(s)':>9}{'p95(s)':>9}{'cmds':>7}{'sleep(s)':>10}{'retry':>7}{'fail':>6}  p95",
+        "-" * (85 + bar_width),
+    ]
+    for step, v in summary.items():
+        bar = "█" * max(1, int(round(v["p95"] / max_p95 * bar_width)))
+        lines.append(
+            f"{step:<32}{v['n']:>5}{v['p50']:>9.2f}{v['p95']:>9.2f}"
+            f"{v['commands']:>7.1f}{v['sleep']:>10.2f}{v['retries']:>7.2f}{v['fail']:>6}  {bar}"
+        )
+    return "\n".join(lines)
+
+
+def write_collapsed(records, out_path):
+    """
+    导出"折叠栈"格式: 每行 "kind;step 毫秒数"，累加所有记录。
+    flamegraph.pl、speedscope 都能直接读，宽度就是这一步在所有病人上花的总时间。
+    其中固定sleep部分单独拆成 "kind;step;sleep"，一眼能看出多少是纯等待。
+    """
+    totals = {}
+    for record in records:
+        kind = record.get("kind", "patient")
+        for s in record.get("steps", []):
+            wall_ms = int(s["wall_s"] * 1000)
+            sleep_ms = min(int(s.get("sleep_s", 0) * 1000), wall_ms)
+            key = f"{kind};{s['step']}"
+            totals[key] = totals.get(key, 0) + wall_ms - sleep_ms
+            if sleep_ms:
+                totals[key + ";sleep"] = totals.get(key + ";sleep", 0) + sleep_ms
+    with open(out_path, "w", encoding="utf-8") as f:
+        for key, ms in totals.items():
+            if ms > 0:
+                f.write(f"{key} {ms}\n")
+    return out_path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Origin自动化步骤耗时报告 Step timing report")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_p = sub.add_parser("report", help="每一步的p50/p95汇总")
+    report_p.add_argument("--file", default=TIMINGS_FILE)
+    report_p.add_argument("--last", type=int, default=None, help="只看最近N条记录")
+    report_p.add_argument("--collapsed", default=None, help="同时导出折叠栈文件(给flamegraph用)")
+    args = parser.parse_args()
+
+    records = load_records(args.file, args.last)
+    patients = [r for r in records if r.get("kind") == "patient"]
+    print(f"记录 Records: {len(records)} (病人 patients: {len(patients)}, "
+          f"成功 succeeded: {sum(1 for r in patients if r.get('success'))})")
+    if patients:
+        totals = [r.get("total_s", 0) for r in patients]
+        print(f"每位病人总耗时 Per-patient total: p50 {_percentile(totals, 50):.1f}s, "
+              f"p95 {_percentile(totals, 95):.1f}s")
+    between = [r.get("total_s", 0) for r in records if r.get("kind") == "between"]
+    if between:
+        print(f"病人之间(回队列页等) Between patients: p50 {_percentile(between, 50):.1f}s, "
+              f"p95 {_percentile(between, 95):.1f}s")
+    print()
+    print(format_report(summarize(records)))
+    if args.collapsed:
+        write_collapsed(records, args.collapsed)
+        print(f"\n折叠栈已导出 Collapsed stacks written: {args.collapsed}")
+
+
+if __name__ == "__main__":
+    main()
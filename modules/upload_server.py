@@ -6,14 +6,63 @@ upload_server.py
 
 照片全程留在本机文件夹里(uploads_incoming/)，不会经过任何云端服务，
 跟main.py是同一台电脑、同一份文件，main.py那边可以直接读取导入。
+
+一次可以选多张照片。网页会把每张照片切成小块(分块上传)，一块一块传到
+/upload/chunk/<上传ID>，服务端边收边写进 uploads_incoming/.partial/，不把整张照片放在内存里；
+病房WiFi断了也不用重来: 网页会问 /upload/status/<上传ID> 已经收到多少，从那里接着传。
+每张照片的结果都以JSON返回。不支持JS的浏览器照样可以直接提交表单(也支持多选)。
+
+原来HEIC解码、转RGB、重新压成JPG都是在Flask的请求里同步做的，手机要一直等着，
+几台手机同时上传还会在开发服务器上排队。现在请求里只把原始字节存成 <名字>.upload
+就立刻回复(status "pending")，解码/按EXIF摆正/压JPG交给后台一个有上限的进程池
+(CONVERT_WORKERS个进程，开不了进程池就退回线程池)，上传耗时只剩网络传输。
+转换中的照片在网页上显示为"处理中"，转好了才出现在待处理列表里。
+
+缩略图: 原来网页上每张待处理照片都是 <img src="/photo/...">，手机要把每张原图都下载下来
+才能显示100px的小图；桌面端"从手机导入"弹窗也是在Tk线程里逐张打开原图缩小。
+现在转换的时候顺便生成一张小JPG存到 uploads_incoming/.thumbs/(只做一次)，
+网页用 /thumb/<文件名>(带ETag和Cache-Control，手机上第二次打开直接用缓存)，
+桌面端弹窗用 thumbnail_for() 拿同一份缩略图。
+
+服务方式(config.json 里的 phone_upload):
+    server  "waitress"(默认，多线程的正式WSGI服务器，装了waitress才有) / "werkzeug"(Flask自带)
+            本机回环上测吞吐两者差不多(werkzeug 还略快)，选 waitress 是因为线程数/请求大小有上限、
+            WiFi断掉的连接会超时释放，不是因为它传得更快；手机上传的瓶颈在WiFi
+    mode    "thread"  在主程序里用后台线程跑(默认)
+            "process" 单独开一个进程跑(python -m modules.upload_server serve)，
+                      几台手机同时上传时不跟Tk界面抢GIL；两边共用 uploads_incoming/
+    threads / convert_workers / max_request_mb 见 DEFAULT_SETTINGS
+关掉主程序时 stop_server() 先停止接收新连接，等正在传的请求处理完再退出。
+压力测试: python -m modules.upload_server loadtest --phones 4 --photos 5
+(最好对着一个 serve --dir 临时文件夹 起的服务测，不要把测试照片传进真的待处理列表)
+
+哪些照片在转换中/待导入/已导入，记在 photo_catalog 里(uploads_incoming/.catalog.db)，
+列表就是查一下数据库，不再每次 listdir 整个文件夹。文件名是 时间戳_目录ID，
+同一秒里传多少张都不会撞名；同一张照片(字节完全一样)再传一次会被认出来，回复 duplicate。
+
+事件: 收到(photo_received)/转换好(photo_ready)/转换失败(photo_failed)/被导入(photo_imported)
+都会发到 events(event_bus.EventBus)，带上现在待导入/转换中的数量。main.py 用 subscribe_events()
+订阅，"从手机导入"按钮旁边的待导入数量实时更新；服务在单独进程里时，走 /events (Server-Sent Events)。
+注意每个 /events 连接会一直占着 waitress 的一个线程，只给桌面端用，手机网页不用它。
 """
 
 import os
+import re
+import json
+import sys
+import time
 import socket
+import hashlib
 import threading
+import subprocess
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
+from modules.photo_catalog import PhotoCatalog, file_sha256
+from modules.event_bus import EventBus
+
 logger = logging.getLogger(__name__)
 
 # 让Pillow能认识iPhone拍照默认存的HEIC/HEIF格式(装了pillow-heif才有效，
@@ -26,13 +75,67 @@ except ImportError:
     HEIF_SUPPORT = False
 
 try:
-    from flask import Flask, request, render_template_string, send_from_directory
+    from flask import Flask, request, render_template_string, send_from_directory, jsonify
     FLASK_AVAILABLE = True
 except ImportError:
     FLASK_AVAILABLE = False
 
+try:
+    from waitress.server import create_server as _create_waitress_server
+    from waitress.wasyncore import close_all as _waitress_close_all
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
 INCOMING_DIR = os.path.join("uploads_incoming")
 IMPORTED_SUBDIR = "imported"  # 已经被main.py导入过的照片，移到这个子文件夹留底，不再出现在待选列表里
+PARTIAL_SUBDIR = ".partial"   # 分块上传还没传完的照片
+THUMBS_SUBDIR = ".thumbs"     # 缩略图缓存
+
+THUMB_SIZE = (200, 200)       # 网页上显示100px，手机屏幕是2倍密度
+THUMB_QUALITY = 80
+THUMB_MAX_AGE = 24 * 3600     # 浏览器缓存缩略图多久(秒)；照片内容不会变，变的话ETag也会变
+
+COPY_BUFFER = 64 * 1024              # 写盘时每次读多少字节
+MAX_CHUNK_BYTES = 8 * 1024 * 1024    # 单个分块的上限
+_UPLOAD_ID_RE = re.compile(r"^[A-Za-z0-9_-]{6,64}$")
+
+# 已经传完的分块上传: 上传ID -> 结果。最后一块的回应在路上丢了、网页重发的时候，
+# 直接把同一个结果再回一次，而不是当成新照片再存一份
+_finished_uploads = {}
+_upload_locks = {}   # 每个上传ID一把锁: 同一张照片的分块按顺序写，不同照片之间互不等待
+_locks_guard = threading.Lock()
+
+# 后台转换: 最多同时几个进程在解码/压JPG(都是吃CPU的活，开多了反而跟主界面抢)
+CONVERT_WORKERS = 2
+JPEG_QUALITY = 92
+_converter = None
+_converter_is_process = False
+_converter_lock = threading.Lock()
+_pending_conversions = {}   # 名字(不含扩展名) -> 原始文件名，本进程里还在后台转换的照片
+
+_catalog = None
+_catalog_lock = threading.Lock()
+_ingest_lock = threading.Lock()   # 查重复+登记 要一起做，两台手机同时传同一张照片时只收一张
+
+DEFAULT_SETTINGS = {
+    "server": "waitress",    # waitress / werkzeug
+    "mode": "thread",        # thread: 主程序里的后台线程；process: 单独的进程
+    "port": 5001,
+    "threads": 8,            # 同时处理多少个请求(几台手机一起传)
+    "convert_workers": CONVERT_WORKERS,
+    "max_request_mb": 64,    # 单个请求最大多少MB，超过直接回413
+    "prewarm": False,        # 桌面端收到新照片事件时，提前在后台解码缩成预览图
+}
+
+_running_server = None   # 本进程里正在跑的 UploadServer
+_server_process = None   # mode=process 时的子进程
+_server_port = None
+
+SSE_KEEPALIVE_SECONDS = 15
+
+# 照片状态变化的事件(见模块说明)
+events = EventBus()
 
 UPLOAD_PAGE = """
 <!DOCTYPE html>
@@ -41,6 +144,7 @@ UPLOAD_PAGE = """
 <meta charset="utf-8">
 <meta name="viewport" content="width=device-width, initial-scale=1">
 <title>透析记录照片上传</title>
+{% if pending %}<meta http-equiv="refresh" content="3">{% endif %}
 <style>
   body { font-family: -apple-system, "Segoe UI", sans-serif; max-width: 480px; margin: 0 auto;
          padding: 16px; background: #f2f4f7; color: #222; }
@@ -59,68 +163,514 @@ UPLOAD_PAGE = """
                border: 1px solid #ddd; }
   .msg { color: #1a7f37; background: #e6f6ea; padding: 10px; border-radius: 8px; margin-bottom: 14px; }
   .err { color: #b42318; background: #fdeceb; padding: 10px; border-radius: 8px; margin-bottom: 14px; }
+  .thumb .busy { width: 100px; height: 100px; line-height: 100px; border-radius: 8px;
+                 border: 1px dashed #bbb; background: #fafafa; color: #888; font-size: 13px; }
   .empty { color: #888; font-size: 13px; }
+  .progress { font-size: 13px; margin: 4px 0; }
+  .progress .ok { color: #1a7f37; } .progress .bad { color: #b42318; }
 </style>
 </head>
 <body>
   <h2>📷 透析记录照片上传</h2>
-  {% if uploaded %}<div class="msg">✓ 上传成功！可以继续拍下一张，或者关闭网页。</div>{% endif %}
+  {% if uploaded %}<div class="msg">✓ 上传成功{% if uploaded > 1 %} {{ uploaded }} 张{% endif %}！电脑正在后台处理，可以继续拍下一张，或者关闭网页。</div>{% endif %}
   {% if error_msg %}<div class="err">✗ {{ error_msg }}</div>{% endif %}
   <div class="upload-box">
-    <form method="POST" enctype="multipart/form-data">
-      <input type="file" name="photo" accept="image/*" required>
+    <form id="upload-form" method="POST" enctype="multipart/form-data">
+      <input type="file" name="photo" accept="image/*" multiple required>
       <button type="submit">上传 Upload</button>
     </form>
+    <div id="progress"></div>
   </div>
-  <h3>待处理照片 Pending ({{ files|length }})</h3>
-  {% if files %}
+  <h3>待处理照片 Pending ({{ files|length }}){% if pending %} · 处理中 {{ pending|length }}{% endif %}</h3>
+  {% if files or pending %}
     <div>
+      {% for f in pending %}
+        <div class="thumb">
+          <div class="busy">⏳ 处理中</div>
+        </div>
+      {% endfor %}
       {% for f in files %}
         <div class="thumb">
-          <img src="/photo/{{ f }}">
+          <a href="/photo/{{ f }}"><img src="/thumb/{{ f }}" loading="lazy"></a>
         </div>
       {% endfor %}
     </div>
   {% else %}
     <div class="empty">还没有照片，上传一张试试</div>
   {% endif %}
+<script>
+(function () {
+  var CHUNK = 512 * 1024;
+  var form = document.getElementById('upload-form');
+  if (!window.fetch || !window.Blob || !Blob.prototype.slice) return;  // 老浏览器: 普通表单提交
+
+  function uid() {
+    var raw = (window.crypto && crypto.randomUUID) ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    return raw.replace(/[^A-Za-z0-9_-]/g, '');
+  }
+  function sleep(ms) { return new Promise(function (r) { setTimeout(r, ms); }); }
+  async function askStatus(id) {
+    try { var r = await fetch('/upload/status/' + id); if (r.ok) return await r.json(); } catch (e) {}
+    return null;
+  }
+  async function sendFile(file, row) {
+    var id = uid(), offset = 0, tries = 0;
+    while (true) {
+      var end = Math.min(offset + CHUNK, file.size);
+      try {
+        var r = await fetch('/upload/chunk/' + id + '?offset=' + offset + '&total=' + file.size +
+                            '&name=' + encodeURIComponent(file.name),
+                            {method: 'POST', headers: {'Content-Type': 'application/octet-stream'},
+                             body: file.slice(offset, end)});
+        var s = await r.json();
+        if (s.status === 'duplicate') { row.innerHTML = '<span class="ok">✓ ' + file.name + ' (之前已经传过 already uploaded)</span>'; return true; }
+        if (s.status === 'saved' || s.status === 'pending') { row.innerHTML = '<span class="ok">✓ ' + file.name + '</span>'; return true; }
+        if (s.status === 'error') { row.innerHTML = '<span class="bad">✗ ' + file.name + ': ' + s.error + '</span>'; return false; }
+        offset = s.received; tries = 0;
+        row.textContent = '⏳ ' + file.name + ' ' + Math.round(100 * offset / file.size) + '%';
+      } catch (e) {
+        if (++tries > 8) { row.innerHTML = '<span class="bad">✗ ' + file.name + ': 网络中断 network error</span>'; return false; }
+        row.textContent = '📶 ' + file.name + ' 网络不稳，重试中 retrying (' + tries + ')...';
+        await sleep(1000 * tries);
+        var st = await askStatus(id);  // 从服务器已经收到的地方接着传
+        if (st && (st.status === 'saved' || st.status === 'pending' || st.status === 'duplicate')) { row.innerHTML = '<span class="ok">✓ ' + file.name + '</span>'; return true; }
+        if (st) offset = st.received;
+      }
+    }
+  }
+  form.addEventListener('submit', async function (ev) {
+    ev.preventDefault();
+    var files = form.querySelector('input[type=file]').files;
+    var box = document.getElementById('progress'), ok = 0;
+    form.querySelector('button').disabled = true;
+    for (var i = 0; i < files.length; i++) {
+      var row = document.createElement('div'); row.className = 'progress'; box.appendChild(row);
+      if (await sendFile(files[i], row)) ok++;
+    }
+    if (ok === files.length) location.href = '/?uploaded=' + ok;
+    else form.querySelector('button').disabled = false;
+  });
+})();
+</script>
 </body>
 </html>
 """
 
 
-def _save_as_jpeg(file_storage, timestamp):
+def get_catalog():
+    """当前 INCOMING_DIR 的照片目录(第一次用到时打开，新建的话顺便补登记已有照片)"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None or _catalog.incoming_dir != INCOMING_DIR:
+            _catalog = PhotoCatalog(INCOMING_DIR, IMPORTED_SUBDIR)
+        return _catalog
+
+
+def _publish(event_type, filename=None):
+    """发一个照片事件，顺便带上现在的数量(查目录索引，很快)"""
+    try:
+        catalog = get_catalog()
+        events.publish(
+            event_type, file=filename,
+            pending=catalog.count("pending"), converting=catalog.count("converting"),
+        )
+    except Exception as e:
+        logger.warning(f"⚠️  发送照片事件失败: {e}")
+
+
+def _stem_for(photo_id):
+    """照片文件名(不含扩展名): 时间戳_目录ID，ID是自增的，同一秒里也不会重复"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{photo_id}"
+
+
+def _copy_stream(stream, f, limit=None, hasher=None):
+    """分小块从stream复制到已打开的文件f，返回写了多少字节(limit: 最多读多少；hasher: 边写边算哈希)"""
+    written = 0
+    while limit is None or written < limit:
+        size = COPY_BUFFER if limit is None else min(COPY_BUFFER, limit - written)
+        buf = stream.read(size)
+        if not buf:
+            break
+        f.write(buf)
+        if hasher is not None:
+            hasher.update(buf)
+        written += len(buf)
+    return written
+
+
+def _thumb_path(filename):
+    """某张照片对应的缩略图路径(不管原图是什么格式，缩略图都是JPG)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(INCOMING_DIR, THUMBS_SUBDIR, f"{stem}.jpg")
+
+
+def _save_thumbnail(img, thumb_path):
+    """把已经打开(摆正、转RGB)的图片缩小存成缩略图；先写 .tmp 再改名"""
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    small = img.copy()
+    small.thumbnail(THUMB_SIZE)
+    tmp_path = thumb_path + ".tmp"
+    small.save(tmp_path, "JPEG", quality=THUMB_QUALITY)
+    os.replace(tmp_path, thumb_path)
+
+
+def convert_to_jpeg(src_path, dest_path, thumb_path=None):
     """
-    把上传的照片(不管原始格式是HEIC/PNG/WEBP/JPG什么的)统一转换成标准JPG存起来。
+    把已经写到磁盘上的原始照片(不管原始格式是HEIC/PNG/WEBP/JPG什么的)统一转换成标准JPG存起来。
     这样后面desktop端预览/OCR用的PIL/cv2/pytesseract都能正常打开，
     不会因为iPhone默认拍照是HEIC格式而在"从手机导入"那一步静默失败。
-    成功返回保存的文件路径，失败返回None。
+    在后台进程池里跑；先写到 .tmp 再改名，列表里不会出现写了一半的JPG。失败直接抛异常。
+    给了 thumb_path 的话顺便用已经解码好的图生成缩略图(缩略图失败不影响原图)。
     """
-    from PIL import Image
+    from PIL import Image, ImageOps
+
+    tmp_path = dest_path + ".tmp"
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)  # 手机竖着拍的照片按EXIF方向摆正，不然OCR看到的是横的
+        rgb = img.convert("RGB")  # PNG/HEIC可能带透明通道，JPG不支持，统一转RGB
+        rgb.save(tmp_path, "JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp_path, dest_path)
+    if thumb_path:
+        try:
+            _save_thumbnail(rgb, thumb_path)
+        except Exception as e:
+            logger.warning(f"⚠️  生成缩略图失败: {e}")
+    return dest_path
 
-    safe_name = f"{timestamp}.jpg"
-    save_path = os.path.join(INCOMING_DIR, safe_name)
 
+def thumbnail_for(photo_path):
+    """
+    某张待处理照片的缩略图路径。转换时已经生成过的直接返回；
+    没有的(转换失败按原格式保存的、或者有缩略图之前就传上来的)现在补生成一次。
+    生成不了返回None，调用方自己退回用原图。
+    """
+    thumb_path = _thumb_path(photo_path)
     try:
-        img = Image.open(file_storage.stream)
-        img = img.convert("RGB")  # PNG/HEIC可能带透明通道，JPG不支持，统一转RGB
-        img.save(save_path, "JPEG", quality=92)
-        return save_path
+        if os.path.getmtime(thumb_path) >= os.path.getmtime(photo_path):
+            return thumb_path
+    except OSError:
+        pass
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(photo_path) as img:
+            _save_thumbnail(ImageOps.exif_transpose(img).convert("RGB"), thumb_path)
+        return thumb_path
     except Exception as e:
-        logger.warning(f"⚠️  转换上传照片失败: {e}")
-        # 兜底: 转换失败就按原始格式直接存一份，至少不会丢失这张照片，
+        logger.warning(f"⚠️  生成缩略图失败({os.path.basename(photo_path)}): {e}")
+        return None
+
+
+def thumb_etag(thumb_path):
+    """缩略图的ETag: 文件修改时间+大小，缩略图重新生成过就会变"""
+    st = os.stat(thumb_path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def remove_thumbnail(photo_path):
+    try:
+        os.remove(_thumb_path(photo_path))
+    except OSError:
+        pass
+
+
+def configure_converter(workers):
+    """转换池开起来之前调用才有效"""
+    global CONVERT_WORKERS
+    CONVERT_WORKERS = max(1, int(workers))
+
+
+def _get_converter():
+    """第一次用到时才开进程池；开不了(受限环境之类)就退回线程池，照样不占用请求线程"""
+    global _converter, _converter_is_process
+    with _converter_lock:
+        if _converter is None:
+            try:
+                _converter = ProcessPoolExecutor(max_workers=CONVERT_WORKERS)
+                _converter_is_process = True
+            except Exception as e:
+                logger.warning(f"⚠️  开不了转换进程池，改用线程: {e}")
+                _converter = ThreadPoolExecutor(max_workers=CONVERT_WORKERS, thread_name_prefix="photo-convert")
+                _converter_is_process = False
+        return _converter
+
+
+def _fall_back_to_threads():
+    """进程池坏了(子进程被杀之类)，换成线程池继续转换"""
+    global _converter, _converter_is_process
+    with _converter_lock:
+        if _converter_is_process:
+            logger.warning("⚠️  转换进程池异常退出，改用线程继续转换")
+            _converter = ThreadPoolExecutor(max_workers=CONVERT_WORKERS, thread_name_prefix="photo-convert")
+            _converter_is_process = False
+        return _converter
+
+
+def _finish_conversion(raw_path, stem, original_name, error):
+    """转换结束(在转换池的回调线程里): 成功就删掉原始文件；失败按原始格式留一份。结果记进目录"""
+    placeholder = f"{stem}.jpg"
+    final_path = None
+    try:
+        if error is None:
+            try:
+                os.remove(raw_path)
+            except OSError:
+                pass
+            final_path = os.path.join(INCOMING_DIR, placeholder)
+            logger.info(f"🖼️  照片转换完成: {placeholder}")
+            return
+        logger.warning(f"⚠️  转换上传照片失败: {error}")
+        # 兜底: 转换失败就按原始格式直接留一份，至少不会丢失这张照片，
         # 只是后续desktop端可能打不开，需要另外处理
         try:
-            ext = os.path.splitext(file_storage.filename or "")[1] or ".dat"
-            fallback_name = f"{timestamp}{ext}"
-            fallback_path = os.path.join(INCOMING_DIR, fallback_name)
-            file_storage.stream.seek(0)
-            file_storage.save(fallback_path)
-            logger.warning(f"⚠️  已按原始格式保存(未转换): {fallback_name}")
-            return fallback_path
+            try:
+                os.remove(os.path.join(INCOMING_DIR, f"{stem}.jpg.tmp"))
+            except OSError:
+                pass
+            ext = os.path.splitext(original_name or "")[1] or ".dat"
+            fallback_path = os.path.join(INCOMING_DIR, f"{stem}{ext}")
+            os.replace(raw_path, fallback_path)
+            final_path = fallback_path
+            logger.warning(f"⚠️  已按原始格式保存(未转换): {os.path.basename(fallback_path)}")
         except Exception as e2:
             logger.error(f"❌ 连原始格式都保存失败: {e2}")
-            return None
+    finally:
+        try:
+            get_catalog().finish_conversion(
+                placeholder,
+                os.path.basename(final_path) if final_path else None,
+                os.path.getsize(final_path) if final_path else None,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  更新照片目录失败: {e}")
+        with _converter_lock:
+            _pending_conversions.pop(stem, None)
+        _publish("photo_ready" if final_path else "photo_failed",
+                 os.path.basename(final_path) if final_path else placeholder)
+
+
+def _enqueue_conversion(raw_path, stem, original_name=""):
+    """把一张已经存成 .upload 的原始照片交给后台转换，马上返回"""
+    with _converter_lock:
+        _pending_conversions[stem] = original_name
+    dest_path = os.path.join(INCOMING_DIR, f"{stem}.jpg")
+    thumb_path = _thumb_path(dest_path)
+
+    def submit(executor):
+        future = executor.submit(convert_to_jpeg, raw_path, dest_path, thumb_path)
+        future.add_done_callback(on_done)
+
+    def on_done(future):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            try:
+                submit(_fall_back_to_threads())
+                return
+            except Exception as e:
+                error = e
+        _finish_conversion(raw_path, stem, original_name, error)
+
+    try:
+        submit(_get_converter())
+    except BrokenProcessPool:
+        submit(_fall_back_to_threads())
+    except Exception as e:
+        _finish_conversion(raw_path, stem, original_name, e)
+
+
+def conversion_state():
+    """还在后台转换的照片(转好以后的JPG文件名)，给网页/桌面端显示"处理中"用。
+    查的是目录，上传服务在单独的进程里也一样"""
+    return get_catalog().filenames("converting")
+
+
+def shutdown_converter(wait=False):
+    """程序退出时关掉转换池；没转完的 .upload 下次启动会重新排队"""
+    global _converter
+    with _converter_lock:
+        executor, _converter = _converter, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def requeue_leftover_uploads():
+    """
+    上次退出时还没转完的 .upload 原始文件，重新交给后台转换；
+    目录里记着converting、原始文件却已经没了的，按文件夹里实际有什么改成pending/failed
+    """
+    catalog = get_catalog()
+    for filename in catalog.filenames("converting"):
+        stem = os.path.splitext(filename)[0]
+        with _converter_lock:
+            if stem in _pending_conversions:
+                continue
+        raw_path = os.path.join(INCOMING_DIR, f"{stem}.upload")
+        if os.path.exists(raw_path):
+            logger.info(f"🔁 重新转换上次没处理完的照片: {stem}.upload")
+            row = catalog.get(filename) or {}
+            _enqueue_conversion(raw_path, stem, row.get("original_name") or "")
+        elif os.path.exists(os.path.join(INCOMING_DIR, filename)):
+            catalog.finish_conversion(filename, filename, os.path.getsize(os.path.join(INCOMING_DIR, filename)))
+        else:
+            catalog.finish_conversion(filename, None)
+
+
+def _ingest(tmp_path, size, sha256, original_name, upload_id=None):
+    """
+    一张照片的原始字节已经完整写到 tmp_path: 查重复 -> 登记进目录拿到ID -> 改名成 <时间戳_ID>.upload
+    -> 交给后台转换。返回这张照片的结果dict
+    """
+    catalog = get_catalog()
+    with _ingest_lock:
+        duplicate = catalog.find_duplicate(sha256)
+        if duplicate is None:
+            photo_id = catalog.add(original_name, size, sha256)
+            stem = _stem_for(photo_id)
+            catalog.set_filename(photo_id, f"{stem}.jpg")
+    if duplicate is not None:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        logger.info(f"♻️  重复上传，已经有了: {original_name} = {duplicate['filename']}")
+        result = {"name": original_name, "status": "duplicate", "file": duplicate["filename"]}
+        if upload_id:
+            result["id"] = upload_id
+        return result
+    raw_path = os.path.join(INCOMING_DIR, f"{stem}.upload")
+    os.replace(tmp_path, raw_path)
+    _enqueue_conversion(raw_path, stem, original_name)
+    _publish("photo_received", f"{stem}.jpg")
+    return _file_result(original_name, stem, upload_id)
+
+
+def _file_result(original_name, stem, upload_id=None):
+    """原始字节已经落盘、转换已经排上队: 回复pending和转好以后的文件名"""
+    result = {"name": original_name, "status": "pending", "file": f"{stem}.jpg"}
+    if upload_id:
+        result["id"] = upload_id
+    logger.info(f"📥 收到手机上传的照片: {original_name or stem} (后台转换中)")
+    return result
+
+
+def save_uploaded_file(file_storage):
+    """表单里的一张照片: 边写到磁盘上边算哈希，转换交给后台。返回这张照片的结果dict"""
+    original_name = file_storage.filename or ""
+    tmp_path = os.path.join(INCOMING_DIR, PARTIAL_SUBDIR, f"form_{os.urandom(8).hex()}.upload")
+    hasher = hashlib.sha256()
+    try:
+        os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            size = _copy_stream(file_storage.stream, f, hasher=hasher)
+    except Exception as e:
+        logger.error(f"❌ 保存上传照片失败: {e}")
+        return {"name": original_name, "status": "error", "error": str(e)}
+    return _ingest(tmp_path, size, hasher.hexdigest(), original_name)
+
+
+# ------------------------------------------------------------
+# 分块上传(可续传)
+# ------------------------------------------------------------
+
+def _partial_paths(upload_id):
+    partial_dir = os.path.join(INCOMING_DIR, PARTIAL_SUBDIR)
+    os.makedirs(partial_dir, exist_ok=True)
+    base = os.path.join(partial_dir, upload_id)
+    return base + ".part", base + ".json"
+
+
+def chunk_status(upload_id):
+    """某个分块上传现在的状态: 已经收到多少字节 / 已经完成"""
+    if upload_id in _finished_uploads:
+        return _finished_uploads[upload_id]
+    part_path, meta_path = _partial_paths(upload_id)
+    received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    total = None
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                total = json.load(f).get("total")
+        except Exception:
+            pass
+    return {"id": upload_id, "status": "partial", "received": received, "total": total}
+
+
+def _lock_for(upload_id):
+    with _locks_guard:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def cleanup_stale_partials(max_age_hours=24):
+    """很久没有再传下去的分块上传(手机关了网页之类)，删掉"""
+    partial_dir = os.path.join(INCOMING_DIR, PARTIAL_SUBDIR)
+    if not os.path.isdir(partial_dir):
+        return
+    cutoff = datetime.now().timestamp() - max_age_hours * 3600
+    for name in os.listdir(partial_dir):
+        path = os.path.join(partial_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _is_listed(name):
+    """待处理列表里显示的文件: 不含还在写/还在转换的 .upload 原始文件和写了一半的 .tmp"""
+    return (
+        os.path.isfile(os.path.join(INCOMING_DIR, name))
+        and not name.startswith(".")
+        and not name.endswith((".upload", ".tmp"))
+    )
+
+
+def receive_chunk(upload_id, offset, total, original_name, stream, length=None):
+    """
+    收一块: 写到 .partial/<上传ID>.part 的 offset 位置(同一块重发也没关系，覆盖的是同样的字节)。
+    offset 比已经收到的还靠后(中间缺了一段)就不收，回复已经收到多少，网页从那里重传。
+    收齐 total 字节后交给后台转换成JPG，返回这张照片的结果(pending)。
+    超过 total 的字节不写(offset >= total 的整块直接拒绝)；total 以第一块登记的为准，中途变了也拒绝。
+    """
+    if offset < 0 or total <= 0 or offset >= total:
+        return {"id": upload_id, "status": "error", "error": "offset/total不对 bad offset/total"}
+    with _lock_for(upload_id):
+        if upload_id in _finished_uploads:
+            return _finished_uploads[upload_id]
+        part_path, meta_path = _partial_paths(upload_id)
+        received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    registered = int(json.load(f).get("total") or total)
+            except (OSError, ValueError):
+                registered = total
+            if registered != total:
+                return {"id": upload_id, "status": "error", "error": "total跟第一块不一致 total changed"}
+        if offset > received:
+            return {"id": upload_id, "status": "partial", "received": received, "total": total}
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"name": original_name, "total": total,
+                           "started": datetime.now().isoformat(timespec="seconds")}, f)
+        limit = min(length or MAX_CHUNK_BYTES, MAX_CHUNK_BYTES, total - offset)
+        with open(part_path, "r+b" if os.path.exists(part_path) else "wb") as f:
+            f.seek(offset)
+            written = _copy_stream(stream, f, limit=limit)
+        received = max(received, offset + written)
+        if received < total:
+            return {"id": upload_id, "status": "partial", "received": received, "total": total}
+
+        try:
+            os.remove(meta_path)
+        except OSError:
+            pass
+        result = _ingest(part_path, received, file_sha256(part_path), original_name, upload_id)
+        result.update({"received": received, "total": total})
+        _finished_uploads[upload_id] = result
+    with _locks_guard:
+        _upload_locks.pop(upload_id, None)
+    return result
 
 
 def get_local_ip():
@@ -136,78 +686,264 @@ def get_local_ip():
     return ip
 
 
-def create_app():
+def create_app(max_request_mb=None):
     os.makedirs(INCOMING_DIR, exist_ok=True)
+    cleanup_stale_partials()
+    get_catalog()
+    requeue_leftover_uploads()
     app = Flask(__name__)
+    if max_request_mb:
+        app.config["MAX_CONTENT_LENGTH"] = int(max_request_mb * 1024 * 1024)
     app.logger.disabled = True
     logging.getLogger("werkzeug").setLevel(logging.WARNING)  # 别让flask的请求日志刷屏
 
     @app.route("/", methods=["GET", "POST"])
     def upload():
-        uploaded = False
+        uploaded = request.args.get("uploaded", 0, type=int)
         error_msg = None
         if request.method == "POST":
-            file = request.files.get("photo")
-            if file and file.filename:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                saved_path = _save_as_jpeg(file, timestamp)
-                if saved_path:
-                    uploaded = True
-                    logger.info(f"📥 收到手机上传的照片: {os.path.basename(saved_path)}")
-                else:
-                    error_msg = "这张照片没能正常保存，格式可能不支持，换一张试试"
-
-        files = [
-            f for f in sorted(os.listdir(INCOMING_DIR), reverse=True)
-            if os.path.isfile(os.path.join(INCOMING_DIR, f))
-        ]
+            # 不支持JS的浏览器走这里: 普通表单，一次可以多选
+            results = [save_uploaded_file(f) for f in request.files.getlist("photo") if f and f.filename]
+            uploaded = sum(1 for r in results if r["status"] != "error")
+            failed = [r["name"] for r in results if r["status"] == "error"]
+            if failed:
+                error_msg = f"以下照片没能正常保存，格式可能不支持，换一张试试: {', '.join(failed)}"
+
+        files = get_catalog().filenames("pending")
         return render_template_string(
-            UPLOAD_PAGE, uploaded=uploaded, files=files, error_msg=error_msg
+            UPLOAD_PAGE, uploaded=uploaded, files=files, pending=conversion_state(), error_msg=error_msg
+        )
+
+    @app.route("/upload", methods=["POST"])
+    def upload_many():
+        """一次POST多张照片(字段名都叫photo)，每张的结果以JSON返回"""
+        results = [save_uploaded_file(f) for f in request.files.getlist("photo") if f and f.filename]
+        return jsonify({"files": results})
+
+    @app.route("/upload/chunk/<upload_id>", methods=["POST"])
+    def upload_chunk(upload_id):
+        if not _UPLOAD_ID_RE.match(upload_id):
+            return jsonify({"status": "error", "error": "上传ID格式不对 bad upload id"}), 400
+        offset = request.args.get("offset", type=int)
+        total = request.args.get("total", type=int)
+        if offset is None or offset < 0 or not total or total <= 0 or offset >= total:
+            return jsonify({"status": "error", "error": "offset/total不对 bad offset/total"}), 400
+        length = request.content_length
+        if length is not None and length > MAX_CHUNK_BYTES:
+            return jsonify({"status": "error", "error": "分块太大 chunk too large"}), 413
+        result = receive_chunk(
+            upload_id, offset, total, request.args.get("name", ""), request.stream, length
+        )
+        return jsonify(result), 400 if result.get("status") == "error" else 200
+
+    @app.route("/upload/status/<upload_id>")
+    def upload_status(upload_id):
+        if not _UPLOAD_ID_RE.match(upload_id):
+            return jsonify({"status": "error", "error": "上传ID格式不对 bad upload id"}), 400
+        return jsonify(chunk_status(upload_id))
+
+    @app.route("/conversions")
+    def conversions():
+        """还在后台转换的照片"""
+        return jsonify({"pending": conversion_state()})
+
+    @app.route("/events")
+    def event_stream():
+        """Server-Sent Events: 照片事件一有就推；隔一会儿发一行注释保持连接"""
+        last_id = request.headers.get("Last-Event-ID", type=int)
+        listener = events.listen(last_event_id=last_id)
+
+        def stream():
+            try:
+                yield "retry: 3000\n\n"
+                while not listener.closed:  # 服务停止时 events.close_listeners() 会让它退出
+                    event = listener.get(timeout=SSE_KEEPALIVE_SECONDS)
+                    if listener.closed:
+                        break
+                    if event is None:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            finally:
+                listener.close()
+
+        return app.response_class(
+            stream(), mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
     @app.route("/photo/<filename>")
     def photo(filename):
+        """只给待处理列表里的照片: 目录数据库(.catalog.db)、.upload原始文件这些不对外"""
+        if filename != os.path.basename(filename) or not _is_listed(filename):
+            return "", 404
         return send_from_directory(INCOMING_DIR, filename)
 
+    @app.route("/thumb/<filename>")
+    def thumb(filename):
+        """缩略图(没有就现场补生成一次)；带ETag，手机再打开页面时回304，不重复下载"""
+        if filename != os.path.basename(filename) or not _is_listed(filename):
+            return "", 404
+        thumb_path = thumbnail_for(os.path.join(INCOMING_DIR, filename))
+        if thumb_path is None:
+            return send_from_directory(INCOMING_DIR, filename)  # 生成不了就退回原图
+        etag = thumb_etag(thumb_path)
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            response = send_from_directory(os.path.dirname(thumb_path), os.path.basename(thumb_path))
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={THUMB_MAX_AGE}"
+        return response
+
     return app
 
 
-def start_server_in_background(port=5001):
+def load_settings(config=None):
+    """config.json 里的 phone_upload 设置，缺的项用默认值(兼容老的 phone_upload_port)"""
+    config = config or {}
+    settings = dict(DEFAULT_SETTINGS)
+    if "phone_upload_port" in config:
+        settings["port"] = config["phone_upload_port"]
+    settings.update(config.get("phone_upload") or {})
+    return settings
+
+
+class UploadServer:
+    """在后台线程里跑的上传服务，可以平稳停止"""
+
+    def __init__(self, app, port, server="waitress", threads=8, max_request_mb=64):
+        self.port = port
+        self.kind = server
+        if server == "waitress" and not WAITRESS_AVAILABLE:
+            logger.warning("⚠️ 没装waitress，改用Flask自带的服务器。建议运行: pip install waitress")
+            self.kind = "werkzeug"
+        if self.kind == "waitress":
+            self._server = _create_waitress_server(
+                app, host="0.0.0.0", port=port, threads=threads,
+                max_request_body_size=int(max_request_mb * 1024 * 1024),
+                channel_timeout=60,  # 病房WiFi断掉的连接，60秒后释放
+            )
+        else:
+            from werkzeug.serving import make_server
+            self._server = make_server("0.0.0.0", port, app, threaded=True)
+        self._thread = None
+
+    def start(self):
+        run = self._server.run if self.kind == "waitress" else self._server.serve_forever
+        self._thread = threading.Thread(target=self._run, args=(run,), name="phone-upload", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self, run):
+        try:
+            run()
+        except Exception as e:
+            logger.error(f"上传服务运行时出错: {e}")
+
+    def stop(self, timeout=10):
+        """
+        等正在处理的请求做完(一共最多timeout秒)，然后关掉所有连接。
+        waitress 的 close() 只关监听socket，手机网页的keep-alive连接、桌面端的 /events 连接
+        还开着的话 run() 就不会结束，所以这里: 先让 /events 的循环退出，等正在跑的请求做完，
+        再在waitress自己的线程里把剩下的连接(空闲的keep-alive、没传完的分块)全部关掉。
+        没传完的分块不要紧，网页会问 /upload/status 从断点接着传。
+        """
+        deadline = time.monotonic() + timeout
+        events.close_listeners()
+        if self.kind == "waitress":
+            self._server.task_dispatcher.shutdown(cancel_pending=False, timeout=timeout)
+            server_map = self._server._map
+            self._server.trigger.pull_trigger(lambda: _waitress_close_all(server_map, ignore_all=True))
+        else:
+            self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+            if self._thread.is_alive():
+                logger.warning("⚠️ 手机上传服务没能在时限内停下")
+                return
+        logger.info("📴 手机上传服务已停止")
+
+
+def start_server_in_background(port=5001, settings=None):
     """
-    在后台线程里启动上传服务，不阻塞主程序运行。
+    在后台线程(或者 mode=process 时单独的进程)里启动上传服务，不阻塞主程序运行。
     返回 (local_ip, port, success)，success=False代表flask没装/启动失败。
     """
+    global _running_server
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    port = settings.get("port", port)
     if not FLASK_AVAILABLE:
         logger.warning("⚠️ 缺少flask，无法启动手机上传服务。请运行: pip install flask")
         return None, None, False
 
-    try:
-        app = create_app()
-        local_ip = get_local_ip()
+    if settings["mode"] == "process":
+        if getattr(sys, "frozen", False):
+            logger.warning("⚠️ 打包版不能单独开进程，上传服务改在主程序里运行")
+        else:
+            return start_server_process(settings)
 
-        def run():
-            try:
-                app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
-            except Exception as e:
-                logger.error(f"上传服务运行时出错: {e}")
+    try:
+        configure_converter(settings["convert_workers"])
+        app = create_app(settings["max_request_mb"])
+        _running_server = UploadServer(
+            app, port, server=settings["server"], threads=settings["threads"],
+            max_request_mb=settings["max_request_mb"],
+        ).start()
+        return get_local_ip(), port, True
+    except Exception as e:
+        logger.error(f"上传服务启动失败: {e}")
+        return None, None, False
 
-        thread = threading.Thread(target=run, daemon=True)
-        thread.start()
 
-        return local_ip, port, True
+def start_server_process(settings):
+    """单独开一个进程跑上传服务(跟主程序共用 uploads_incoming/)。返回 (local_ip, port, success)"""
+    global _server_process, _server_port
+    cmd = [
+        sys.executable, "-m", "modules.upload_server", "serve",
+        "--port", str(settings["port"]),
+        "--server", settings["server"],
+        "--threads", str(settings["threads"]),
+        "--convert-workers", str(settings["convert_workers"]),
+        "--max-request-mb", str(settings["max_request_mb"]),
+        "--dir", os.path.abspath(INCOMING_DIR),
+        "--stop-on-stdin-close",
+    ]
+    try:
+        _server_process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
     except Exception as e:
-        logger.error(f"上传服务启动失败: {e}")
+        logger.error(f"上传服务进程启动失败: {e}")
+        return None, None, False
+    time.sleep(0.5)
+    if _server_process.poll() is not None:
+        logger.error(f"上传服务进程启动后马上退出了(退出码 {_server_process.returncode})")
+        _server_process = None
         return None, None, False
+    _server_port = settings["port"]
+    return get_local_ip(), settings["port"], True
+
+
+def stop_server(timeout=10):
+    """关掉主程序时调用: 平稳停止上传服务和转换池"""
+    global _running_server, _server_process
+    if _server_process is not None:
+        try:
+            _server_process.stdin.close()  # 子进程看到stdin关了就自己平稳退出
+            _server_process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            _server_process.terminate()
+        except Exception:
+            pass
+        _server_process = None
+    if _running_server is not None:
+        _running_server.stop(timeout)
+        _running_server = None
+    shutdown_converter()
 
 
 def list_incoming_photos():
     """列出所有待处理的照片路径(供main.py桌面端调用，用于弹窗选择要导入哪一张)，按时间新到旧排列"""
-    os.makedirs(INCOMING_DIR, exist_ok=True)
-    files = [
-        f for f in sorted(os.listdir(INCOMING_DIR), reverse=True)
-        if os.path.isfile(os.path.join(INCOMING_DIR, f))
-    ]
-    return [os.path.join(INCOMING_DIR, f) for f in files]
+    return get_catalog().pending_paths()
 
 
 def archive_incoming_photo(path):
@@ -221,7 +957,199 @@ def archive_incoming_photo(path):
         filename = os.path.basename(path)
         new_path = os.path.join(processed_dir, filename)
         os.replace(path, new_path)
+        remove_thumbnail(path)
+        get_catalog().set_status(filename, "imported")
+        _publish("photo_imported", filename)
         return new_path
     except Exception as e:
         logger.warning(f"移动已导入照片失败: {e}")
-        return path
\ No newline at end of file
+        return path
+
+
+def pending_count():
+    """待导入的照片数(桌面端启动时显示初始数量用)"""
+    return get_catalog().count("pending")
+
+
+def _read_sse(url, callback, stop_event):
+    """连着 /events 读事件，断了隔几秒重连(带上 Last-Event-ID 补发断线期间的事件)"""
+    from urllib.request import Request, urlopen
+
+    last_id, backoff = None, 1
+    while not stop_event.is_set():
+        headers = {"Accept": "text/event-stream"}
+        if last_id is not None:
+            headers["Last-Event-ID"] = str(last_id)
+        try:
+            with urlopen(Request(url, headers=headers), timeout=SSE_KEEPALIVE_SECONDS * 3) as resp:
+                backoff = 1
+                data_lines = []
+                for raw in resp:
+                    if stop_event.is_set():
+                        return
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].strip())
+                    elif line == "" and data_lines:
+                        event = json.loads("\n".join(data_lines))
+                        data_lines = []
+                        last_id = event.get("id", last_id)
+                        callback(event)
+        except Exception as e:
+            logger.debug(f"事件连接断开，稍后重连: {e}")
+        stop_event.wait(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def subscribe_events(callback):
+    """
+    订阅照片事件。callback(event) 在后台线程里调用，界面程序要自己转回界面线程。
+    本进程里的事件直接订阅；上传服务在单独进程里时再加一条 /events 连接。
+    返回一个函数，调用它取消订阅。
+    """
+    token = events.subscribe(callback)
+    stop_event = threading.Event()
+    if _server_process is not None and _server_process.poll() is None:
+        threading.Thread(
+            target=_read_sse, args=(f"http://127.0.0.1:{_server_port}/events", callback, stop_event),
+            name="phone-upload-events", daemon=True,
+        ).start()
+
+    def unsubscribe():
+        events.unsubscribe(token)
+        stop_event.set()
+
+    return unsubscribe
+
+# ------------------------------------------------------------
+# 命令行: 单独进程跑服务 / 压力测试
+# ------------------------------------------------------------
+
+def _loadtest_one_photo(url, payload, chunk_size, phone, n):
+    """按网页的方式分块传一张照片，返回耗时(秒)；失败抛异常"""
+    from urllib.request import Request, urlopen
+
+    upload_id = f"loadtest{phone:02d}x{n:04d}x{int(time.time() * 1000):x}"
+    total, offset = len(payload), 0
+    started = time.perf_counter()
+    while offset < total:
+        body = payload[offset:offset + chunk_size]
+        req = Request(
+            f"{url}/upload/chunk/{upload_id}?offset={offset}&total={total}&name=loadtest.jpg",
+            data=body, method="POST", headers={"Content-Type": "application/octet-stream"},
+        )
+        with urlopen(req, timeout=60) as resp:
+            result = json.load(resp)
+        if result.get("status") == "error":
+            raise RuntimeError(result.get("error"))
+        offset = total if result.get("status") in ("saved", "pending") else result["received"]
+    return time.perf_counter() - started
+
+
+def run_loadtest(url, phones=4, photos=5, size_kb=2000, chunk_kb=512):
+    """几台"手机"同时各传几张照片，返回吞吐量和每张照片的耗时统计"""
+    payload = os.urandom(size_kb * 1024)
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def phone(i):
+        for n in range(photos):
+            try:
+                seconds = _loadtest_one_photo(url, payload, chunk_kb * 1024, i, n)
+                with lock:
+                    latencies.append(seconds)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=phone, args=(i,)) for i in range(phones)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3) if latencies else None
+    megabytes = len(latencies) * size_kb / 1024
+    return {
+        "phones": phones, "photos": len(latencies), "errors": len(errors),
+        "elapsed_s": round(elapsed, 2),
+        "mb_per_s": round(megabytes / elapsed, 2) if elapsed else None,
+        "photos_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_p50_s": pick(0.5), "latency_p95_s": pick(0.95),
+        "latency_max_s": round(latencies[-1], 3) if latencies else None,
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def _wait_for_stdin_close(stop_event):
+    try:
+        while sys.stdin.read(1024):
+            pass
+    except Exception:
+        pass
+    stop_event.set()
+
+
+def main():
+    import argparse
+    import signal
+
+    global INCOMING_DIR
+
+    parser = argparse.ArgumentParser(description="手机照片上传服务 Phone photo upload service")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_p = sub.add_parser("serve", help="单独进程跑上传服务")
+    serve_p.add_argument("--port", type=int, default=DEFAULT_SETTINGS["port"])
+    serve_p.add_argument("--server", choices=["waitress", "werkzeug"], default=DEFAULT_SETTINGS["server"])
+    serve_p.add_argument("--threads", type=int, default=DEFAULT_SETTINGS["threads"])
+    serve_p.add_argument("--convert-workers", type=int, default=DEFAULT_SETTINGS["convert_workers"])
+    serve_p.add_argument("--max-request-mb", type=float, default=DEFAULT_SETTINGS["max_request_mb"])
+    serve_p.add_argument("--dir", default=None, help="照片文件夹(默认 uploads_incoming)")
+    serve_p.add_argument("--stop-on-stdin-close", action="store_true",
+                         help="stdin关闭时平稳退出(主程序用这个来关掉子进程)")
+
+    load_p = sub.add_parser("loadtest", help="模拟几台手机同时分块上传，测吞吐量")
+    load_p.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_SETTINGS['port']}")
+    load_p.add_argument("--phones", type=int, default=4)
+    load_p.add_argument("--photos", type=int, default=5, help="每台手机传几张")
+    load_p.add_argument("--size-kb", type=int, default=2000)
+    load_p.add_argument("--chunk-kb", type=int, default=512)
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+        if not FLASK_AVAILABLE:
+            raise SystemExit("缺少flask，请运行: pip install flask")
+        if args.dir:
+            INCOMING_DIR = args.dir
+        configure_converter(args.convert_workers)
+        server = UploadServer(
+            create_app(args.max_request_mb), args.port, server=args.server,
+            threads=args.threads, max_request_mb=args.max_request_mb,
+        ).start()
+        print(f"上传服务运行中 http://{get_local_ip()}:{args.port} ({server.kind}, {args.threads} threads)，"
+              f"按 Ctrl+C 退出")
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        if args.stop_on_stdin_close:
+            threading.Thread(target=_wait_for_stdin_close, args=(stop_event,), daemon=True).start()
+        try:
+            while not stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        server.stop()
+        shutdown_converter(wait=True)
+
+    elif args.command == "loadtest":
+        result = run_loadtest(args.url.rstrip("/"), args.phones, args.photos, args.size_kb, args.chunk_kb)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()